@@ -1,31 +1,50 @@
 #!/bin/bash
 #
 # Usage:
-# 		$ ./TScompile_do.sh <directory-name>
+# 		$ ./TScompile_do.sh <directory-name> [profile ...]
 #
 # Linux bash script to compile TurbSim v2.0:
 #		1) Compiles TurbSim, cleans up
 #		2) Makes TurbSim executable
 #		3) Moves file into /turbsim/
 #
+# Profiles (see Makefile) are baseline (default, bin/TurbSim_glin64),
+# native (bin/TurbSim_native_glin64) and openmp (bin/TurbSim_openmp_glin64),
+# or "all" for all three. Compare the builds with
+# nwtc_python_tools/jr_tsbuild.py.
+#
 # Jenni Rinker, Duke University/NWTC
 # 07-Apr-2015
 
+# profiles to build
+SRC_DIR=${1}
+shift
+PROFILES=${@:-baseline}
+if [ "${PROFILES}" == "all" ] ; then PROFILES="baseline native openmp" ; fi
+
 echo "  Copying makefile..."
 
 # copy makefile into trunk/compiling/
-cp Makefile ${1}/compiling/
+cp Makefile ${SRC_DIR}/compiling/
 
 # move into build_structure
-cd ${1}/compiling/
+cd ${SRC_DIR}/compiling/
+
+for PROFILE in ${PROFILES} ; do
+
+	echo "  Compiling TurbSim (${PROFILE} profile)..."
 
-echo "  Compiling TurbSim..."
+	# compile turbsim, make it exectuable
+	make PROFILE=${PROFILE} || exit 1
+	echo "  Cleaning..."
+	make PROFILE=${PROFILE} clean
+	echo "  Making executable..."
+	if [ "${PROFILE}" == "baseline" ] ; then
+		chmod +x ../bin/TurbSim_glin64
+	else
+		chmod +x ../bin/TurbSim_${PROFILE}_glin64
+	fi
 
-# compile turbsim, make it exectuable
-make
-echo "  Cleaning..."
-make clean
-echo "  Making executable..."
-chmod +x ../bin/TurbSim_glin64
+done
 
 echo "  Script complete."
\ No newline at end of file
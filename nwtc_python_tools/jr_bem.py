@@ -0,0 +1,357 @@
+"""
+A series of Python functions for a blade-element-momentum (BEM) steady-state
+solution of the turbine in a TurbDict, used to build the initial-condition
+look-up table without running FAST.
+
+AUTHOR:  Jenni Rinker, Duke University
+CONTACT: jennifer.rinker@duke.edu
+
+
+NOTES:
+    The solver is vectorized over blade nodes and wind speeds together, and
+    the operating point (rotor speed and pitch) of every wind speed is
+    found at once by bisection. It uses the blade geometry in ADSched, the
+    airfoils in FoilNm, the FAST simple variable-speed controller
+    (VSContrl = 1) and the pitch set points in pitch.ipt (PCMode = 1).
+
+    Precone, shaft tilt, structural deflections and dynamic inflow are
+    neglected, so the deflection/tower-displacement fields of the look-up
+    table are not produced (WriteFastADOne then keeps their defaults).
+
+"""
+
+# module dependencies
+import jr_ss
+import os
+import numpy as np
+
+
+# fields computed by the BEM solver (in jr_ss look-up-table order)
+BEMFields = ['WindVxi','GenSpeed','RotPwr','GenPwr','RotThrust','RotTorq',
+             'RotSpeed','BldPitch','GenTq','TSR']
+
+# cache of airfoil tables: path -> (modification time, alpha, Cl, Cd)
+_FoilCache = {}
+
+
+def ReadAirfoil(FoilPath):
+    """ Lift and drag table from AeroDyn v13 airfoil file
+
+        Only the first table in the file is read. Tables are cached by
+        path and modification time, so repeated calls are free.
+
+        Args:
+            FoilPath (string): path to airfoil file
+
+        Returns:
+            alpha (numpy array): angles of attack [deg]
+            Cl (numpy array): lift coefficients
+            Cd (numpy array): drag coefficients
+    """
+
+    mtime = os.path.getmtime(FoilPath)
+    if (FoilPath in _FoilCache) and (_FoilCache[FoilPath][0] == mtime):
+        return _FoilCache[FoilPath][1:]
+
+    # table starts at first line with three numbers, ends at EOT or text
+    table = []
+    with open(FoilPath,'r') as f:
+        for line in f:
+            try:
+                row = [float(s) for s in line.split()[:3]]
+            except ValueError:
+                row = []
+            if len(row) == 3:
+                table.append(row)
+            elif table:
+                break
+
+    if not table:
+        errStr = 'No airfoil table found in {:s}'.format(FoilPath)
+        raise IOError(errStr)
+
+    table = np.array(table)
+    alpha, Cl, Cd = table[:,0], table[:,1], table[:,2]
+    _FoilCache[FoilPath] = (mtime,alpha,Cl,Cd)
+
+    return alpha, Cl, Cd
+
+def GetBEMRotor(TurbDict,AeroDir,
+                dalpha=0.25):
+    """ Rotor geometry and airfoil tables for BEM solver
+
+        Airfoil tables are resampled to a common angle-of-attack grid so
+        that all nodes are interpolated with one gather.
+
+        Args:
+            TurbDict (dictionary): dictionary with FAST parameters
+            AeroDir (string): directory with airfoil files
+            dalpha (float): spacing of angle-of-attack grid [deg] [opt]
+
+        Returns:
+            Rotor (dictionary): rotor geometry, airfoil tables and
+                                controller constants
+    """
+
+    ADSched = TurbDict['ADSched']
+    Rotor = {'r':np.array([row[0] for row in ADSched]),
+             'twist':np.radians([row[1] for row in ADSched]),
+             'dr':np.array([row[2] for row in ADSched]),
+             'chord':np.array([row[3] for row in ADSched]),
+             'i_foil':np.array([int(row[4]) - 1 for row in ADSched]),
+             'B':int(TurbDict['NumBl']),'R':TurbDict['TipRad'],
+             'Rhub':TurbDict['HubRad'],'rho':TurbDict['AirDens'],
+             'TipLoss':TurbDict.get('TLModel','PRANDtl').upper() != 'NONE',
+             'HubLoss':TurbDict.get('HLModel','PRANDtl').upper() != 'NONE',
+             'Swirl':TurbDict.get('IndModel','SWIRL').upper() == 'SWIRL'}
+
+    # resample airfoil tables to common grid
+    alpha_grid = np.arange(-180.,180. + dalpha/2,dalpha)
+    ClTab = np.zeros((len(TurbDict['FoilNm']),alpha_grid.size))
+    CdTab = np.zeros((len(TurbDict['FoilNm']),alpha_grid.size))
+    for i_foil in range(len(TurbDict['FoilNm'])):
+        FoilPath = os.path.join(AeroDir,TurbDict['FoilNm'][i_foil])
+        alpha, Cl, Cd = ReadAirfoil(FoilPath)
+        ClTab[i_foil] = np.interp(alpha_grid,alpha,Cl)
+        CdTab[i_foil] = np.interp(alpha_grid,alpha,Cd)
+    Rotor.update({'alpha0':alpha_grid[0],'dalpha':dalpha,
+                  'ClTab':ClTab,'CdTab':CdTab})
+
+    return Rotor
+
+def GetFoilCoeffs(Rotor,alpha):
+    """ Lift and drag coefficients at nodes
+
+        Args:
+            Rotor (dictionary): rotor from GetBEMRotor
+            alpha (numpy array): [... x n_nodes] angles of attack [rad]
+
+        Returns:
+            Cl (numpy array): lift coefficients, same shape as alpha
+            Cd (numpy array): drag coefficients, same shape as alpha
+    """
+
+    # wrap to [-180, 180) deg and get fractional index into tables
+    alpha_deg = np.mod(np.degrees(alpha) + 180.,360.) - 180.
+    x = (alpha_deg - Rotor['alpha0']) / Rotor['dalpha']
+    i = np.clip(np.floor(x).astype(int),0,Rotor['ClTab'].shape[1] - 2)
+    w = x - i
+    i_foil = np.broadcast_to(Rotor['i_foil'],alpha.shape)
+
+    Cl = (1 - w)*Rotor['ClTab'][i_foil,i] + w*Rotor['ClTab'][i_foil,i+1]
+    Cd = (1 - w)*Rotor['CdTab'][i_foil,i] + w*Rotor['CdTab'][i_foil,i+1]
+
+    return Cl, Cd
+
+def SolveBEM(Rotor,U,Omega,pitch,
+             n_iter=100,relax=0.3):
+    """ Steady BEM solution for arrays of operating points
+
+        Args:
+            Rotor (dictionary): rotor from GetBEMRotor
+            U (numpy array): [n] wind speeds [m/s]
+            Omega (numpy array): [n] rotor speeds [rad/s]
+            pitch (numpy array): [n] blade pitch angles [rad]
+            n_iter (int): number of induction iterations [opt]
+            relax (float): relaxation factor of induction update [opt]
+
+        Returns:
+            Thrust (numpy array): [n] rotor thrust [N]
+            Torque (numpy array): [n] aerodynamic rotor torque [N-m]
+    """
+
+    U     = np.asarray(U,dtype=float)[:,None]
+    Omega = np.asarray(Omega,dtype=float)[:,None]
+    pitch = np.asarray(pitch,dtype=float)[:,None]
+    r, c, B = Rotor['r'], Rotor['chord'], Rotor['B']
+    sigma = B * c / (2 * np.pi * r)
+
+    a  = np.full(np.broadcast(U,r).shape,0.3)
+    ap = np.zeros_like(a)
+    for i_iter in range(n_iter):
+
+        # inflow angle and loads
+        Vx   = U * (1 - a)
+        Vy   = Omega * r * (1 + ap)
+        phi  = np.arctan2(Vx,Vy)
+        sphi = np.maximum(np.abs(np.sin(phi)),1e-6)
+        cphi = np.cos(phi)
+        Cl, Cd = GetFoilCoeffs(Rotor,phi - (Rotor['twist'] + pitch))
+        Cn = Cl*cphi + Cd*np.sin(phi)
+        Ct = Cl*np.sin(phi) - Cd*cphi
+
+        # Prandtl tip and hub losses
+        F = np.ones_like(a)
+        if Rotor['TipLoss']:
+            f = B/2 * (Rotor['R'] - r) / (r * sphi)
+            F *= 2/np.pi * np.arccos(np.clip(np.exp(-f),0.,1.))
+        if Rotor['HubLoss']:
+            f = B/2 * (r - Rotor['Rhub']) / (Rotor['Rhub'] * sphi)
+            F *= 2/np.pi * np.arccos(np.clip(np.exp(-f),0.,1.))
+        F = np.maximum(F,1e-4)
+
+        # axial induction with Buhl's correction for high loading
+        CT = sigma * (1 - a)**2 * Cn / sphi**2
+        a_new = 1. / (4*F*sphi**2 / np.maximum(sigma*Cn,1e-9) + 1)
+        hi = CT > 0.96*F
+        if np.any(hi):
+            Fh  = F[hi]
+            CTh = np.minimum(CT[hi],2.)
+            a_new[hi] = (18*Fh - 20 - 3*np.sqrt(np.maximum(
+                            CTh*(50 - 36*Fh) + 12*Fh*(3*Fh - 4),0.))) / \
+                        (36*Fh - 50)
+
+        # tangential induction
+        if Rotor['Swirl']:
+            ap_new = 1. / (4*F*sphi*cphi / np.where(np.abs(sigma*Ct) > 1e-9,
+                                                sigma*Ct,1e-9) - 1)
+            ap_new = np.clip(ap_new,-0.5,0.5)
+        else:
+            ap_new = np.zeros_like(ap)
+
+        a  = (1 - relax)*a + relax*np.clip(a_new,-0.5,0.95)
+        ap = (1 - relax)*ap + relax*ap_new
+
+    # integrate loads over span
+    W2 = (U*(1 - a))**2 + (Omega*r*(1 + ap))**2
+    q  = 0.5 * Rotor['rho'] * W2 * c * Rotor['dr']
+    Thrust = B * np.sum(q * Cn,axis=1)
+    Torque = B * np.sum(q * Ct * r,axis=1)
+
+    return Thrust, Torque
+
+def GetGenTorque(TurbDict,GenSpeed):
+    """ Generator torque of FAST simple variable-speed controller
+
+        Args:
+            TurbDict (dictionary): dictionary with FAST parameters
+            GenSpeed (numpy array): generator speeds [rpm]
+
+        Returns:
+            GenTq (numpy array): generator torque [N-m]
+    """
+
+    if TurbDict['VSContrl'] != 1:
+        errStr = 'BEM solver only coded for VSContrl = 1.'
+        raise ValueError(errStr)
+
+    RtGnSp, RtTq = TurbDict['VS_RtGnSp'], TurbDict['VS_RtTq']
+    Rgn2K, SlPc  = TurbDict['VS_Rgn2K'], TurbDict['VS_SlPc']
+
+    # region 2.5 line and transition speed (as in FAST's VSControl)
+    SySp    = RtGnSp / (1 + 0.01*SlPc)
+    Slope25 = RtTq / (RtGnSp - SySp)
+    if Rgn2K == 0:
+        TrGnSp = SySp
+    else:
+        TrGnSp = (Slope25 - np.sqrt(Slope25*(Slope25 - 4*Rgn2K*SySp))) / \
+                    (2*Rgn2K)
+
+    GenSpeed = np.asarray(GenSpeed,dtype=float)
+    GenTq = np.where(GenSpeed >= RtGnSp,RtTq,
+                     np.where(GenSpeed < TrGnSp,Rgn2K*GenSpeed**2,
+                              Slope25*(GenSpeed - SySp)))
+
+    return GenTq
+
+def SolveOperatingPoints(TurbDict,AeroDir,URefs,
+                         n_bisect=40):
+    """ Steady operating points for vector of wind speeds
+
+        Below rated, the rotor speed balances aerodynamic and generator
+        torque at minimum pitch. Above rated, the rotor speed is held at
+        the pitch controller set point and the pitch balances the torques.
+
+        Args:
+            TurbDict (dictionary): dictionary with FAST parameters
+            AeroDir (string): directory with airfoil files
+            URefs (list): wind speeds [m/s]
+            n_bisect (int): number of bisection steps [opt]
+
+        Returns:
+            SS (numpy array): [n_U x n_fields] steady-state values of
+                              BEMFields in FAST output units
+    """
+
+    Rotor   = GetBEMRotor(TurbDict,AeroDir)
+    U       = np.asarray(URefs,dtype=float)
+    GBRatio = TurbDict['GBRatio']
+    GBEff   = TurbDict['GBoxEff'] / 100.
+    rpm2rad = np.pi / 30.
+
+    # pitch limits and rated rotor speed
+    if TurbDict['PCMode'] == 1:
+        PitMin = np.radians(TurbDict['CNST(4)'])
+        PitMax = np.radians(TurbDict['CNST(5)'])
+        RtRotSp = TurbDict['CNST(2)']
+    else:
+        PitMin = PitMax = np.radians(TurbDict['BlPitch(1)'])
+        RtRotSp = np.inf
+
+    # aerodynamic minus generator torque (on low-speed shaft)
+    def TorqueBalance(RotSpeed,pitch):
+        Thrust, Torque = SolveBEM(Rotor,U,RotSpeed*rpm2rad,pitch)
+        GenTq = GetGenTorque(TurbDict,RotSpeed*GBRatio)
+        return Torque*GBEff - GenTq*GBRatio, Thrust, Torque
+
+    # region 2: bisect rotor speed at minimum pitch
+    lo = np.full(U.shape,1e-2)
+    hi = np.full(U.shape,1.5*TurbDict['VS_RtGnSp']/GBRatio)
+    pitch = np.full(U.shape,PitMin)
+    for i_bis in range(n_bisect):
+        mid = 0.5*(lo + hi)
+        dQ  = TorqueBalance(mid,pitch)[0]
+        lo  = np.where(dQ > 0,mid,lo)
+        hi  = np.where(dQ > 0,hi,mid)
+    RotSpeed = 0.5*(lo + hi)
+
+    # region 3: hold rated speed, bisect pitch
+    rgn3 = RotSpeed > RtRotSp
+    if np.any(rgn3) and PitMax > PitMin:
+        RotSpeed[rgn3] = RtRotSp
+        lo = np.full(U.shape,PitMin)
+        hi = np.full(U.shape,PitMax)
+        for i_bis in range(n_bisect):
+            mid = 0.5*(lo + hi)
+            dQ  = TorqueBalance(RotSpeed,mid)[0]
+            lo  = np.where(dQ > 0,mid,lo)
+            hi  = np.where(dQ > 0,hi,mid)
+        pitch = np.where(rgn3,0.5*(lo + hi),PitMin)
+
+    # loads at operating points
+    dQ, Thrust, Torque = TorqueBalance(RotSpeed,pitch)
+    GenSpeed = RotSpeed * GBRatio
+    GenTq    = GetGenTorque(TurbDict,GenSpeed)
+    RotPwr   = Torque * RotSpeed * rpm2rad
+    GenPwr   = GenTq * GenSpeed * rpm2rad * TurbDict['GenEff']/100.
+    TSR      = RotSpeed * rpm2rad * Rotor['R'] / U
+
+    SS = np.column_stack([U,GenSpeed,RotPwr/1e3,GenPwr/1e3,Thrust/1e3,
+                          Torque/1e3,RotSpeed,np.degrees(pitch),GenTq/1e3,
+                          TSR])
+
+    return SS
+
+def WriteBEMLUT(TurbDict,AeroDir,ModlDir,
+                URefs=np.arange(3.,25.01,0.25)):
+    """ Steady-state look-up table from BEM solution
+
+        Writes <ModlDir>/steady_state/<TurbName>_SS.mat in the layout read
+        by WriteFastADOne (see jr_ss.WriteSSLUT).
+
+        Args:
+            TurbDict (dictionary): dictionary with FAST parameters
+            AeroDir (string): directory with airfoil files
+            ModlDir (string): directory with wind-independent files
+            URefs (list): wind speeds [m/s] [opt]
+
+        Returns:
+            LUTPath (string): path to look-up table
+            SS (numpy array): [n_U x n_fields] steady-state values
+    """
+
+    SS = SolveOperatingPoints(TurbDict,AeroDir,URefs)
+    LUTPath = jr_ss.WriteSSLUT(TurbDict['TurbName'],ModlDir,SS,
+                               Fields=BEMFields)
+
+    return LUTPath, SS
@@ -0,0 +1,532 @@
+"""
+A series of Python functions for benchmarking the wind-file readers, the
+FAST model parser and the FAST/AeroDyn writers.
+
+AUTHOR:  Jenni Rinker, Duke University
+CONTACT: jennifer.rinker@duke.edu
+
+
+NOTES:
+    All inputs are synthetic: TurbSim (.bts) and Bladed (.wnd) files of
+    several grid sizes and durations, and turbine models resampled from the
+    demo turbine dictionary with different numbers of blades, blade
+    stations and AeroDyn nodes. Each benchmark records the best time over
+    several repeats, the throughput and the peak Python memory (measured in
+    a separate, traced call so it does not slow down the timing).
+
+    Results are appended to a JSON history file. CompareBenchmarks flags
+    benchmarks that got slower than a baseline entry of the history.
+
+    Run "python jr_bench.py <WorkDir>" for the default suite.
+
+"""
+
+# module dependencies
+import jr_fast, jr_wind, jr_ss
+import os, sys, time, json, copy, socket, platform, tracemalloc
+from struct import pack
+import numpy as np
+
+
+# default benchmark sizes
+BenchCases = [10,1000,10000]                    # no. of cases in campaign
+BenchGrids = [(11,11,1200),(31,31,1200),
+              (31,31,12000)]                    # (n_y, n_z, n_t) of wind
+BenchModels = [(3,21,15),(2,21,15),(3,49,40)]   # (NumBl, NBlInpSt, BldNodes)
+
+# demo turbine and templates used as basis of synthetic models
+BenchDir  = os.path.dirname(os.path.abspath(__file__))
+BenchTmplDir  = os.path.join(BenchDir,'templates')
+BenchDictPath = os.path.join(BenchDir,'demo_inputs','Turbine',
+                             'WP0.75A08V00_Dict.dat')
+
+
+def WriteSyntheticBTS(fpath,n_y,n_z,n_t,
+                      dy=2.,dz=2.,dt=0.05,uhub=10.,zhub=60.,TI=0.15,
+                      seed=0):
+    """ TurbSim binary (.bts) file with random wind field
+
+        Args:
+            fpath (string): path to write file to
+            n_y (int): number of lateral grid points
+            n_z (int): number of vertical grid points
+            n_t (int): number of time steps
+            dy (float): lateral grid spacing [m] [opt]
+            dz (float): vertical grid spacing [m] [opt]
+            dt (float): time step [s] [opt]
+            uhub (float): mean hub-height wind speed [m/s] [opt]
+            zhub (float): hub height [m] [opt]
+            TI (float): turbulence intensity [opt]
+            seed (int): random seed [opt]
+    """
+
+    rng  = np.random.RandomState(seed)
+    turb = (uhub * TI * rng.randn(3,n_z,n_y,n_t)).astype(np.float32)
+    turb[0] += uhub
+
+    jr_wind.WriteBTS(fpath,turb,dz,dy,dt,zhub,zhub - 0.5*(n_z - 1)*dz,
+                     uhub=uhub,desc='Synthetic TurbSim file (jr_bench)')
+
+    return
+
+def WriteSyntheticWnd(fpath,n_y,n_z,n_t,
+                      dy=2.,dz=2.,dt=0.05,uhub=10.,TI=0.15,seed=0):
+    """ Bladed binary (.wnd) file with random wind field
+
+        Args:
+            fpath (string): path to write file to
+            n_y (int): number of lateral grid points
+            n_z (int): number of vertical grid points
+            n_t (int): number of time steps (even)
+            dy (float): lateral grid spacing [m] [opt]
+            dz (float): vertical grid spacing [m] [opt]
+            dt (float): time step [s] [opt]
+            uhub (float): mean hub-height wind speed [m/s] [opt]
+            TI (float): turbulence intensity [opt]
+            seed (int): random seed [opt]
+    """
+
+    rng  = np.random.RandomState(seed)
+    ints = np.clip(np.round(1000. * rng.randn(3,n_y,n_z,n_t)),
+                   -32000,32000).astype('<i2')
+
+    # header (104 bytes, see jr_wind.bladed); clockwise = 1 (not flipped)
+    e = jr_wind.e
+    with open(fpath,'wb') as f:
+        f.write(pack(e + '2hl3f',-99,4,3,0.,0.03,0.))
+        f.write(pack(e + '3f',100.*TI,100.*TI,100.*TI))
+        f.write(pack(e + '3flf',dz,dy,dt*uhub,n_t//2,uhub))
+        f.write(b'\x00' * 12)
+        f.write(pack(e + '4l',1,seed,n_z,n_y))
+        f.write(b'\x00' * 24)
+        f.write(ints.tobytes(order='F'))
+
+    return
+
+def WriteSyntheticModel(ModlDir,
+                        NumBl=3,NBlInpSt=None,BldNodes=None,Name=None,
+                        TurbDict=None,TmplDir=BenchTmplDir):
+    """ Synthetic turbine model resampled from a turbine dictionary
+
+        The blade schedule is interpolated to NBlInpSt stations and the
+        AeroDyn schedule to BldNodes equal-width nodes. Each blade gets its
+        own blade file. Writes the FAST/AeroDyn templates, blade, tower and
+        pitch files and a complete .fst/_AD.ipt pair in ModlDir, so the
+        model can be read back with jr_fast.CreateFAST7Dict.
+
+        Args:
+            ModlDir (string): directory to write model to
+            NumBl (int): number of blades (2 or 3) [opt]
+            NBlInpSt (int): number of blade stations [opt, unchanged]
+            BldNodes (int): number of AeroDyn nodes [opt, unchanged]
+            Name (string): turbine name [opt, from sizes]
+            TurbDict (dictionary): base turbine [opt, demo turbine]
+            TmplDir (string): directory with template files [opt]
+
+        Returns:
+            TurbDict (dictionary): dictionary of synthetic turbine
+            FastPath (string): path to .fst file of synthetic turbine
+    """
+
+    if TurbDict is None:
+        with open(BenchDictPath,'r') as f:
+            TurbDict = json.load(f)
+    TurbDict = copy.deepcopy(TurbDict)
+
+    NBlInpSt = NBlInpSt or int(TurbDict['NBlInpSt_1'])
+    BldNodes = BldNodes or int(TurbDict['BldNodes'])
+    if Name is None:
+        Name = 'Bench_B{:d}_S{:03d}_N{:03d}'.format(NumBl,NBlInpSt,BldNodes)
+    TurbDict['TurbName'] = Name
+    TurbDict['NumBl']    = float(NumBl)
+
+    # blade schedule interpolated on blade fraction, one file per blade
+    BldSched = np.array(TurbDict['BldSched_1'])
+    BlFract  = np.linspace(0.,1.,NBlInpSt)
+    BldSched = np.column_stack([np.interp(BlFract,BldSched[:,0],col) \
+                                    for col in BldSched.T])
+    for i_bl in range(1,4):
+        bl_str = '_{:d}'.format(i_bl)
+        for key in [k for k in TurbDict if k.endswith('_1')]:
+            TurbDict[key[:-2] + bl_str] = TurbDict[key]
+        TurbDict['BldSched' + bl_str] = BldSched.tolist()
+        TurbDict['NBlInpSt' + bl_str] = float(NBlInpSt)
+        TurbDict['BldFile({:d})'.format(i_bl)] = \
+                        '{:s}_Blade{:d}.dat'.format(Name,i_bl)
+    TurbDict['TwrFile'] = Name + '_Tower.dat'
+
+    # AeroDyn schedule with equal-width nodes
+    ADSched = TurbDict['ADSched']
+    r_old   = np.array([row[0] for row in ADSched])
+    span    = TurbDict['TipRad'] - TurbDict['HubRad']
+    dr      = span / BldNodes
+    r_new   = TurbDict['HubRad'] + dr * (np.arange(BldNodes) + 0.5)
+    i_near  = np.abs(r_new[:,None] - r_old[None,:]).argmin(axis=1)
+    TurbDict['ADSched'] = [[r_new[i],
+                            np.interp(r_new[i],r_old,[row[1] for row in ADSched]),
+                            dr,
+                            np.interp(r_new[i],r_old,[row[3] for row in ADSched]),
+                            ADSched[i_near[i]][4],ADSched[i_near[i]][5]] \
+                                for i in range(BldNodes)]
+    TurbDict['BldNodes'] = float(BldNodes)
+
+    # write model and one .fst/_AD.ipt pair (hub-height wind)
+    IntrDir = os.path.join(ModlDir,'templates')
+    if not os.path.isdir(IntrDir):
+        os.makedirs(IntrDir)
+    AeroDir = os.path.join(ModlDir,'AeroData')
+    jr_fast.WriteFAST7Template(TurbDict,TmplDir,ModlDir,IntrDir)
+    jr_fast.WriteAeroDynTemplate(TurbDict,TmplDir,ModlDir,AeroDir,IntrDir)
+    jr_fast.WriteBladeFiles(TurbDict,TmplDir,ModlDir)
+    jr_fast.WriteTowerFile(TurbDict,TmplDir,ModlDir)
+    if (TurbDict['PCMode'] == 1):
+        jr_fast.WritePitchCntrl(TurbDict,TmplDir,ModlDir)
+    WindPath = jr_ss.WriteSteadyWind(10.,ModlDir,TMax=10.)
+    jr_fast.WriteFastADOne(Name,WindPath,Name,ModlDir,ModlDir)
+    FastPath = os.path.join(ModlDir,Name + '.fst')
+
+    return TurbDict, FastPath
+
+def TimeCall(fcn,
+             args=(),kwargs={},n_repeat=3,memory=1,setup=None):
+    """ Best wall-clock time and peak memory of function call
+
+        Args:
+            fcn (function): function to time
+            args (tuple): positional arguments to function [opt]
+            kwargs (dictionary): keyword arguments to function [opt]
+            n_repeat (int): number of timed calls [opt]
+            memory (int): flag to measure peak memory in an extra call [opt]
+            setup (function): called without arguments before each call,
+                              not timed [opt]
+
+        Returns:
+            result (dictionary): 'Time' (best time [s]), 'Times' (all
+                                 times) and 'PeakMem' (peak traced memory
+                                 [MB], or None)
+    """
+
+    times = []
+    for i_rep in range(n_repeat):
+        if setup is not None:
+            setup()
+        t_start = time.perf_counter()
+        fcn(*args,**kwargs)
+        times.append(time.perf_counter() - t_start)
+
+    # peak memory in separate call, since tracing slows down the call
+    PeakMem = None
+    if memory:
+        if setup is not None:
+            setup()
+        tracemalloc.start()
+        try:
+            fcn(*args,**kwargs)
+            PeakMem = tracemalloc.get_traced_memory()[1] / 2.**20
+        finally:
+            tracemalloc.stop()
+
+    result = {'Time':min(times),'Times':times,'PeakMem':PeakMem}
+
+    return result
+
+def BenchWindReaders(WorkDir,
+                     grids=BenchGrids,n_repeat=3,verbose=0):
+    """ Benchmark readModel and GetFirstWind on synthetic wind files
+
+        Args:
+            WorkDir (string): directory for synthetic files
+            grids (list): (n_y, n_z, n_t) of wind files [opt]
+            n_repeat (int): number of timed calls [opt]
+            verbose (int): flag to suppress print statements [opt]
+
+        Returns:
+            results (dictionary): benchmark results keyed by name, with
+                                  throughput in MB/s of wind file
+    """
+
+    WindDir = os.path.join(WorkDir,'wind')
+    if not os.path.isdir(WindDir):
+        os.makedirs(WindDir)
+
+    results = {}
+    for n_y, n_z, n_t in grids:
+        for ext, WriteFcn in (('.bts',WriteSyntheticBTS),
+                              ('.wnd',WriteSyntheticWnd)):
+            grid  = '{:d}x{:d}x{:d}'.format(n_y,n_z,n_t)
+            fpath = os.path.join(WindDir,'bench_' + grid + ext)
+            if not os.path.exists(fpath):
+                WriteFcn(fpath,n_y,n_z,n_t)
+            size = os.path.getsize(fpath) / 2.**20
+
+            for fcn in (jr_wind.readModel,jr_wind.GetFirstWind):
+                name = '{:s}{:s}_{:s}'.format(fcn.__name__,ext,grid)
+                if verbose:
+                    sys.stdout.write('  {:s}...'.format(name))
+                result = TimeCall(fcn,args=(fpath,),n_repeat=n_repeat)
+                result.update({'Throughput':size / result['Time'],
+                               'Unit':'MB/s','Size':size})
+                results[name] = result
+                if verbose:
+                    sys.stdout.write('{:.4f} s\n'.format(result['Time']))
+
+    return results
+
+def BenchModelIO(WorkDir,
+                models=BenchModels,n_repeat=3,verbose=0):
+    """ Benchmark CreateFAST7Dict and the Write* template functions
+
+        Args:
+            WorkDir (string): directory for synthetic models
+            models (list): (NumBl, NBlInpSt, BldNodes) of models [opt]
+            n_repeat (int): number of timed calls [opt]
+            verbose (int): flag to suppress print statements [opt]
+
+        Returns:
+            results (dictionary): benchmark results keyed by name, with
+                                  throughput in calls/s
+    """
+
+    results = {}
+    for NumBl, NBlInpSt, BldNodes in models:
+        ModlDir = os.path.join(WorkDir,
+                               'model_B{:d}_S{:03d}_N{:03d}'.format(
+                                                   NumBl,NBlInpSt,BldNodes))
+        TurbDict, FastPath = WriteSyntheticModel(ModlDir,NumBl=NumBl,
+                                                 NBlInpSt=NBlInpSt,
+                                                 BldNodes=BldNodes)
+        IntrDir = os.path.join(ModlDir,'templates')
+        AeroDir = os.path.join(ModlDir,'AeroData')
+
+        benches = [(jr_fast.CreateFAST7Dict,(FastPath,)),
+                   (jr_fast.WriteFAST7Template,
+                        (TurbDict,BenchTmplDir,ModlDir,IntrDir)),
+                   (jr_fast.WriteAeroDynTemplate,
+                        (TurbDict,BenchTmplDir,ModlDir,AeroDir,IntrDir)),
+                   (jr_fast.WriteBladeFiles,(TurbDict,BenchTmplDir,ModlDir)),
+                   (jr_fast.WriteTowerFile,(TurbDict,BenchTmplDir,ModlDir))]
+        if (TurbDict['PCMode'] == 1):
+            benches.append((jr_fast.WritePitchCntrl,
+                            (TurbDict,BenchTmplDir,ModlDir)))
+
+        for fcn, args in benches:
+            name = '{:s}_{:s}'.format(fcn.__name__,TurbDict['TurbName'])
+            if verbose:
+                sys.stdout.write('  {:s}...'.format(name))
+            result = TimeCall(fcn,args=args,n_repeat=n_repeat)
+            result.update({'Throughput':1. / result['Time'],
+                           'Unit':'calls/s'})
+            results[name] = result
+            if verbose:
+                sys.stdout.write('{:.4f} s\n'.format(result['Time']))
+
+    return results
+
+def BenchCampaign(WorkDir,
+                  cases=BenchCases,grid=(5,5,20),LUT=1,n_repeat=1,
+                  verbose=0):
+    """ Benchmark WriteFastADAll for campaigns of different sizes
+
+        Each case has its own small .bts file. With LUT, a steady-state
+        look-up table is present, so initial conditions are interpolated
+        from the first wind speed of each file (as in a real campaign).
+
+        Args:
+            WorkDir (string): directory for synthetic campaign
+            cases (list): number of cases in campaign [opt]
+            grid (tuple): (n_y, n_z, n_t) of wind files [opt]
+            LUT (int): flag to write steady-state look-up table [opt]
+            n_repeat (int): number of timed calls [opt]
+            verbose (int): flag to suppress print statements [opt]
+
+        Returns:
+            results (dictionary): benchmark results keyed by name, with
+                                  throughput in cases/s
+    """
+
+    ModlDir = os.path.join(WorkDir,'campaign_model')
+    TurbDict, FastPath = WriteSyntheticModel(ModlDir,Name='BenchTurb')
+    if LUT:
+        URefs = np.arange(3.,25.5,1.)
+        SS = np.column_stack([URefs,np.minimum(URefs,11.) * 2.,
+                              np.maximum(URefs - 11.,0.) * 1.5])
+        jr_ss.WriteSSLUT('BenchTurb',ModlDir,SS,
+                         Fields=['WindVxi','RotSpeed','BldPitch'])
+
+    results = {}
+    for n_cases in cases:
+        WindDir = os.path.join(WorkDir,'campaign_wind_{:d}'.format(n_cases))
+        FastDir = os.path.join(WorkDir,'campaign_fast_{:d}'.format(n_cases))
+        for fdir in (WindDir,FastDir):
+            if not os.path.isdir(fdir):
+                os.makedirs(fdir)
+
+        # one wind file per case (hard links to one file, to save space)
+        fpath0 = os.path.join(WindDir,'Case{:06d}.bts'.format(0))
+        if not os.path.exists(fpath0):
+            WriteSyntheticBTS(fpath0,*grid)
+        for i_case in range(1,n_cases):
+            fpath = os.path.join(WindDir,'Case{:06d}.bts'.format(i_case))
+            if not os.path.exists(fpath):
+                os.link(fpath0,fpath)
+
+        name = 'WriteFastADAll_{:d}'.format(n_cases)
+        if verbose:
+            sys.stdout.write('  {:s}...'.format(name))
+        result = TimeCall(jr_fast.WriteFastADAll,
+                          args=('BenchTurb',ModlDir,WindDir,FastDir),
+                          n_repeat=n_repeat)
+        result.update({'Throughput':n_cases / result['Time'],
+                       'Unit':'cases/s'})
+        results[name] = result
+        if verbose:
+            sys.stdout.write('{:.3f} s\n'.format(result['Time']))
+
+    return results
+
+def RunBenchmarks(WorkDir,
+                  grids=BenchGrids,models=BenchModels,cases=BenchCases,
+                  n_repeat=3,verbose=0):
+    """ Run full benchmark suite
+
+        Args:
+            WorkDir (string): directory for synthetic files
+            grids (list): (n_y, n_z, n_t) of wind files [opt]
+            models (list): (NumBl, NBlInpSt, BldNodes) of models [opt]
+            cases (list): number of cases in campaign [opt]
+            n_repeat (int): number of timed calls (campaigns are run
+                            once) [opt]
+            verbose (int): flag to suppress print statements [opt]
+
+        Returns:
+            bench (dictionary): run information and benchmark results
+    """
+
+    if not os.path.isdir(WorkDir):
+        os.makedirs(WorkDir)
+
+    bench = {'Date':time.strftime('%Y-%m-%d %H:%M:%S'),
+             'Host':socket.gethostname(),
+             'Python':platform.python_version(),
+             'NumPy':np.__version__,
+             'Results':{}}
+
+    if verbose:
+        print('\nBenchmarking wind readers...')
+    bench['Results'].update(BenchWindReaders(WorkDir,grids=grids,
+                                             n_repeat=n_repeat,
+                                             verbose=verbose))
+    if verbose:
+        print('Benchmarking model parser and writers...')
+    bench['Results'].update(BenchModelIO(WorkDir,models=models,
+                                          n_repeat=n_repeat,verbose=verbose))
+    if verbose:
+        print('Benchmarking campaign writer...')
+    bench['Results'].update(BenchCampaign(WorkDir,cases=cases,
+                                          verbose=verbose))
+
+    return bench
+
+def SaveBenchmarks(bench,HistPath):
+    """ Append benchmark run to JSON history file
+
+        Args:
+            bench (dictionary): benchmark run from RunBenchmarks
+            HistPath (string): path to history file
+    """
+
+    history = LoadBenchHistory(HistPath)
+    history.append(bench)
+    with open(HistPath,'w') as f:
+        json.dump(history,f,indent=1)
+
+    return
+
+def LoadBenchHistory(HistPath):
+    """ Benchmark runs in JSON history file
+
+        Args:
+            HistPath (string): path to history file
+
+        Returns:
+            history (list): benchmark runs, oldest first
+    """
+
+    if not os.path.exists(HistPath):
+        return []
+    with open(HistPath,'r') as f:
+        history = json.load(f)
+
+    return history
+
+def CompareBenchmarks(bench,baseline,
+                      tol=0.2,dt_min=0.005,verbose=0):
+    """ Benchmarks that are slower than in baseline run
+
+        Args:
+            bench (dictionary): benchmark run
+            baseline (dictionary): benchmark run to compare against
+            tol (float): allowed relative increase in time [opt]
+            dt_min (float): smallest increase in time [s] counted as a
+                            regression (to ignore timer noise) [opt]
+            verbose (int): flag to print comparison table [opt]
+
+        Returns:
+            regressions (list): (name, baseline time, time, ratio) of each
+                                benchmark slower than (1 + tol) x baseline
+    """
+
+    regressions = []
+    if verbose:
+        print('\n{:45s} {:>10s} {:>10s} {:>7s}'.format('Benchmark',
+                                                      'Base [s]','New [s]',
+                                                      'Ratio'))
+    for name in sorted(bench['Results']):
+        if name not in baseline['Results']:
+            continue
+        t_base = baseline['Results'][name]['Time']
+        t_new  = bench['Results'][name]['Time']
+        ratio  = t_new / t_base
+        slower = (ratio > (1 + tol)) and ((t_new - t_base) > dt_min)
+        if slower:
+            regressions.append((name,t_base,t_new,ratio))
+        if verbose:
+            flag = '  <--' if slower else ''
+            print('{:45s} {:10.4f} {:10.4f} {:7.2f}{:s}'.format(name,t_base,
+                                                               t_new,ratio,
+                                                               flag))
+
+    return regressions
+
+
+if __name__ == '__main__':
+
+    import argparse
+    parser = argparse.ArgumentParser(description='Benchmark jr_wind and ' + \
+                                     'jr_fast readers, parser and writers.')
+    parser.add_argument('WorkDir',help='directory for synthetic files')
+    parser.add_argument('--history',default='bench_history.json',
+                        help='JSON history file to append results to')
+    parser.add_argument('--baseline',type=int,default=0,
+                        help='index of baseline run in history')
+    parser.add_argument('--tol',type=float,default=0.2,
+                        help='allowed relative slow-down')
+    parser.add_argument('--cases',type=int,nargs='+',default=BenchCases,
+                        help='campaign sizes')
+    parser.add_argument('--repeat',type=int,default=3,
+                        help='number of timed calls')
+    args = parser.parse_args()
+
+    bench   = RunBenchmarks(args.WorkDir,cases=args.cases,
+                            n_repeat=args.repeat,verbose=1)
+    history = LoadBenchHistory(args.history)
+    SaveBenchmarks(bench,args.history)
+
+    # compare with baseline run and fail on regression
+    if history:
+        regressions = CompareBenchmarks(bench,history[args.baseline],
+                                        tol=args.tol,verbose=1)
+        if regressions:
+            print('\n{:d} benchmark(s) slower than baseline.'.format(
+                  len(regressions)))
+            sys.exit(1)
@@ -0,0 +1,403 @@
+"""
+A series of Python functions for a local cache of simulation results keyed
+by a hash of the complete set of simulation inputs.
+
+AUTHOR:  Jenni Rinker, Duke University
+CONTACT: jennifer.rinker@duke.edu
+
+
+NOTES:
+    The key of a FAST case is a SHA-256 hash over
+        - the .fst file and every file it references, recursively (AeroDyn,
+          blade, tower and airfoil files), where each quoted path to an
+          existing file is replaced by the hash of that file, so the key
+          does not depend on where the files are,
+        - the content of binary referenced files (e.g., the wind file),
+        - the controller files FAST reads from its run directory without
+          a path in the .fst file (pitch.ipt and the DISCON library and
+          parameter file, see RunDirFiles) when a user-defined control
+          routine is used,
+        - the solver executable (content of the binary, or the command for
+          a stand-in command).
+    Hashes of large binary files are remembered by path, size and
+    modification time, so a wind file is read only once.
+
+    The cache directory holds an SQLite index (cache.db) and the outputs of
+    each case in <CacheDir>/<key[:2]>/<key>/. Entries are evicted least
+    recently used first when the cache is larger than its size limit.
+    jr_run.RunFastAll(...,CacheDir=...) restores outputs on a hit instead
+    of running FAST.
+
+"""
+
+# module dependencies
+import jr_timing
+import os, re, time, shutil, hashlib, sqlite3, tempfile, threading
+
+
+# extensions of text input files whose references are followed
+TextEnds = ('.fst','.ipt','.dat','.inp','.txt')
+
+# extensions of FAST outputs to cache
+OutEnds  = ('.out','.outb')
+
+# files read from the run directory: (.fst key, mode of user-defined
+#   routine, file names)
+RunDirFiles = (('PCMode',1,('pitch.ipt','DISCON.dll','DISCON.so',
+                            'DISCON.IN')),
+               ('VSContrl',2,('DISCON.dll','DISCON.so','DISCON.IN')),
+               ('YCMode',1,('DISCON.dll','DISCON.so','DISCON.IN')))
+
+# hashes of files in this process: path -> (size, modification time, hash)
+_HashCache = {}
+
+
+def OpenCache(CacheDir):
+    """ Open (and create if needed) index of result cache
+
+        Args:
+            CacheDir (string): cache directory
+
+        Returns:
+            conn (sqlite3.Connection): connection to index
+    """
+
+    os.makedirs(CacheDir,exist_ok=True)
+    conn = sqlite3.connect(os.path.join(CacheDir,'cache.db'),timeout=60.)
+    conn.execute('PRAGMA journal_mode=WAL')
+    conn.execute('PRAGMA synchronous=NORMAL')
+    conn.execute('CREATE TABLE IF NOT EXISTS entries (' + \
+                 'Key TEXT PRIMARY KEY, Bytes INTEGER, Exts TEXT, ' + \
+                 'Created REAL, Used REAL, Hits INTEGER)')
+    conn.execute('CREATE TABLE IF NOT EXISTS files (' + \
+                 'Path TEXT PRIMARY KEY, Size INTEGER, MTime INTEGER, ' + \
+                 'Hash TEXT)')
+
+    return conn
+
+def HashFile(fpath,
+             CacheDir=None):
+    """ SHA-256 hash of file content (remembered by size and mod. time)
+
+        Args:
+            fpath (string): path to file
+            CacheDir (string): cache directory to remember hash in [opt]
+
+        Returns:
+            digest (string): hexadecimal hash
+    """
+
+    fpath = os.path.abspath(fpath)
+    st    = os.stat(fpath)
+    ident = (st.st_size,st.st_mtime_ns)
+    if (fpath in _HashCache) and (_HashCache[fpath][:2] == ident):
+        return _HashCache[fpath][2]
+
+    # hash remembered in cache index from an earlier process
+    conn = OpenCache(CacheDir) if CacheDir is not None else None
+    try:
+        digest = None
+        if conn is not None:
+            row = conn.execute('SELECT Size, MTime, Hash FROM files ' + \
+                               'WHERE Path=?',(fpath,)).fetchone()
+            if (row is not None) and (tuple(row[:2]) == ident):
+                digest = row[2]
+        if digest is None:
+            sha = hashlib.sha256()
+            with jr_timing.Stage('cache.hash'), open(fpath,'rb') as f:
+                for block in iter(lambda: f.read(1 << 20),b''):
+                    sha.update(block)
+            digest = sha.hexdigest()
+            jr_timing.Count('bytes.hashed',st.st_size)
+            if conn is not None:
+                with conn:
+                    conn.execute('INSERT OR REPLACE INTO files VALUES ' + \
+                                 '(?,?,?,?)',(fpath,) + ident + (digest,))
+    finally:
+        if conn is not None:
+            conn.close()
+
+    _HashCache[fpath] = ident + (digest,)
+
+    return digest
+
+def HashInputFile(fpath,
+                  Cwd=None,CacheDir=None,_memo=None):
+    """ Location-independent hash of input file and the files it references
+
+        Quoted paths to existing files are replaced by the hash of that file
+        (text input files recursively, see TextEnds) before hashing.
+
+        Args:
+            fpath (string): path to input file
+            Cwd (string): directory relative paths are resolved in [opt,
+                          directory of file]
+            CacheDir (string): cache directory to remember hashes in [opt]
+
+        Returns:
+            digest (string): hexadecimal hash
+    """
+
+    memo  = {} if _memo is None else _memo
+    fpath = os.path.abspath(fpath)
+    if fpath in memo:
+        return memo[fpath]
+    if not fpath.lower().endswith(TextEnds):
+        memo[fpath] = HashFile(fpath,CacheDir=CacheDir)
+        return memo[fpath]
+    memo[fpath] = 'cycle'               # guard against circular references
+
+    if Cwd is None:
+        Cwd = os.path.dirname(fpath)
+    with open(fpath,'r',errors='replace') as f:
+        content = f.read()
+
+    def Replace(match):
+        RefPath = match.group(1)
+        for base in (Cwd,os.path.dirname(fpath)):
+            path = os.path.join(base,RefPath)
+            if os.path.isfile(path):
+                return '\"' + HashInputFile(path,Cwd=Cwd,CacheDir=CacheDir,
+                                           _memo=memo) + '\"'
+        return match.group(0)
+
+    content = re.sub(r'"([^"\n]+)"',Replace,content)
+    memo[fpath] = hashlib.sha256(content.encode()).hexdigest()
+
+    return memo[fpath]
+
+def GetExeHash(ExePath,
+               CacheDir=None):
+    """ Hash identifying the solver (binary content or stand-in command)
+
+        Args:
+            ExePath (string or list): executable, or command prefix
+            CacheDir (string): cache directory to remember hashes in [opt]
+
+        Returns:
+            digest (string): hexadecimal hash
+    """
+
+    Cmd = [ExePath] if isinstance(ExePath,str) else list(ExePath)
+    sha = hashlib.sha256()
+    for arg in Cmd:
+        path = shutil.which(arg) or arg
+        if os.path.isfile(path):
+            sha.update(HashFile(path,CacheDir=CacheDir).encode())
+        else:
+            sha.update(arg.encode())
+        sha.update(b'\0')
+
+    return sha.hexdigest()
+
+def HashRunDirFiles(FastPath,
+                    Cwd=None,CacheDir=None):
+    """ Hash of the files FAST reads from its run directory (see
+        RunDirFiles) for the control modes of a .fst file
+
+        Args:
+            FastPath (string): path to .fst file
+            Cwd (string): directory FAST runs in [opt, directory of file]
+            CacheDir (string): cache directory to remember hashes in [opt]
+
+        Returns:
+            digest (string): hexadecimal hash
+    """
+
+    if Cwd is None:
+        Cwd = os.path.dirname(os.path.abspath(FastPath))
+
+    # control modes set in .fst file
+    keys, modes = [key for key, mode, fnames in RunDirFiles], {}
+    with open(FastPath,'r',errors='replace') as f:
+        for line in f:
+            words = line.split()
+            if (len(words) > 1) and (words[1] in keys):
+                try:
+                    modes[words[1]] = int(words[0])
+                except ValueError:
+                    pass
+
+    names = []
+    for key, mode, fnames in RunDirFiles:
+        if modes.get(key,None) == mode:
+            names += [fname for fname in fnames if fname not in names]
+
+    # missing files are hashed too, so adding one changes the key
+    sha = hashlib.sha256()
+    for fname in names:
+        fpath = os.path.join(Cwd,fname)
+        digest = HashFile(fpath,CacheDir=CacheDir) if os.path.isfile(fpath) \
+                    else 'missing'
+        sha.update('{:s}:{:s}\0'.format(fname,digest).encode())
+
+    return sha.hexdigest()
+
+def GetCaseKey(FastPath,ExePath,
+               Cwd=None,CacheDir=None):
+    """ Cache key of FAST case
+
+        Args:
+            FastPath (string): path to .fst file
+            ExePath (string or list): FAST executable or stand-in command
+            Cwd (string): directory FAST runs in [opt, directory of file]
+            CacheDir (string): cache directory to remember hashes in [opt]
+
+        Returns:
+            key (string): hexadecimal hash
+    """
+
+    with jr_timing.Stage('cache.key'):
+        sha = hashlib.sha256()
+        sha.update(HashInputFile(FastPath,Cwd=Cwd,CacheDir=CacheDir).encode())
+        sha.update(HashRunDirFiles(FastPath,Cwd=Cwd,
+                                   CacheDir=CacheDir).encode())
+        sha.update(GetExeHash(ExePath,CacheDir=CacheDir).encode())
+
+    return sha.hexdigest()
+
+def GetEntryDir(CacheDir,key):
+    """ Directory with cached outputs of key
+    """
+
+    return os.path.join(CacheDir,key[:2],key)
+
+def RestoreOutputs(CacheDir,key,FastPath):
+    """ Copy cached outputs of key next to .fst file (if cached)
+
+        Args:
+            CacheDir (string): cache directory
+            key (string): cache key of case
+            FastPath (string): path to .fst file
+
+        Returns:
+            OutPaths (list): restored output paths, or None on a miss
+    """
+
+    conn = OpenCache(CacheDir)
+    try:
+        row = conn.execute('SELECT Exts FROM entries WHERE Key=?',
+                           (key,)).fetchone()
+        EntryDir = GetEntryDir(CacheDir,key)
+        if (row is None) or (not os.path.isdir(EntryDir)):
+            jr_timing.Count('cache.miss')
+            return None
+
+        RootPath = os.path.splitext(FastPath)[0]
+        OutPaths = []
+        with jr_timing.Stage('cache.restore'):
+            for ext in row[0].split():
+                OutPath = RootPath + ext
+                tmpPath = OutPath + '.{:d}.{:d}.tmp'.format(os.getpid(),
+                                                threading.get_ident())
+                shutil.copyfile(os.path.join(EntryDir,'case' + ext),tmpPath)
+                os.replace(tmpPath,OutPath)
+                OutPaths.append(OutPath)
+        with conn:
+            conn.execute('UPDATE entries SET Used=?, Hits=Hits+1 ' + \
+                         'WHERE Key=?',(time.time(),key))
+        jr_timing.Count('cache.hit')
+    finally:
+        conn.close()
+
+    return OutPaths
+
+def StoreOutputs(CacheDir,key,OutPaths,
+                 MaxMB=None):
+    """ Add outputs of a finished case to the cache
+
+        Args:
+            CacheDir (string): cache directory
+            key (string): cache key of case
+            OutPaths (list): paths to output files (see OutEnds)
+            MaxMB (float): size limit of cache in MB [opt, no limit]
+    """
+
+    if not OutPaths:
+        return
+
+    # copy to temporary directory (unique per thread), then move into
+    #   place in one step
+    EntryDir = GetEntryDir(CacheDir,key)
+    os.makedirs(os.path.dirname(EntryDir),exist_ok=True)
+    tmpDir   = tempfile.mkdtemp(suffix='.tmp',prefix=key + '.',
+                                dir=os.path.dirname(EntryDir))
+    exts, n_bytes = [], 0
+    with jr_timing.Stage('cache.store'):
+        for OutPath in OutPaths:
+            ext = os.path.splitext(OutPath)[1]
+            shutil.copyfile(OutPath,os.path.join(tmpDir,'case' + ext))
+            n_bytes += os.path.getsize(OutPath)
+            exts.append(ext)
+    os.chmod(tmpDir,0o755)
+    try:
+        os.replace(tmpDir,EntryDir)
+    except OSError:
+        if not os.path.isdir(EntryDir):
+            raise
+        shutil.rmtree(tmpDir)           # stored by another thread/process
+
+    conn = OpenCache(CacheDir)
+    try:
+        with conn:
+            conn.execute('INSERT OR REPLACE INTO entries VALUES ' + \
+                         '(?,?,?,?,?,0)',(key,n_bytes,' '.join(exts),
+                                          time.time(),time.time()))
+    finally:
+        conn.close()
+
+    if MaxMB is not None:
+        EvictCache(CacheDir,MaxMB)
+
+    return
+
+def EvictCache(CacheDir,MaxMB):
+    """ Remove least recently used entries until cache fits size limit
+
+        Args:
+            CacheDir (string): cache directory
+            MaxMB (float): size limit of cache in MB
+
+        Returns:
+            n_evicted (int): number of removed entries
+    """
+
+    conn = OpenCache(CacheDir)
+    try:
+        rows = conn.execute('SELECT Key, Bytes FROM entries ' + \
+                            'ORDER BY Used DESC').fetchall()
+        total, evict = 0, []
+        for key, n_bytes in rows:
+            total += n_bytes
+            if total > MaxMB * 2**20:
+                evict.append(key)
+        with conn:
+            conn.executemany('DELETE FROM entries WHERE Key=?',
+                             [(key,) for key in evict])
+    finally:
+        conn.close()
+
+    for key in evict:
+        shutil.rmtree(GetEntryDir(CacheDir,key),ignore_errors=True)
+    jr_timing.Count('cache.evicted',len(evict))
+
+    return len(evict)
+
+def GetCacheSummary(CacheDir):
+    """ Number of entries, size and hits of result cache
+
+        Args:
+            CacheDir (string): cache directory
+
+        Returns:
+            summary (dictionary): 'Entries', 'Bytes' and 'Hits'
+    """
+
+    conn = OpenCache(CacheDir)
+    try:
+        row = conn.execute('SELECT COUNT(*), COALESCE(SUM(Bytes),0), ' + \
+                           'COALESCE(SUM(Hits),0) FROM entries').fetchone()
+    finally:
+        conn.close()
+
+    return {'Entries':row[0],'Bytes':row[1],'Hits':row[2]}
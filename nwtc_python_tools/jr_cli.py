@@ -0,0 +1,313 @@
+"""
+Command-line entry point for writing FAST/AeroDyn and TurbSim input files
+for many cases in one Python process.
+
+AUTHOR:  Jenni Rinker, Duke University
+CONTACT: jennifer.rinker@duke.edu
+
+
+NOTES:
+    Replaces one "python <script> <case>" call per simulation (as in
+    Template_FastInpBat.bat and Template_TurbSimInpBat.bat) with one call
+    per batch, so the interpreter start-up and imports are paid once:
+
+        python jr_cli.py fastad --TurbName WP0.75A08V00 --ModlDir <ModlDir>
+                         --FastDir <FastDir> --manifest cases.txt
+        python jr_cli.py turbsim --TmplDir <TmplDir> --WrDir <WindDir> < cases.txt
+
+    Cases are read from the manifest ("-" or no manifest and no case on the
+    command line reads stdin), one case per line. Empty lines and lines
+    starting with "#" are skipped. A line is either a JSON object or
+    whitespace-separated tokens:
+        fastad:  WindPath [FastName] [KEY=VALUE ...]
+        turbsim: URef TurbClass i_seed [KEY=VALUE ...]
+    KEY=VALUE pairs (and --set KEY=VALUE for all cases) give initial
+    conditions/TMax/TStart for fastad or TurbSim parameters for turbsim.
+    A single case can also be given directly on the command line.
+
+    Only the standard library is imported at start-up; the jr_ modules
+    (and numpy/scipy, only where a code path needs them) are imported when
+    the first case is processed. One line per case is printed ("ok" or
+    "failed"), and the exit code is 1 if any case failed.
+
+"""
+
+# module dependencies
+import os, sys, json, shlex, argparse, contextlib
+
+
+# turbine dictionaries loaded in this batch: path -> TurbDict
+_TurbDicts = {}
+
+
+def ParseValue(value):
+    """ Number, list or boolean from string, else the string itself
+
+        Args:
+            value (string): value from command line or manifest
+
+        Returns:
+            value (object): parsed value
+    """
+
+    try:
+        return json.loads(value)
+    except ValueError:
+        return value
+
+def ParseCaseLine(line):
+    """ Positional tokens and keyword values of one manifest line
+
+        Args:
+            line (string): manifest line (JSON object or tokens)
+
+        Returns:
+            tokens (list): positional tokens
+            kwargs (dictionary): KEY=VALUE pairs or JSON object
+    """
+
+    line = line.strip()
+    if line.startswith('{'):
+        return [], json.loads(line)
+
+    tokens, kwargs = [], {}
+    for token in shlex.split(line):
+        if ('=' in token) and not os.path.exists(token):
+            key, value = token.split('=',1)
+            kwargs[key] = ParseValue(value)
+        else:
+            tokens.append(token)
+
+    return tokens, kwargs
+
+def ReadCases(fpath=None,
+              args=None):
+    """ Cases from command line, manifest file or stdin
+
+        Args:
+            fpath (string): path to manifest, or '-' for stdin [opt]
+            args (list): tokens of a single case from the command line [opt]
+
+        Returns:
+            cases (generator): (line number, tokens, kwargs) of each case
+    """
+
+    if args:
+        tokens, kwargs = ParseCaseLine(' '.join([shlex.quote(a) \
+                                                    for a in args]))
+        yield 0, tokens, kwargs
+        return
+
+    f = sys.stdin if fpath in (None,'-') else open(fpath,'r')
+    try:
+        for i_line, line in enumerate(f,1):
+            if (not line.strip()) or line.lstrip().startswith('#'):
+                continue
+            tokens, kwargs = ParseCaseLine(line)
+            yield i_line, tokens, kwargs
+    finally:
+        if f is not sys.stdin:
+            f.close()
+
+def RunFastADCase(opts,tokens,kwargs):
+    """ Write FAST/AeroDyn files for one case
+
+        Args:
+            opts (argparse.Namespace): command-line options
+            tokens (list): WindPath [FastName]
+            kwargs (dictionary): per-case values (TurbName, ModlDir,
+                                 FastDir, WindPath, FastName and
+                                 WriteFastADOne keyword arguments)
+
+        Returns:
+            FastPath (string): path to .fst file
+    """
+
+    import jr_fast
+
+    case = dict(opts.set)
+    case.update(kwargs)
+    if tokens:
+        case['WindPath'] = tokens[0]
+    if len(tokens) > 1:
+        case['FastName'] = tokens[1]
+
+    TurbName = case.pop('TurbName',opts.TurbName)
+    ModlDir  = case.pop('ModlDir',opts.ModlDir)
+    FastDir  = case.pop('FastDir',opts.FastDir)
+    WindPath = case.pop('WindPath',None)
+    for name, value in (('TurbName',TurbName),('ModlDir',ModlDir),
+                        ('FastDir',FastDir),('WindPath',WindPath)):
+        if value is None:
+            errStr = 'No {:s} given for case.'.format(name)
+            raise ValueError(errStr)
+    FastName = case.pop('FastName',None) or \
+                jr_fast.GetFastName(TurbName,WindPath,opts.Naming)
+
+    case.setdefault('StoreDir',opts.StoreDir)
+    case.setdefault('Channels',opts.Channels)
+    case.setdefault('OutRate',opts.OutRate)
+    case.setdefault('StageDir',opts.StageDir)
+    case.setdefault('StageMB',opts.StageMB)
+    jr_fast.WriteFastADOne(TurbName,WindPath,FastName,ModlDir,FastDir,
+                           version=opts.version,**case)
+
+    return os.path.join(FastDir,FastName + '.fst')
+
+def RunTurbSimCase(opts,tokens,kwargs):
+    """ Write TurbSim input file for one case
+
+        Args:
+            opts (argparse.Namespace): command-line options
+            tokens (list): URef TurbClass i_seed
+            kwargs (dictionary): TurbSim parameters (a JSON case must give
+                                 'TSName' or 'URef', 'IECturbc', 'i_seed')
+
+        Returns:
+            InpPath (string): path to TurbSim input file
+    """
+
+    import jr_wind
+
+    # turbine dictionary is loaded once per batch
+    TurbDict = None
+    if opts.TurbDict is not None:
+        if opts.TurbDict not in _TurbDicts:
+            with open(opts.TurbDict,'r') as f:
+                _TurbDicts[opts.TurbDict] = json.load(f)
+        TurbDict = _TurbDicts[opts.TurbDict]
+
+    TSDefaults = jr_wind.GetTurbSimDefaults(TurbDict)
+    TSDefaults.update(opts.set)
+    case = dict(kwargs)
+    if tokens:
+        if len(tokens) != 3:
+            errStr = 'TurbSim case needs \"URef TurbClass i_seed\".'
+            raise ValueError(errStr)
+        case.update({'URef':float(tokens[0]),'IECturbc':tokens[1],
+                     'i_seed':int(tokens[2])})
+
+    # name and seeds from case parameters unless given explicitly
+    if 'TSName' in case:
+        TSDict = dict(TSDefaults)
+    else:
+        TSDict = jr_wind.GetTurbSimCase(case['URef'],case['IECturbc'],
+                                        case.pop('i_seed'),
+                                        TSDefaults=TSDefaults,
+                                        BaseSeed=opts.BaseSeed)
+    TSDict.update(case)
+
+    return jr_wind.WriteTurbSimFile(TSDict,opts.TmplDir,opts.WrDir)
+
+def GetParser():
+    """ Command-line parser
+
+        Returns:
+            parser (argparse.ArgumentParser): parser with 'fastad' and
+                                              'turbsim' commands
+    """
+
+    def KeyValue(s):
+        if '=' not in s:
+            raise argparse.ArgumentTypeError('expected KEY=VALUE')
+        key, value = s.split('=',1)
+        return key, ParseValue(value)
+
+    parser = argparse.ArgumentParser(description='Write input files for ' + \
+                                     'many cases in one process.')
+    commands = parser.add_subparsers(dest='command')
+    commands.required = True
+
+    # options shared by both commands
+    common = argparse.ArgumentParser(add_help=False)
+    common.add_argument('--manifest',help='file with one case per line ' + \
+                        '(\"-\" for stdin)')
+    common.add_argument('--set',type=KeyValue,action='append',default=[],
+                        metavar='KEY=VALUE',help='value for all cases')
+    common.add_argument('--keep-going',action='store_true',
+                        help='continue after a failed case')
+    common.add_argument('--timing',action='store_true',
+                        help='print per-stage timing summary to stderr')
+    common.add_argument('case',nargs='*',help='single case (see NOTES)')
+
+    fastad = commands.add_parser('fastad',parents=[common],
+                                 help='FAST/AeroDyn files (WriteFastADOne)')
+    fastad.add_argument('--TurbName',help='turbine name')
+    fastad.add_argument('--ModlDir',help='directory with model files')
+    fastad.add_argument('--FastDir',help='directory to write files to')
+    fastad.add_argument('--Naming',type=int,default=1,
+                        help='FAST file naming convention (1 or 2)')
+    fastad.add_argument('--version',type=int,default=7,
+                        help='FAST version')
+    fastad.add_argument('--StoreDir',help='content-addressed store for ' + \
+                        'written files (see jr_store)')
+    fastad.add_argument('--Channels',type=lambda s: s.split(','),
+                        help='comma-separated output channels needed ' + \
+                        '(OutList is reduced to these)')
+    fastad.add_argument('--OutRate',type=float,
+                        help='output rate needed [Hz] (sets DecFact)')
+    fastad.add_argument('--StageDir',help='node-local directory to stage ' + \
+                        'wind and model files to (see jr_stage)')
+    fastad.add_argument('--StageMB',type=float,
+                        help='size limit of StageDir [MB]')
+
+    turbsim = commands.add_parser('turbsim',parents=[common],
+                                  help='TurbSim input files')
+    turbsim.add_argument('--TmplDir',required=True,
+                         help='directory with Template_TurbSim.inp')
+    turbsim.add_argument('--WrDir',required=True,
+                         help='directory to write files to')
+    turbsim.add_argument('--TurbDict',help='turbine dictionary (JSON) ' + \
+                         'to size grid')
+    turbsim.add_argument('--BaseSeed',type=int,default=0,
+                         help='campaign-level seed offset')
+
+    return parser
+
+def main(argv=None):
+    """ Process all cases of a batch
+
+        Args:
+            argv (list): command-line arguments [opt, sys.argv[1:]]
+
+        Returns:
+            n_failed (int): number of failed cases
+    """
+
+    opts = GetParser().parse_args(argv)
+    opts.set = dict(opts.set)
+    RunCase = {'fastad':RunFastADCase,'turbsim':RunTurbSimCase}[opts.command]
+
+    n_done, n_failed = 0, 0
+    with contextlib.ExitStack() as stack:
+
+        # time stages of whole batch if requested
+        if opts.timing:
+            import jr_timing
+            sink = stack.enter_context(jr_timing.Timing())
+
+        for i_line, tokens, kwargs in ReadCases(opts.manifest,opts.case):
+            try:
+                fpath = RunCase(opts,tokens,kwargs)
+            except Exception as err:
+                n_failed += 1
+                sys.stdout.write('failed line {:d}: {:s}\n'.format(i_line,
+                                 repr(err)))
+                if not opts.keep_going:
+                    break
+            else:
+                n_done += 1
+                sys.stdout.write('ok {:s}\n'.format(fpath))
+            sys.stdout.flush()
+
+    if opts.timing:
+        sys.stderr.write(jr_timing.FormatSummary(sink.summary) + '\n')
+
+    sys.stderr.write('{:d} case(s) written, {:d} failed.\n'.format(n_done,
+                     n_failed))
+
+    return n_failed
+
+
+if __name__ == '__main__':
+    sys.exit(1 if main() else 0)
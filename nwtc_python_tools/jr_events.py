@@ -0,0 +1,310 @@
+"""
+A series of Python functions for finding extreme wind events (gusts,
+direction changes, shear and veer) in a library of full-field wind files.
+
+AUTHOR:  Jenni Rinker, Duke University
+CONTACT: jennifer.rinker@duke.edu
+
+
+NOTES:
+    Each file is streamed in blocks of time steps (jr_wind.ReadWindBlocks),
+    so only one block is in memory per worker. For every time step the
+    rotor-averaged u, rotor-averaged direction and the vertical gradients
+    of u and direction over the rotor are computed, plus the moving
+    average of u at every rotor point over the gust duration. The metrics
+    are then moving averages over the gust duration TGust:
+        'URotor'    - rotor-averaged u [m/s]
+        'UPoint'    - largest u at a single rotor point [m/s]
+        'DirChange' - range of rotor-averaged direction within TDir [deg]
+        'Shear'     - magnitude of difference in u over rotor diameter [m/s]
+        'Veer'      - magnitude of difference in direction over rotor
+                      diameter [deg]
+    The largest non-overlapping events of each metric in each file are
+    ranked across the library.
+
+"""
+
+# module dependencies
+import jr_wind, jr_timing
+import os, csv
+from concurrent.futures import ProcessPoolExecutor
+import numpy as np
+
+
+# event metrics
+Metrics = ('URotor','UPoint','DirChange','Shear','Veer')
+
+# possible wind file endings (binary full-field files)
+WindEnds = ('.bts','.wnd','.bl')
+
+
+def GetWindGrid(header):
+    """ Lateral and vertical coordinates of grid points
+
+        Args:
+            header (dictionary): header from jr_wind.ReadWindHeader
+
+        Returns:
+            y (numpy array): [n_y] lateral coordinates (0 at hub) [m]
+            z (numpy array): [n_z] heights [m]
+    """
+
+    n_y, n_z = header['n_y'], header['n_z']
+    y = header['dy'] * (np.arange(n_y) - (n_y - 1) / 2.)
+    if 'z0' in header:
+        z = header['z0'] + header['dz'] * np.arange(n_z)
+    else:
+        z = header['zhub'] + header['dz'] * (np.arange(n_z) - (n_z - 1) / 2.)
+
+    return y, z
+
+def MovingMean(x,n_w,
+               axis=-1):
+    """ Mean over all windows of n_w samples (no padding)
+
+        Args:
+            x (numpy array): values
+            n_w (int): samples per window
+            axis (int): axis of time [opt]
+
+        Returns:
+            x_w (numpy array): window means, n_w - 1 fewer samples on axis
+    """
+
+    x  = np.moveaxis(np.asarray(x,dtype=float),axis,-1)
+    cs = np.cumsum(x,axis=-1)
+    cs = np.concatenate([np.zeros(x.shape[:-1] + (1,)),cs],axis=-1)
+    x_w = (cs[...,n_w:] - cs[...,:-n_w]) / n_w
+
+    return np.moveaxis(x_w,-1,axis)
+
+def GetEventSeries(WindPath,
+                   RotRad=None,TGust=3.,TDir=10.,n_block=1024):
+    """ Time series of event metrics of one wind file
+
+        Args:
+            WindPath (string): path to binary wind file
+            RotRad (float): rotor radius [opt, largest circle in grid]
+            TGust (float): gust duration (averaging window) [s] [opt]
+            TDir (float): window for direction changes [s] [opt]
+            n_block (int): time steps read at once [opt]
+
+        Returns:
+            series (dictionary): 'Time' of start of each window [s] and
+                                 one array per metric (see Metrics)
+    """
+
+    header = jr_wind.ReadWindHeader(WindPath)
+    dt     = header['dt']
+    y, z   = GetWindGrid(header)
+    zhub   = header['zhub']
+    if RotRad is None:
+        RotRad = min(y[-1],z[-1] - zhub,zhub - z[0])
+
+    # points in rotor disk, weights of least-squares vertical gradient
+    Z, Y = np.meshgrid(z,y,indexing='ij')
+    rotor = ((Y**2 + (Z - zhub)**2) <= RotRad**2 + 1e-9)
+    if not rotor.any():
+        errStr = 'No grid points within rotor radius {:.1f} m.'.format(
+                                                                RotRad)
+        raise ValueError(errStr)
+    z_p  = Z[rotor]
+    z_p  = z_p - z_p.mean()
+    w_dz = z_p / max((z_p**2).sum(),1e-12)
+    D    = 2. * RotRad
+
+    n_w = max(int(round(TGust / dt)),1)
+    raw = {'URotor':[],'Direction':[],'Shear':[],'Veer':[]}
+    UPoint, carry = [], None
+    with jr_timing.Stage('events.stream'):
+        for i_t0, turb in jr_wind.ReadWindBlocks(WindPath,n_block=n_block):
+            u = turb[0][rotor].astype(float)           # [n_p x n_b]
+            v = turb[1][rotor].astype(float)
+            u_m, v_m = u.mean(axis=0), v.mean(axis=0)
+            raw['URotor'].append(u_m)
+            raw['Direction'].append(np.arctan2(v_m,u_m))
+            raw['Shear'].append(D * w_dz.dot(u))
+            raw['Veer'].append(D * np.degrees(w_dz.dot(np.arctan2(v,u))))
+
+            # moving mean at each point, carrying last n_w-1 steps over
+            if carry is not None:
+                u = np.concatenate([carry,u],axis=1)
+            if u.shape[1] >= n_w:
+                UPoint.append(MovingMean(u,n_w,axis=1).max(axis=0))
+            carry = u[:,max(u.shape[1] - (n_w - 1),0):] if n_w > 1 \
+                        else None
+
+    with jr_timing.Stage('events.window'):
+        raw = {key:np.concatenate(raw[key]) for key in raw}
+        series = {'URotor':MovingMean(raw['URotor'],n_w),
+                  'UPoint':np.concatenate(UPoint) if UPoint \
+                                else np.zeros(0),
+                  'Shear':np.abs(MovingMean(raw['Shear'],n_w)),
+                  'Veer':np.abs(MovingMean(raw['Veer'],n_w))}
+
+        # direction range over TDir of gust-averaged (unwrapped) direction
+        direc = np.degrees(MovingMean(np.unwrap(raw['Direction']),n_w))
+        n_d   = min(max(int(round(TDir / dt)) - n_w + 1,1),direc.size)
+        if n_d:
+            windows = np.lib.stride_tricks.sliding_window_view(direc,n_d)
+            dirchg  = windows.max(axis=1) - windows.min(axis=1)
+        else:
+            dirchg = np.zeros(0)
+        series['DirChange'] = np.concatenate([dirchg,
+                                    np.zeros(series['URotor'].size - \
+                                             dirchg.size)])
+        series['Time'] = dt * np.arange(series['URotor'].size)
+
+    return series
+
+def GetPeakEvents(values,n_events,n_sep):
+    """ Largest values separated by at least n_sep samples
+
+        Args:
+            values (numpy array): metric time series
+            n_events (int): maximum number of events
+            n_sep (int): minimum separation of events [samples]
+
+        Returns:
+            indices (list): indices of events, largest first
+    """
+
+    values  = np.array(values,dtype=float)
+    indices = []
+    for i_event in range(n_events):
+        if (not values.size) or np.all(np.isneginf(values)):
+            break
+        i_max = int(np.argmax(values))
+        indices.append(i_max)
+        values[max(i_max - n_sep + 1,0):i_max + n_sep] = -np.inf
+
+    return indices
+
+def GetFileEvents(WindPath,
+                  RotRad=None,n_events=5,TGust=3.,TDir=10.,n_block=1024,
+                  metrics=Metrics):
+    """ Largest events of each metric in one wind file
+
+        Args:
+            WindPath (string): path to binary wind file
+            RotRad (float): rotor radius [opt]
+            n_events (int): events per metric [opt]
+            TGust (float): gust duration [s] [opt]
+            TDir (float): window for direction changes [s] [opt]
+            n_block (int): time steps read at once [opt]
+            metrics (list): metrics to search [opt]
+
+        Returns:
+            events (list): event dictionaries ('Metric', 'Value',
+                           'WindPath', 'TStart', 'TEnd')
+    """
+
+    series = GetEventSeries(WindPath,RotRad=RotRad,TGust=TGust,TDir=TDir,
+                            n_block=n_block)
+    dt     = series['Time'][1] - series['Time'][0] \
+                if series['Time'].size > 1 else TGust
+
+    events = []
+    for metric in metrics:
+        TWin  = TDir if metric == 'DirChange' else TGust
+        n_sep = max(int(round(TWin / dt)),1)
+        for i_t in GetPeakEvents(series[metric],n_events,n_sep):
+            events.append({'Metric':metric,
+                           'Value':float(series[metric][i_t]),
+                           'WindPath':WindPath,
+                           'TStart':float(series['Time'][i_t]),
+                           'TEnd':float(series['Time'][i_t] + TWin)})
+
+    return events
+
+def _GetFileEvents(args):
+    """ GetFileEvents with tuple of arguments (for process pool)
+    """
+
+    WindPath, kwargs = args
+    try:
+        return GetFileEvents(WindPath,**kwargs)
+    except Exception as err:
+        return [{'Metric':None,'Value':None,'WindPath':WindPath,
+                 'TStart':None,'TEnd':None,'Error':repr(err)}]
+
+def SearchEvents(WindPaths,
+                 RotRad=None,n_events=5,TGust=3.,TDir=10.,n_block=1024,
+                 metrics=Metrics,n_workers=1,verbose=0):
+    """ Ranked table of the largest wind events across a wind library
+
+        Args:
+            WindPaths (list or string): paths to wind files, or directory
+                                        with wind files
+            RotRad (float): rotor radius [opt, largest circle in grid]
+            n_events (int): events per metric and file [opt]
+            TGust (float): gust duration [s] [opt]
+            TDir (float): window for direction changes [s] [opt]
+            n_block (int): time steps read at once [opt]
+            metrics (list): metrics to search (see Metrics) [opt]
+            n_workers (int): number of worker processes [opt]
+            verbose (int): flag to suppress print statements [opt]
+
+        Returns:
+            table (list): event dictionaries ('Metric', 'Rank', 'Value',
+                          'WindPath', 'TStart', 'TEnd'), largest first for
+                          each metric
+            failed (list): event dictionaries of files that could not be
+                           searched ('WindPath', 'Error')
+    """
+
+    if isinstance(WindPaths,str):
+        WindPaths = [os.path.join(WindPaths,f) for f in \
+                        sorted(os.listdir(WindPaths)) if f.endswith(WindEnds)]
+    for metric in metrics:
+        if metric not in Metrics:
+            errStr = 'Unknown event metric \"{:s}\".'.format(metric)
+            raise ValueError(errStr)
+
+    if verbose:
+        print('\nSearching {:d} wind files for events...'.format(
+                                                        len(WindPaths)))
+
+    kwargs = {'RotRad':RotRad,'n_events':n_events,'TGust':TGust,
+              'TDir':TDir,'n_block':n_block,'metrics':metrics}
+    args   = [(WindPath,kwargs) for WindPath in WindPaths]
+    if n_workers > 1:
+        with ProcessPoolExecutor(max_workers=n_workers) as pool:
+            results = list(pool.map(_GetFileEvents,args,chunksize=4))
+    else:
+        results = [_GetFileEvents(arg) for arg in args]
+
+    events = [event for result in results for event in result]
+    failed = [event for event in events if 'Error' in event]
+
+    # rank events of each metric across library
+    table = []
+    for metric in metrics:
+        ranked = sorted([event for event in events \
+                            if event['Metric'] == metric],
+                        key=lambda event: -event['Value'])
+        for i_rank, event in enumerate(ranked,1):
+            event['Rank'] = i_rank
+            table.append(event)
+
+    if verbose:
+        print('done. {:d} events, {:d} files failed.'.format(len(table),
+                                                             len(failed)))
+
+    return table, failed
+
+def WriteEventTable(table,fpath):
+    """ Save event table as comma-separated file
+
+        Args:
+            table (list): event dictionaries from SearchEvents
+            fpath (string): path to write file to
+    """
+
+    fields = ['Metric','Rank','Value','WindPath','TStart','TEnd']
+    with open(fpath,'w',newline='') as f:
+        writer = csv.DictWriter(f,fields,extrasaction='ignore')
+        writer.writeheader()
+        writer.writerows(table)
+
+    return
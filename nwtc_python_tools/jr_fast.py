@@ -16,14 +16,20 @@ TODO:
 """
 
 # module dependencies
-import jr_wind
+import jr_wind, jr_journal, jr_timing, jr_store
 import os, sys, json
-import scipy.io as scio
-import numpy as np
 
+# scipy.io and numpy are imported where needed, so that writing input files
+#   without an IC look-up table does not pay for importing them
 
+
+# cache of loaded IC look-up tables: path -> (modification time, keys, LUT)
+_LUTCache = {}
+
+
+@jr_timing.Timed
 def WriteFastADAll(TurbName,ModlDir,WindDir,FastDir,
-                   version=7,Naming=1,
+                   version=7,Naming=1,JournalPath=None,resume=0,
                    **kwargs):
     """ Write FAST and AeroDyn input files for all wind files in directory
     
@@ -37,6 +43,10 @@ def WriteFastADAll(TurbName,ModlDir,WindDir,FastDir,
             Naming (string): flag for naming convention for FAST files [opt]
                                 1 = '<WindName>.fst'
                                 2 = '<TurbName>_<WindName>.fst'
+            JournalPath (string): path to campaign journal to record
+                                  written cases in (see jr_journal) [opt]
+            resume (int): flag to skip cases the journal records as
+                          written [opt]
             kwargs (dictionary): keyword arguments to WriteFastADOne [opt]
     """
     
@@ -45,27 +55,74 @@ def WriteFastADAll(TurbName,ModlDir,WindDir,FastDir,
             
     # get list of wind files from directory
     WindNames = [f for f in os.listdir(WindDir) if f.endswith(wind_ends)]
+    
+    # skip cases already written if resuming
+    if resume and (JournalPath is not None):
+        FastNames = [GetFastName(TurbName,WindName,Naming) \
+                        for WindName in WindNames]
+        todo      = set(jr_journal.GetResumeCases(JournalPath,FastNames,
+                                                  stage='write'))
+        WindNames = [WindNames[i] for i in range(len(WindNames)) \
+                        if FastNames[i] in todo]
 
     # loop through wind files
     for WindName in WindNames:
         WindPath = os.path.join(WindDir,WindName)
         
         # set filename according to naming conventions
-        if Naming == 1:
-            FastName = os.path.splitext(WindName)[0]
-        elif Naming == 2:
-            FastName = TurbName + '_' + os.path.splitext(WindName)[0]
+        FastName = GetFastName(TurbName,WindName,Naming)
             
         # write FAST/AD files for 
-        WriteFastADOne(TurbName,WindPath,FastName,
-                       ModlDir,FastDir,version=version,
-                       **kwargs)
+        try:
+            WriteFastADOne(TurbName,WindPath,FastName,
+                           ModlDir,FastDir,version=version,
+                           **kwargs)
+        except Exception as err:
+            if JournalPath is not None:
+                jr_journal.SetCaseState(JournalPath,FastName,'failed',
+                                        WindPath=WindPath,Error=str(err))
+            raise
+            
+        # record written case
+        if JournalPath is not None:
+            jr_journal.SetCaseState(JournalPath,FastName,'written',
+                                    WindPath=WindPath,
+                                    FastPath=os.path.join(FastDir,
+                                                          FastName+'.fst'),
+                                    ExitCode=None,OutHash=None,Error=None)
+        jr_timing.Count('cases')
     
     return
     
+def GetFastName(TurbName,WindName,Naming=1):
+    """ Name of FAST file for wind file according to naming convention
+    
+        Args:
+            TurbName (string): turbine name
+            WindName (string): name or path of wind file
+            Naming (string): flag for naming convention for FAST files [opt]
+                                1 = '<WindName>.fst'
+                                2 = '<TurbName>_<WindName>.fst'
+                                
+        Returns:
+            FastName (string): name for .fst file without extension
+    """
+    
+    WindName = os.path.splitext(os.path.basename(WindName))[0]
+    if Naming == 1:
+        FastName = WindName
+    elif Naming == 2:
+        FastName = TurbName + '_' + WindName
+    else:
+        errStr = 'Uncoded naming convention \"{:d}\".'.format(Naming)
+        raise ValueError(errStr)
+        
+    return FastName
+    
+@jr_timing.Timed
 def WriteFastADOne(TurbName,WindPath,FastName,ModlDir,FastDir,
-                   version=7,verbose=0,
-                   **kwargs):
+                   version=7,StoreDir=None,Channels=None,OutRate=None,
+                   StageDir=None,StageMB=None,verbose=0,**kwargs):
     """ Write FAST and AeroDyn input files for specified wind file
     
         Possible keyword arguments inclue any FAST initial conditions plus
@@ -79,6 +136,17 @@ def WriteFastADOne(TurbName,WindPath,FastName,ModlDir,FastDir,
                               Blade, Tower, Pitch files)
             FastDir (string): directory to write FAST & AeroDyn files to
             version (int): FAST version (7 or 8) [opt]
+            StoreDir (string): content-addressed store to write unique
+                               files to and link outputs to (see
+                               jr_store) [opt]
+            Channels (list): output channels needed; OutList is reduced to
+                             these (see GetPrunedOutputs) [opt]
+            OutRate (float): output rate needed [Hz]; sets DecFact [opt]
+            StageDir (string): node-local directory to stage wind and
+                               model files to; the written files reference
+                               the staged copies, which stay pinned until
+                               the case ran (see jr_stage) [opt]
+            StageMB (float): size limit of StageDir in MB [opt]
             verbose (int): flag to suppress print statements [opt]
             kwargs (dictionary): keyword arguments to WriteFastADOne [opt]
                  
@@ -112,10 +180,10 @@ def WriteFastADOne(TurbName,WindPath,FastName,ModlDir,FastDir,
                         'look-up table {:s}'.format(LUTPath))
                     
             # get list of keys corresponding to initial conditions and LUT keys
+            import numpy as np
             IC_keys  = GetICKeys(version)
-            mdict    = scio.loadmat(LUTPath,squeeze_me=True)
-            LUT_keys = [str(s).strip() for s in mdict['Fields']]
-            LUT      = mdict['SS']
+            LUT_keys, LUT = LoadSSLUT(LUTPath)
+            u0 = None
             
             # loop through IC keys
             for i_key in range(len(IC_keys)):
@@ -135,8 +203,9 @@ def WriteFastADOne(TurbName,WindPath,FastName,ModlDir,FastDir,
                 if ((not [key for key in kwargs if IC_key in kwargs]) and \
                     LUT_key):
                         
-                    # get grid-averaged first wind speed
-                    u0 = jr_wind.GetFirstWind(WindDict['WindFile'])
+                    # get grid-averaged first wind speed (once per file)
+                    if u0 is None:
+                        u0 = jr_wind.GetFirstWind(WindDict['WindFile'])
                     
                     # linearly interpolate initial condition
                     IC = np.interp(u0,LUT[:,LUT_keys.index('WindVxi')],
@@ -157,25 +226,43 @@ def WriteFastADOne(TurbName,WindPath,FastName,ModlDir,FastDir,
         WindDict['ADFile'] = os.path.join(FastDir,ADPath)
         
         
-        # write AeroDyn file
-        with open(ADTempPath,'r') as f_temp:
-            with open(ADPath,'w') as f_write:
-                for line in f_temp:
-                    if ('{:' in line):
-                        field = line.split()[1]
-                        f_write.write(line.format(WindDict[field]))
-                    else:
-                        f_write.write(line)
-                    
-        # write FAST file
-        with open(FastTempPath,'r') as f_temp:
-            with open(FastPath,'w') as f_write:
+        # render AeroDyn file and FAST file
+        rendered = []
+        for TempPath, WrPath, stage in ((ADTempPath,ADPath,'ad'),
+                                        (FastTempPath,FastPath,'fst')):
+            w_lines = []
+            with jr_timing.Stage('render.' + stage), open(TempPath,'r') as f_temp:
                 for line in f_temp:
                     if ('{:' in line):
                         field = line.split()[1]
-                        f_write.write(line.format(WindDict[field]))
+                        w_lines.append(line.format(WindDict[field]))
                     else:
-                        f_write.write(line)
+                        w_lines.append(line)
+            if (stage == 'fst') and ((Channels is not None) or \
+                                     (OutRate is not None)):
+                w_lines = PruneFstLines(w_lines,Channels=Channels,
+                                        OutRate=OutRate)
+            rendered.append((WrPath,stage,w_lines))
+
+        # point referenced files (wind, blade, tower, pitch, airfoils) to
+        #   node-local copies
+        if StageDir is not None:
+            import jr_stage
+            SrcPaths = jr_stage.GetReferencedFiles( \
+                            [line for WrPath, stage, w_lines in rendered \
+                                for line in w_lines],skip=(ADPath,FastPath))
+            StagedPaths = jr_stage.StageFiles(SrcPaths,StageDir,
+                                              MaxMB=StageMB,
+                                              Case=os.path.abspath(FastPath))
+            rendered = [(WrPath,stage,
+                         jr_stage.ReplacePaths(w_lines,StagedPaths)) \
+                            for WrPath, stage, w_lines in rendered]
+
+        # write AeroDyn file, then FAST file
+        for WrPath, stage, w_lines in rendered:
+            with jr_timing.Stage('write.' + stage), \
+                    jr_store.OpenOutput(WrPath,StoreDir) as f_write:
+                f_write.writelines(w_lines)
                         
     else:
         errStr = 'Code for FAST v8 has not yet been coded'
@@ -183,6 +270,52 @@ def WriteFastADOne(TurbName,WindPath,FastName,ModlDir,FastDir,
                              
     return
     
+def LoadSSLUT(LUTPath):
+    """ Field names and values of steady-state look-up table
+    
+        Tables are cached by path and modification time, so a long-lived
+        process loads each table only once.
+    
+        Args:
+            LUTPath (string): path to look-up table
+            
+        Returns:
+            LUT_keys (list): field names (first is 'WindVxi')
+            LUT (numpy array): [n_U x n_fields] steady-state values
+    """
+    
+    mtime = os.path.getmtime(LUTPath)
+    if (LUTPath in _LUTCache) and (_LUTCache[LUTPath][0] == mtime):
+        return _LUTCache[LUTPath][1:]
+    
+    import scipy.io as scio
+    with jr_timing.Stage('read.lut'):
+        mdict = scio.loadmat(LUTPath,squeeze_me=True)
+    LUT_keys = [str(s).strip() for s in mdict['Fields']]
+    LUT      = mdict['SS']
+    _LUTCache[LUTPath] = (mtime,LUT_keys,LUT)
+    
+    return LUT_keys, LUT
+    
+def GetHubHeight(TurbDict):
+    """ Hub height of turbine (AeroDyn HH, or as computed by FAST v7.02
+        from the tower geometry if HH is missing)
+    
+        Args:
+            TurbDict (dictionary): dictionary with FAST parameters
+            
+        Returns:
+            HubHt (float): hub height [m]
+    """
+    
+    if 'HH' in TurbDict:
+        return TurbDict['HH']
+        
+    import numpy as np
+    return TurbDict['TowerHt'] + TurbDict['Twr2Shft'] + \
+            TurbDict['OverHang'] * np.sin(np.radians(TurbDict['ShftTilt']))
+    
+@jr_timing.Timed
 def CreateFAST7Dict(FastPath,
                     save=0,save_dir='.',verbose=0):
     """ Build and save FAST 7 Python dictionary from input file
@@ -233,7 +366,7 @@ def CreateFAST7Dict(FastPath,
     if verbose:
         sys.stdout.write('    FAST file:     {:s}...'.format(fast_fname))
     
-    with open(fast_fname,'r') as f:
+    with jr_timing.Stage('parse.fst'), open(fast_fname,'r') as f:
         
         # read first four lines manually
         f.readline()
@@ -280,7 +413,8 @@ def CreateFAST7Dict(FastPath,
             sys.stdout.write('    Platform file:' + \
                                 ' {:s}...'.format(TurbDict['PtfmFile']))
     
-        with open(TurbDict['PtfmFile'],'r') as f:
+        with jr_timing.Stage('parse.platform'), \
+                open(TurbDict['PtfmFile'],'r') as f:
             
             # read first four lines manually
             f.readline()
@@ -314,7 +448,8 @@ def CreateFAST7Dict(FastPath,
         sys.stdout.write('    Tower ' + \
                         'file:    {:s}...'.format(TurbDict['TwrFile']))
              
-    with open(TurbDict['TwrFile'],'r') as f:
+    with jr_timing.Stage('parse.tower'), \
+            open(TurbDict['TwrFile'],'r') as f:
         
         # read first four lines manually
         f.readline()
@@ -373,7 +508,8 @@ def CreateFAST7Dict(FastPath,
             sys.stdout.write('    Furling ' + \
                         'file:  {:s}...'.format(TurbDict['FurlFile']))
              
-        with open(TurbDict['FurlFile'],'r') as f:
+        with jr_timing.Stage('parse.furl'), \
+                open(TurbDict['FurlFile'],'r') as f:
             
             # read first four lines manually
             f.readline()
@@ -413,7 +549,8 @@ def CreateFAST7Dict(FastPath,
             sys.stdout.write('    Blade {:d} '.format(i_bl) + \
                         'file:  {:s}...'.format(TurbDict[bl_key]))
                      
-        with open(TurbDict[bl_key],'r') as f:
+        with jr_timing.Stage('parse.blade'), \
+                open(TurbDict[bl_key],'r') as f:
             
             # read first four lines manually
             f.readline()
@@ -471,7 +608,8 @@ def CreateFAST7Dict(FastPath,
         sys.stdout.write('    AeroDyn ' + \
                         'file:  {:s}...'.format(TurbDict['ADFile']))
              
-    with open(TurbDict['ADFile'],'r') as f:
+    with jr_timing.Stage('parse.aerodyn'), \
+            open(TurbDict['ADFile'],'r') as f:
         
         # read first line manually
         line = f.readline().rstrip('\n')
@@ -539,7 +677,7 @@ def CreateFAST7Dict(FastPath,
             sys.stdout.write('    Pitch ' + \
                         'file:    pitch.ipt...')
              
-        with open('pitch.ipt','r') as f:
+        with jr_timing.Stage('parse.pitch'), open('pitch.ipt','r') as f:
             
             # read first line manually
             line = f.readline().rstrip('\n')
@@ -584,8 +722,9 @@ def CreateFAST7Dict(FastPath,
     
     return TurbDict
     
+@jr_timing.Timed
 def WriteFAST7Template(TurbDict,TmplDir,ModlDir,WrDir,
-                       verbose=0):
+                       Channels=None,OutRate=None,verbose=0):
     """ Create turbine-specific FAST v7.02 template file.
         Template can then be used to write wind-file-specic .fst files.
     
@@ -595,6 +734,9 @@ def WriteFAST7Template(TurbDict,TmplDir,ModlDir,WrDir,
             ModlDir (string): directory with wind-independent files (e.g.,
                               Blade, Tower, Pitch files)
             WrDir (string): directory to write Fast template to
+            Channels (list): output channels needed; OutList is reduced to
+                             these (see GetPrunedOutputs) [opt]
+            OutRate (float): output rate needed [Hz]; sets DecFact [opt]
             verbose (int): flag to suppress print statements [opt]
         
     """
@@ -602,6 +744,15 @@ def WriteFAST7Template(TurbDict,TmplDir,ModlDir,WrDir,
     TurbName     = TurbDict['TurbName']
     if verbose:
         sys.stdout.write('\nWriting FAST 7.02 template for turbine {:s}...'.format(TurbName))
+        
+    # reduce outputs to the ones needed
+    if (Channels is not None) or (OutRate is not None):
+        OutList, DecFact = GetPrunedOutputs(TurbDict['OutList'],
+                                            TurbDict['DT'],Channels=Channels,
+                                            OutRate=OutRate)
+        TurbDict = dict(TurbDict,OutList=OutList,
+                        DecFact=TurbDict['DecFact'] if DecFact is None \
+                                    else DecFact)
                         
     # define path to base template and output filename
     fpath_temp = os.path.join(TmplDir,'Template.fst')
@@ -613,7 +764,7 @@ def WriteFAST7Template(TurbDict,TmplDir,ModlDir,WrDir,
     inputfile_keys = GetInputFileKeys(version)        # add directory to fname
                     
     # open base template file and file to write to (turbine-specific template)
-    with open(fpath_temp,'r') as f_temp:
+    with jr_timing.Stage('render.template'), open(fpath_temp,'r') as f_temp:
         with open(fpath_out,'w') as f_write:
             
             # read each line in template file
@@ -638,7 +789,7 @@ def WriteFAST7Template(TurbDict,TmplDir,ModlDir,WrDir,
                     elif (field == 'OutList'):
                         for i_line in range(len(TurbDict['OutList'])-1):
                             f_write.write(TurbDict['OutList'][i_line])
-                            w_line = TurbDict['OutList'][-1]
+                        w_line = TurbDict['OutList'][-1]
                             
                     # check if quadratic torque constant (may need to truncate)
                     elif (field == 'VS_Rgn2K'):
@@ -667,6 +818,7 @@ def WriteFAST7Template(TurbDict,TmplDir,ModlDir,WrDir,
     return
 
 
+@jr_timing.Timed
 def WriteAeroDynTemplate(TurbDict,TmplDir,ModlDir,AeroDir,WrDir,
                          verbose=0):
     """ AeroDyn input file for FAST v7.02
@@ -695,7 +847,7 @@ def WriteAeroDynTemplate(TurbDict,TmplDir,ModlDir,AeroDir,WrDir,
     windfile_keys = GetWindfileKeys(version,FastFlag)
     
     # open template file and file to write to
-    with open(fpath_temp,'r') as f_temp:
+    with jr_timing.Stage('render.template'), open(fpath_temp,'r') as f_temp:
         with open(fpath_out,'w') as f_write:
             
             # read each line in template file
@@ -756,14 +908,18 @@ def WriteAeroDynTemplate(TurbDict,TmplDir,ModlDir,AeroDir,WrDir,
     return
 
 
+@jr_timing.Timed
 def WriteBladeFiles(TurbDict,TmplDir,WrDir,
-                    verbose=0):
+                    StoreDir=None,verbose=0):
     """ Blade input files for FAST v7.02
     
         Args:
             TurbDict (dictionary): dictionary with FAST parameters
             TmplDir (string): directory with template files
             WrDir (string): directory to write Fast template to
+            StoreDir (string): content-addressed store to write unique
+                               files to and link outputs to (see
+                               jr_store) [opt]
             verbose (int): flag to suppress print statements [opt]
     """
         
@@ -786,8 +942,9 @@ def WriteBladeFiles(TurbDict,TmplDir,WrDir,
         bld_str   = '_{:d}'.format(i_bl)
     
         # open template file and file to write to
-        with open(fpath_temp,'r') as f_temp:
-            with open(fpath_out,'w') as f_write:
+        with jr_timing.Stage('render.template'), \
+                open(fpath_temp,'r') as f_temp:
+            with jr_store.OpenOutput(fpath_out,StoreDir) as f_write:
                 
                 # read each line in template file
                 for r_line in f_temp:
@@ -834,14 +991,18 @@ def WriteBladeFiles(TurbDict,TmplDir,WrDir,
     return
 
 
+@jr_timing.Timed
 def WriteTowerFile(TurbDict,TmplDir,WrDir,
-                   verbose=0):
+                   StoreDir=None,verbose=0):
     """ Tower input files for FAST v7.02
     
         Args:
             TurbDict (dictionary): dictionary with FAST parameters
             TmplDir (string): directory with template files
             WrDir (string): directory to write Fast template to
+            StoreDir (string): content-addressed store to write unique
+                               files to and link outputs to (see
+                               jr_store) [opt]
             verbose (int): flag to suppress print statements [opt]
     """
         
@@ -856,8 +1017,8 @@ def WriteTowerFile(TurbDict,TmplDir,WrDir,
     fpath_out = os.path.join(WrDir,fname_out)
     
     # open template file and file to write to
-    with open(fpath_temp,'r') as f_temp:
-        with open(fpath_out,'w') as f_write:
+    with jr_timing.Stage('render.template'), open(fpath_temp,'r') as f_temp:
+        with jr_store.OpenOutput(fpath_out,StoreDir) as f_write:
             
             # read each line in template file
             for r_line in f_temp:
@@ -904,14 +1065,18 @@ def WriteTowerFile(TurbDict,TmplDir,WrDir,
     return
 
 
+@jr_timing.Timed
 def WritePitchCntrl(TurbDict,TmplDir,WrDir,
-                    verbose=0):
+                    StoreDir=None,verbose=0):
     """ Pitch control routine for Kirk Pierce controller for FAST v7.02
     
         Args:
             TurbDict (dictionary): dictionary with FAST parameters
             TmplDir (string): directory with template files
             WrDir (string): directory to write Fast template to
+            StoreDir (string): content-addressed store to write unique
+                               files to and link outputs to (see
+                               jr_store) [opt]
             verbose (int): flag to suppress print statements [opt]
     """
         
@@ -926,8 +1091,8 @@ def WritePitchCntrl(TurbDict,TmplDir,WrDir,
     fpath_out = os.path.join(WrDir,fname_out)
     
     # open template file and file to write to
-    with open(fpath_temp,'r') as f_temp:
-        with open(fpath_out,'w') as f_write:
+    with jr_timing.Stage('render.template'), open(fpath_temp,'r') as f_temp:
+        with jr_store.OpenOutput(fpath_out,StoreDir) as f_write:
             
             # read each line in template file
             for r_line in f_temp:
@@ -977,6 +1142,158 @@ def WritePitchCntrl(TurbDict,TmplDir,WrDir,
 
     return
     
+def ReadFAST7Out(OutPath):
+    """ Read FAST v7 text output file
+    
+        Args:
+            OutPath (string): path to .out file
+            
+        Returns:
+            channels (list): output channel names (first is 'Time')
+            units (list): output channel units
+            data (numpy array): [n_t x n_channels] array of output values
+    """
+    
+    import numpy as np
+    
+    with open(OutPath,'r') as f:
+        
+        # read header until line with channel names
+        line = f.readline()
+        while line and (line.split()[:1] != ['Time']):
+            line = f.readline()
+        if not line:
+            errStr = 'No channel names found in {:s}'.format(OutPath)
+            raise IOError(errStr)
+        channels = line.split()
+        units    = f.readline().split()
+        
+        # read remaining lines as numbers
+        data = np.loadtxt(f,ndmin=2)
+        
+    return channels, units, data
+    
+def GetOutChannels(OutList):
+    """ Names of output channels requested in OutList
+    
+        Args:
+            OutList (list): OutList lines from TurbDict
+            
+        Returns:
+            channels (list): output channel names in order
+    """
+    
+    channels = []
+    for line in OutList:
+        
+        # channels are listed in quotes before the comment
+        if ('\"' in line):
+            line = line.split('\"')[1]
+        elif line.split():
+            line = line.split()[0]
+        channels += [s for s in line.replace(',',' ').split() if s]
+    
+    return channels
+    
+def GetPrunedOutputs(OutList,DT,
+                     Channels=None,OutRate=None):
+    """ OutList with only the needed channels and matching DecFact
+    
+        Channels are matched to the OutList of the model without regard to
+        case, and keep the order and comments of the model's OutList.
+        DecFact is the largest decimation whose output rate is at least
+        OutRate.
+    
+        Args:
+            OutList (list): OutList lines of the model
+            DT (float): integration time step [s]
+            Channels (list): output channels needed [opt, all]
+            OutRate (float): output rate needed [Hz] [opt]
+            
+        Returns:
+            OutList (list): OutList lines with needed channels
+            DecFact (int): decimation factor (None if OutRate not given)
+    """
+    
+    import numpy as np
+    
+    # check needed channels against the channels of the model
+    if Channels is not None:
+        known   = [s.lower() for s in GetOutChannels(OutList)]
+        unknown = [s for s in Channels if s.lower() not in known]
+        if unknown:
+            errStr = 'Output channels unknown to model: ' + \
+                        '{:s}.'.format(', '.join(unknown))
+            raise ValueError(errStr)
+        if not Channels:
+            errStr = 'At least one output channel must be requested.'
+            raise ValueError(errStr)
+        needed = set(s.lower() for s in Channels)
+        
+        # keep lines with needed channels (only the needed ones)
+        pruned = []
+        for line in OutList:
+            line_chans = GetOutChannels([line])
+            keep = [s for s in line_chans if s.lower() in needed]
+            if not keep:
+                continue
+            comment = line.split('\"')[2] if (line.count('\"') > 1) \
+                        else '\n'
+            pruned.append('\"' + ','.join(keep) + '\"' + comment)
+        OutList = pruned
+    
+    # decimation factor for output rate
+    DecFact = None
+    if OutRate is not None:
+        if OutRate <= 0:
+            errStr = 'Output rate must be positive.'
+            raise ValueError(errStr)
+        DecFact = max(int(np.floor(1. / (OutRate * DT) + 1e-6)),1)
+    
+    return OutList, DecFact
+    
+def PruneFstLines(lines,
+                  Channels=None,OutRate=None):
+    """ Lines of .fst file with only the needed outputs
+    
+        Args:
+            lines (list): lines of .fst file
+            Channels (list): output channels needed [opt, all]
+            OutRate (float): output rate needed [Hz] [opt]
+            
+        Returns:
+            lines (list): lines with reduced OutList and DecFact
+    """
+    
+    # locate DT, DecFact and OutList block
+    i_DT = i_Dec = i_Out = i_End = None
+    for i_line, line in enumerate(lines):
+        words = line.split()
+        if (len(words) > 1) and (words[1] == 'DT') and (i_DT is None):
+            i_DT = i_line
+        elif (len(words) > 1) and (words[1] == 'DecFact'):
+            i_Dec = i_line
+        elif words[:1] == ['OutList'] and (i_Out is None):
+            i_Out = i_line
+        elif (line[:3] == 'END') and (i_Out is not None):
+            i_End = i_line
+            break
+    if None in (i_DT,i_Dec,i_Out,i_End):
+        errStr = 'DT, DecFact or OutList not found in .fst lines.'
+        raise ValueError(errStr)
+    
+    OutList, DecFact = GetPrunedOutputs(lines[i_Out+1:i_End],
+                                        float(lines[i_DT].split()[0]),
+                                        Channels=Channels,OutRate=OutRate)
+    lines = list(lines)
+    if DecFact is not None:
+        prefix, comment = lines[i_Dec].split('DecFact',1)
+        lines[i_Dec] = '  {:2.0f}'.format(DecFact).ljust(len(prefix)) + \
+                        'DecFact' + comment
+    lines[i_Out+1:i_End] = OutList
+    
+    return lines
+    
 def GetWindfileKeys(version,FastFlag):
     """ List of keys that are windfile-specific
     
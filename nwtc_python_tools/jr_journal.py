@@ -0,0 +1,216 @@
+"""
+A series of Python functions for keeping a crash-safe journal of the state
+of each case in a simulation campaign.
+
+AUTHOR:  Jenni Rinker, Duke University
+CONTACT: jennifer.rinker@duke.edu
+
+
+NOTES:
+    The journal is a SQLite database with one row per case (keyed by the
+    FAST file name). Every update is a single transaction, so the journal
+    is consistent after a node reboot or a full disk, and several
+    processes can update the same journal. Case states are:
+        'written' - FAST/AeroDyn input files written
+        'running' - simulation started
+        'done'    - simulation finished successfully (outputs hashed)
+        'failed'  - input generation or simulation failed
+
+    Each process keeps one connection per journal (shared by its threads).
+    The journal uses SQLite's WAL mode, which needs all processes that use
+    it to be on one host: WAL (and SQLite locking in general) does not
+    work on an NFS share used by several nodes. In multi-node campaigns
+    keep the journal on a local disk of the coordinator node and let the
+    coordinator record the cases (jr_queue.ServeJobs(...,JournalPath=...),
+    no JournalPath for the workers on other nodes).
+
+"""
+
+# module dependencies
+import os, time, hashlib, sqlite3, threading
+
+
+# possible case states
+States = ('written','running','done','failed')
+
+# open journals of this process: (pid, path) -> (inode, connection, lock)
+_Journals    = {}
+_JournalLock = threading.Lock()
+
+
+def OpenJournal(JournalPath):
+    """ Connection to campaign journal (created if needed)
+
+        The connection is opened once per process and reused; it is opened
+        again if the journal file was replaced.
+
+        Args:
+            JournalPath (string): path to journal database
+
+        Returns:
+            conn (sqlite3.Connection): connection to journal
+            lock (threading.Lock): lock to hold while using connection
+    """
+
+    key = (os.getpid(),os.path.abspath(JournalPath))
+    with _JournalLock:
+        try:
+            inode = os.stat(JournalPath).st_ino
+        except FileNotFoundError:
+            inode = None
+        if (key in _Journals) and (_Journals[key][0] == inode):
+            return _Journals[key][1:]
+
+        conn = sqlite3.connect(JournalPath,timeout=60.,
+                               check_same_thread=False)
+        conn.execute('PRAGMA journal_mode=WAL')
+        conn.execute('PRAGMA synchronous=NORMAL')
+        conn.execute('CREATE TABLE IF NOT EXISTS cases (' + \
+                     'Name TEXT PRIMARY KEY, State TEXT, WindPath TEXT, ' + \
+                     'FastPath TEXT, ExitCode INTEGER, OutHash TEXT, ' + \
+                     'Error TEXT, Updated REAL)')
+        _Journals[key] = (os.stat(JournalPath).st_ino,conn,threading.Lock())
+
+    return _Journals[key][1:]
+
+def CloseJournal(JournalPath):
+    """ Close connection of this process to campaign journal
+
+        Args:
+            JournalPath (string): path to journal database
+    """
+
+    key = (os.getpid(),os.path.abspath(JournalPath))
+    with _JournalLock:
+        if key in _Journals:
+            inode, conn, lock = _Journals.pop(key)
+            with lock:
+                conn.close()
+
+    return
+
+def SetCaseState(JournalPath,Name,State,
+                 **kwargs):
+    """ Record state of a case in journal
+
+        Fields not given keep their previous values.
+
+        Args:
+            JournalPath (string): path to journal database
+            Name (string): case name (FAST file name without extension)
+            State (string): case state (see States)
+            kwargs (dictionary): other fields to record (WindPath, FastPath,
+                                 ExitCode, OutHash, Error) [opt]
+    """
+
+    if State not in States:
+        errStr = 'Unknown case state \"{:s}\".'.format(State)
+        raise ValueError(errStr)
+
+    fields = ['WindPath','FastPath','ExitCode','OutHash','Error']
+    for key in kwargs:
+        if key not in fields:
+            errStr = 'Unknown journal field \"{:s}\".'.format(key)
+            raise ValueError(errStr)
+
+    # insert row or update given fields in one transaction
+    keys   = ['Name','State','Updated'] + list(kwargs.keys())
+    values = [Name,State,time.time()] + list(kwargs.values())
+    update = ', '.join(['{:s}=excluded.{:s}'.format(k,k) for k in keys[1:]])
+    conn, lock = OpenJournal(JournalPath)
+    with lock, conn:
+        conn.execute('INSERT INTO cases ({:s}) '.format(', '.join(keys)) + \
+                     'VALUES ({:s}) '.format(', '.join(['?']*len(keys))) + \
+                     'ON CONFLICT(Name) DO UPDATE SET ' + update,values)
+
+    return
+
+def GetCaseStates(JournalPath):
+    """ States of all cases in journal
+
+        Args:
+            JournalPath (string): path to journal database
+
+        Returns:
+            CaseStates (dictionary): journal row (as dictionary) for each
+                                     case name
+    """
+
+    if not os.path.exists(JournalPath):
+        return {}
+
+    conn, lock = OpenJournal(JournalPath)
+    with lock:
+        cursor = conn.execute('SELECT * FROM cases')
+        keys   = [d[0] for d in cursor.description]
+        CaseStates = {row[0]:dict(zip(keys,row)) for row in cursor}
+
+    return CaseStates
+
+def GetResumeCases(JournalPath,Names,
+                   stage='run'):
+    """ Cases that still need work when resuming a campaign
+
+        Args:
+            JournalPath (string): path to journal database
+            Names (list): names of all cases in campaign
+            stage (string): 'write' for input generation (skips cases whose
+                            inputs were written) or 'run' for simulation
+                            (skips cases that are done) [opt]
+
+        Returns:
+            todo (list): names of failed, interrupted or missing cases
+    """
+
+    CaseStates = GetCaseStates(JournalPath)
+    if stage == 'write':
+        skip = ('written','running','done')
+    elif stage == 'run':
+        skip = ('done',)
+    else:
+        errStr = 'Uncoded stage \"{:s}\".'.format(stage)
+        raise ValueError(errStr)
+
+    todo = [Name for Name in Names \
+                if ((Name not in CaseStates) or \
+                    (CaseStates[Name]['State'] not in skip))]
+
+    return todo
+
+def GetJournalSummary(JournalPath):
+    """ Number of cases in each state
+
+        Args:
+            JournalPath (string): path to journal database
+
+        Returns:
+            summary (dictionary): number of cases for each state
+    """
+
+    summary = dict.fromkeys(States,0)
+    for row in GetCaseStates(JournalPath).values():
+        summary[row['State']] += 1
+
+    return summary
+
+def HashFiles(fpaths,
+              blocksize=2**20):
+    """ SHA-256 hash over contents of files
+
+        Args:
+            fpaths (list): paths to files (hashed in given order)
+            blocksize (int): bytes read at a time [opt]
+
+        Returns:
+            digest (string): hexadecimal hash
+    """
+
+    sha = hashlib.sha256()
+    for fpath in fpaths:
+        with open(fpath,'rb') as f:
+            block = f.read(blocksize)
+            while block:
+                sha.update(block)
+                block = f.read(blocksize)
+
+    return sha.hexdigest()
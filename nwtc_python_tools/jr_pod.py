@@ -0,0 +1,451 @@
+"""
+A series of Python functions for compressing ensembles of full-field wind
+files with a low-rank (proper orthogonal decomposition, POD) basis.
+
+AUTHOR:  Jenni Rinker, Duke University
+CONTACT: jennifer.rinker@duke.edu
+
+
+NOTES:
+    Files with the same grid share one POD basis. Each time step of a file
+    is a snapshot of length 3*n_z*n_y (after removing the mean field of
+    the file), and the basis is the leading left singular vectors of all
+    snapshots of the ensemble. It is found with a randomized SVD of the
+    snapshot covariance that never forms the covariance or holds more than
+    one block of time steps (jr_wind.ReadWindBlocks) in memory:
+        1. sketch:  Y = sum_b X_b (X_b^T Omega),  Omega random
+        2. n_power power iterations Y = sum_b X_b (X_b^T Q), Q = orth(Y)
+        3. G = sum_b (Q^T X_b)(Q^T X_b)^T, eigenvectors of G rotate Q
+    The rank is the smallest one for which the relative RMS error
+    (residual over fluctuating energy) of every file is below tol. A field
+    is then stored as its mean field and the coefficients of the basis, and
+    the achieved error of every file is saved in the archive index.
+
+    Archive layout:
+        <ArchDir>/index.json                grids and fields
+        <ArchDir>/<GridKey>/basis_<n>.npy   [3*n_z*n_y x rank] basis
+        <ArchDir>/<GridKey>/<Name>.npz      mean field and coefficients
+    Every call of CompressWindEnsemble writes a new basis for each grid,
+    and each field records the basis its coefficients belong to, so files
+    added to an existing grid later do not change archived fields. Bases
+    no field refers to anymore are removed. Fields are named by the wind
+    file name without extension, so names must be unique in an archive.
+
+        index = jr_pod.CompressWindEnsemble(WindPaths,ArchDir,tol=0.05)
+        jr_pod.ReconstructWind(ArchDir,Name,'Name.bts')
+
+"""
+
+# module dependencies
+import jr_wind, jr_timing
+import os, json, threading
+import numpy as np
+from warnings import warn
+
+
+def GetGridKey(header):
+    """ Name of grid geometry of wind file (files with same key share basis)
+
+        Args:
+            header (dictionary): header from jr_wind.ReadWindHeader
+
+        Returns:
+            GridKey (string): e.g., '31x31_dz5_dy5_z015'
+    """
+
+    return '{:d}x{:d}_dz{:g}_dy{:g}_z0{:g}'.format(header['n_z'],
+                        header['n_y'],round(header['dz'],4),
+                        round(header['dy'],4),round(GetGridBottom(header),3))
+
+def GetGridBottom(header):
+    """ Height of lowest grid point
+    """
+
+    if 'z0' in header:
+        return header['z0']
+
+    return header['zhub'] - 0.5 * (header['n_z'] - 1) * header['dz']
+
+def GetSnapshotBlocks(WindPath,
+                      n_block=1024):
+    """ Time blocks of wind file as snapshot matrices
+
+        Args:
+            WindPath (string): path to binary full-field wind file
+            n_block (int): time steps read at once [opt]
+
+        Returns:
+            blocks (generator): [3*n_z*n_y x n_b] float64 arrays
+    """
+
+    for i_t0, turb in jr_wind.ReadWindBlocks(WindPath,n_block=n_block):
+        yield turb.reshape(-1,turb.shape[-1]).astype(np.float64)
+
+def _ApplyCovariance(WindPaths,Q,
+                     n_block=1024,project=False):
+    """ Product of centred snapshot covariance with Q (one pass over files)
+
+        Returns:
+            Y (numpy array): sum_f (X_f - m_f)(X_f - m_f)^T Q
+            energy (list): fluctuating energy ||X_f - m_f||^2 of each file
+            G (list): Q^T (X_f - m_f)(X_f - m_f)^T Q of each file (if
+                      project)
+    """
+
+    Y = np.zeros_like(Q)
+    energy, G = [], []
+    for WindPath in WindPaths:
+        Y_f, m, n_t, e = np.zeros_like(Q), np.zeros(Q.shape[0]), 0, 0.
+        for X in GetSnapshotBlocks(WindPath,n_block=n_block):
+            Y_f += X.dot(X.T.dot(Q))
+            m += X.sum(axis=1)
+            e += np.einsum('ij,ij->',X,X)
+            n_t += X.shape[1]
+        m /= n_t
+
+        # remove mean field of file: (X - m 1^T)(X - m 1^T)^T
+        Y_f -= n_t * np.outer(m,m.dot(Q))
+        Y += Y_f
+        energy.append(e - n_t * m.dot(m))
+        if project:
+            G.append(Q.T.dot(Y_f))
+
+    return Y, energy, G
+
+def ComputePodBasis(WindPaths,
+                    tol=0.05,max_rank=None,n_oversample=10,n_power=1,
+                    n_block=1024,seed=None,verbose=0):
+    """ Truncated POD basis of ensemble of wind files with the same grid
+
+        Args:
+            WindPaths (list): paths to binary full-field wind files
+            tol (float): relative RMS error of fluctuations of each file
+                         [opt]
+            max_rank (int): largest rank [opt, min(3*n_z*n_y,200)]
+            n_oversample (int): extra sketch columns [opt]
+            n_power (int): number of power iterations [opt]
+            n_block (int): time steps read at once [opt]
+            seed (int): seed of random sketch [opt]
+            verbose (int): flag to suppress print statements [opt]
+
+        Returns:
+            basis (numpy array): [3*n_z*n_y x rank] orthonormal POD modes
+            sigma2 (numpy array): [n_sketch] energy of sketched modes
+    """
+
+    headers = [jr_wind.ReadWindHeader(WindPath) for WindPath in WindPaths]
+    if len(set(GetGridKey(header) for header in headers)) > 1:
+        errStr = 'Wind files of a POD basis must have the same grid.'
+        raise ValueError(errStr)
+    n_p = 3 * headers[0]['n_z'] * headers[0]['n_y']
+    if max_rank is None:
+        max_rank = min(n_p,200)
+    n_k = min(max_rank + n_oversample,n_p)
+
+    # randomized range finder on the snapshot covariance
+    rng = np.random.default_rng(seed)
+    Q   = rng.standard_normal((n_p,n_k))
+    for i_pass in range(n_power + 1):
+        if verbose:
+            print('  Pass {:d} of {:d} over {:d} files...'.format(i_pass + 1,
+                                            n_power + 2,len(WindPaths)))
+        with jr_timing.Stage('pod.sketch'):
+            Q = np.linalg.qr(_ApplyCovariance(WindPaths,Q,
+                                              n_block=n_block)[0])[0]
+
+    # energy of each direction of Q, sorted
+    if verbose:
+        print('  Pass {:d} of {:d} over {:d} files...'.format(n_power + 2,
+                                            n_power + 2,len(WindPaths)))
+    with jr_timing.Stage('pod.project'):
+        Y, energy, G_f = _ApplyCovariance(WindPaths,Q,n_block=n_block,
+                                          project=True)
+        G = Q.T.dot(Y)
+        sigma2, V = np.linalg.eigh(0.5 * (G + G.T))
+        sigma2, V = np.maximum(sigma2[::-1],0.), V[:,::-1]
+
+    # smallest rank meeting error bound for every file
+    rank, RelErr = 0, np.zeros(len(WindPaths))
+    for i_f, (G, e) in enumerate(zip(G_f,energy)):
+        captured = np.einsum('ik,ij,jk->k',V,G,V)
+        residual = e - np.concatenate([[0.],np.cumsum(captured)])
+        ok       = np.nonzero(residual[:max_rank + 1] <= tol**2 * e)[0]
+        r        = int(ok[0]) if ok.size else min(max_rank,n_k)
+        RelErr[i_f] = np.sqrt(max(residual[r],0.) / max(e,1e-300))
+        rank     = max(rank,r)
+    if RelErr.max() > tol:
+        warn('POD error bound {:g} not met with rank {:d} '.format(tol,
+              rank) + '(relative error {:.3g}); increase max_rank.'.format(
+              RelErr.max()))
+    rank = max(rank,1)
+
+    return Q.dot(V[:,:rank]), sigma2
+
+def CompressWindFile(WindPath,basis,
+                     n_block=1024):
+    """ Mean field and POD coefficients of one wind file
+
+        Args:
+            WindPath (string): path to binary full-field wind file
+            basis (numpy array): [3*n_z*n_y x rank] POD modes
+            n_block (int): time steps read at once [opt]
+
+        Returns:
+            mean (numpy array): [3*n_z*n_y] mean field
+            coeffs (numpy array): [rank x n_t] coefficients of fluctuations
+            RelErr (float): relative RMS error of fluctuations
+    """
+
+    header = jr_wind.ReadWindHeader(WindPath)
+    mean   = np.zeros(basis.shape[0])
+    coeffs = np.empty((basis.shape[1],header['n_t']))
+    e = 0.
+    with jr_timing.Stage('pod.coeffs'):
+        for i_t0, turb in jr_wind.ReadWindBlocks(WindPath,n_block=n_block):
+            X = turb.reshape(-1,turb.shape[-1]).astype(np.float64)
+            coeffs[:,i_t0:i_t0 + X.shape[1]] = basis.T.dot(X)
+            mean += X.sum(axis=1)
+            e += np.einsum('ij,ij->',X,X)
+        mean /= header['n_t']
+        coeffs -= basis.T.dot(mean)[:,None]
+
+    # residual energy from orthonormality of basis
+    e_fluc = e - header['n_t'] * mean.dot(mean)
+    e_res  = max(e_fluc - np.einsum('ij,ij->',coeffs,coeffs),0.)
+    RelErr = float(np.sqrt(e_res / e_fluc)) if e_fluc > 0 else 0.
+
+    return mean, coeffs, RelErr
+
+def CompressWindEnsemble(WindPaths,ArchDir,
+                         tol=0.05,max_rank=None,n_oversample=10,n_power=1,
+                         n_block=1024,seed=None,verbose=0):
+    """ Compress wind files into POD archive (one basis per grid)
+
+        Args:
+            WindPaths (list or string): paths to wind files, or directory
+                                        with wind files
+            ArchDir (string): archive directory
+            tol (float): relative RMS error of fluctuations of each file
+                         [opt]
+            max_rank (int): largest rank [opt, min(3*n_z*n_y,200)]
+            n_oversample (int): extra sketch columns [opt]
+            n_power (int): number of power iterations [opt]
+            n_block (int): time steps read at once [opt]
+            seed (int): seed of random sketch [opt]
+            verbose (int): flag to suppress print statements [opt]
+
+        Returns:
+            index (dictionary): 'Grids' (list of bases with path, rank,
+                                tolerance and files per grid key) and
+                                'Fields' (grid key, paths of coefficients
+                                and basis, header and RelErr per field
+                                name)
+    """
+
+    if isinstance(WindPaths,str):
+        WindPaths = [os.path.join(WindPaths,f) for f in \
+                        sorted(os.listdir(WindPaths)) \
+                        if f.endswith(('.bts','.wnd','.bl'))]
+
+    # field names must be unique (e.g., not both x.bts and x.wnd)
+    index   = LoadIndex(ArchDir)
+    sources = {}
+    for WindPath in WindPaths:
+        Name = os.path.splitext(os.path.basename(WindPath))[0]
+        if Name in sources:
+            errStr = 'Wind files {:s} and {:s} have the same '.format(
+                        sources[Name],WindPath) + \
+                     'field name "{:s}".'.format(Name)
+            raise ValueError(errStr)
+        sources[Name] = WindPath
+        if (Name in index['Fields']) and \
+                (os.path.abspath(index['Fields'][Name]['Source']) != \
+                 os.path.abspath(WindPath)):
+            errStr = 'Field "{:s}" of {:s} is already '.format(Name,
+                        WindPath) + \
+                     'archived from {:s}.'.format(
+                        index['Fields'][Name]['Source'])
+            raise ValueError(errStr)
+
+    # group files by grid geometry
+    groups = {}
+    for WindPath in WindPaths:
+        header = jr_wind.ReadWindHeader(WindPath)
+        if header['n_t'] is None:
+            errStr = 'Wind file {:s} is not a binary full-field file.'.format(
+                                                                WindPath)
+            raise ValueError(errStr)
+        groups.setdefault(GetGridKey(header),[]).append((WindPath,header))
+
+    for GridKey, files in sorted(groups.items()):
+        if verbose:
+            print('\nComputing POD basis of {:d} files on grid {:s}...'.format(
+                                                        len(files),GridKey))
+        basis, sigma2 = ComputePodBasis([f[0] for f in files],
+                                        tol=tol,max_rank=max_rank,
+                                        n_oversample=n_oversample,
+                                        n_power=n_power,n_block=n_block,
+                                        seed=seed,verbose=verbose)
+        # new basis file, so fields archived earlier keep theirs
+        GridDir = os.path.join(ArchDir,GridKey)
+        os.makedirs(GridDir,exist_ok=True)
+        bases   = index['Grids'].setdefault(GridKey,[])
+        i_basis = 0
+        while os.path.exists(os.path.join(GridDir,
+                                          'basis_{:d}.npy'.format(i_basis))):
+            i_basis += 1
+        BasisPath = os.path.join(GridKey,'basis_{:d}.npy'.format(i_basis))
+        np.save(os.path.join(ArchDir,BasisPath),basis.astype(np.float32))
+        bases.append({'Basis':BasisPath,'Rank':basis.shape[1],'Tol':tol,
+                      'Files':[f[0] for f in files]})
+
+        # coefficients of each file in float32 basis actually stored
+        basis = basis.astype(np.float32).astype(np.float64)
+        for WindPath, header in files:
+            Name = os.path.splitext(os.path.basename(WindPath))[0]
+            mean, coeffs, RelErr = CompressWindFile(WindPath,basis,
+                                                    n_block=n_block)
+            FieldPath = os.path.join(GridKey,Name + '.npz')
+            old = index['Fields'].get(Name,None)
+            if (old is not None) and (old['Path'] != FieldPath):
+                os.remove(os.path.join(ArchDir,old['Path']))
+            np.savez(os.path.join(ArchDir,FieldPath),
+                     mean=mean.astype(np.float32),
+                     coeffs=coeffs.astype(np.float32))
+            keys = ['n_z','n_y','n_t','dz','dy','dt','zhub','uhub']
+            index['Fields'][Name] = {'Grid':GridKey,
+                                     'Path':FieldPath,
+                                     'Basis':BasisPath,
+                                     'Header':{key:header[key] for key in keys},
+                                     'z0':GetGridBottom(header),
+                                     'RelErr':RelErr,
+                                     'Source':WindPath,
+                                     'SourceBytes':os.path.getsize(WindPath)}
+            if verbose:
+                print('  {:s}: rank {:d}, error {:.3g}'.format(Name,
+                                                    basis.shape[1],RelErr))
+
+    # remove bases of fields that were compressed again
+    used = set([field['Basis'] for field in index['Fields'].values()])
+    for GridKey in list(index['Grids'].keys()):
+        for entry in [b for b in index['Grids'][GridKey] \
+                        if b['Basis'] not in used]:
+            os.remove(os.path.join(ArchDir,entry['Basis']))
+            index['Grids'][GridKey].remove(entry)
+        if not index['Grids'][GridKey]:
+            del index['Grids'][GridKey]
+
+    SaveIndex(index,ArchDir)
+    if verbose:
+        summary = GetArchiveSummary(ArchDir)
+        print('\nArchive {:s}: {:.1f} MB of {:.1f} MB ({:.1f}x).'.format(
+              ArchDir,summary['Bytes'] / 2**20,
+              summary['SourceBytes'] / 2**20,summary['Ratio']))
+
+    return index
+
+def LoadIndex(ArchDir):
+    """ Index of POD archive (empty if archive does not exist)
+    """
+
+    fpath = os.path.join(ArchDir,'index.json')
+    if not os.path.exists(fpath):
+        return {'Grids':{},'Fields':{}}
+    with open(fpath,'r') as f:
+        index = json.load(f)
+
+    # archives with one basis.npy per grid
+    for GridKey, entry in index['Grids'].items():
+        if isinstance(entry,dict):
+            index['Grids'][GridKey] = [entry]
+            for field in index['Fields'].values():
+                if field['Grid'] == GridKey:
+                    field.setdefault('Basis',entry['Basis'])
+
+    return index
+
+def SaveIndex(index,ArchDir):
+    """ Save index of POD archive (replaced in one step)
+    """
+
+    os.makedirs(ArchDir,exist_ok=True)
+    fpath   = os.path.join(ArchDir,'index.json')
+    tmpPath = fpath + '.{:d}.{:d}.tmp'.format(os.getpid(),
+                                              threading.get_ident())
+    with open(tmpPath,'w') as f:
+        json.dump(index,f,indent=1)
+    os.replace(tmpPath,fpath)
+
+    return
+
+def ReconstructWind(ArchDir,Name,
+                    OutPath=None,t_slice=None):
+    """ Wind field of archived file (and write as .bts or .wnd)
+
+        Args:
+            ArchDir (string): archive directory
+            Name (string): field name (wind file name without extension)
+            OutPath (string): path to write .bts or .wnd to [opt]
+            t_slice (slice): time steps to reconstruct [opt, all]
+
+        Returns:
+            turb (numpy array): [3 x n_z x n_y x n_t] wind velocities
+    """
+
+    index = LoadIndex(ArchDir)
+    if Name not in index['Fields']:
+        errStr = 'Field \"{:s}\" not in archive {:s}.'.format(Name,ArchDir)
+        raise KeyError(errStr)
+    field  = index['Fields'][Name]
+    header = field['Header']
+
+    with jr_timing.Stage('pod.reconstruct'):
+        basis = np.load(os.path.join(ArchDir,field['Basis']),mmap_mode='r')
+        with np.load(os.path.join(ArchDir,field['Path'])) as data:
+            mean, coeffs = data['mean'], data['coeffs']
+        if t_slice is not None:
+            coeffs = coeffs[:,t_slice]
+        X = basis.dot(coeffs)
+        X += mean[:,None]
+        turb = X.reshape(3,header['n_z'],header['n_y'],-1)
+
+    if OutPath is not None:
+        if OutPath.endswith('.bts'):
+            jr_wind.WriteBTS(OutPath,turb,header['dz'],header['dy'],
+                             header['dt'],header['zhub'],field['z0'],
+                             uhub=header['uhub'],
+                             desc='Reconstructed from POD archive ' + \
+                                  '(rank {:d}).'.format(basis.shape[1]))
+        elif OutPath.endswith('.wnd'):
+            z_c = field['z0'] + 0.5 * (header['n_z'] - 1) * header['dz']
+            jr_wind.WriteWnd(OutPath,turb,header['dz'],header['dy'],
+                             header['dt'],z_c,uhub=header['uhub'])
+        else:
+            errStr = 'Uncoded output file extension \"{:s}\".'.format(
+                                            os.path.splitext(OutPath)[1])
+            raise ValueError(errStr)
+
+    return turb
+
+def GetArchiveSummary(ArchDir):
+    """ Size of POD archive compared with the original wind files
+
+        Args:
+            ArchDir (string): archive directory
+
+        Returns:
+            summary (dictionary): 'Fields', 'Grids', 'Bytes' (archive),
+                                  'SourceBytes' and 'Ratio'
+    """
+
+    index   = LoadIndex(ArchDir)
+    n_bytes = 0
+    for dirpath, dirnames, fnames in os.walk(ArchDir):
+        n_bytes += sum(os.path.getsize(os.path.join(dirpath,f)) \
+                        for f in fnames)
+    n_source = sum(field['SourceBytes'] for field in \
+                    index['Fields'].values())
+
+    return {'Fields':len(index['Fields']),'Grids':len(index['Grids']),
+            'Bytes':n_bytes,'SourceBytes':n_source,
+            'Ratio':n_source / n_bytes if n_bytes else 0.}
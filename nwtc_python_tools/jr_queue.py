@@ -0,0 +1,430 @@
+"""
+A series of Python functions for running a simulation campaign on several
+Linux nodes with a pull-based work queue.
+
+AUTHOR:  Jenni Rinker, Duke University
+CONTACT: jennifer.rinker@duke.edu
+
+
+NOTES:
+    A coordinator (ServeJobs) serves job dictionaries (see jr_run.MakeJob)
+    from the generated case list using a multiprocessing manager, so only
+    the standard library is needed for transport. Workers on each node
+    (WorkJobs) pull a job whenever one of their slots is free, run it and
+    report the result, so fast nodes naturally take more cases. Input,
+    wind and output paths in the jobs must be visible from all nodes
+    (e.g., on shared storage).
+
+    Jobs handed out but not reported within the lease time (e.g., because
+    a node went down) are put back in the queue. Without a lease, a job of
+    a worker that dies is only put back if the coordinator watches the
+    worker process (ServeJobs(...,WorkerProcs=...), as in RunWorkQueue);
+    give remote workers a lease longer than the longest job.
+
+    The campaign journal (see jr_journal) cannot be shared over NFS by
+    several nodes, so in a multi-node run the coordinator records the
+    cases (ServeJobs(...,JournalPath=...)) and the workers get no
+    JournalPath.
+
+    RunWorkQueue runs the coordinator and several worker processes on one
+    host as a local stand-in for a multi-node run.
+
+    An open-ended coordinator (ServeJobs(...,open_ended=True)) accepts new
+    jobs from clients (ConnectJobServer(...).put(job), e.g. from
+    jr_watch.WatchWindDir as wind files arrive) until close() is called.
+
+"""
+
+# module dependencies
+import jr_run, jr_journal
+import os, sys, time, socket, threading, collections
+import multiprocessing
+from multiprocessing.managers import BaseManager, Server
+from multiprocessing import AuthenticationError
+
+
+# default port and authentication key of coordinator
+QueuePort    = 50000
+QueueAuthKey = b'nwtc_python_tools'
+
+
+class _JobServer(object):
+    """ Job queue and results held by the coordinator
+    """
+
+    def __init__(self,jobs,lease=None,open_ended=False,JournalPath=None):
+        self.lock     = threading.Lock()
+        self.jobs     = list(jobs)
+        self.todo     = collections.deque(range(len(jobs)))
+        self.running  = {}                  # job index: (worker, start)
+        self.results  = [None] * len(jobs)
+        self.workers  = collections.Counter()
+        self.lease    = lease
+        self.open     = open_ended
+        self.journal  = JournalPath
+
+    def get_job(self,WorkerID):
+        """ Next job for worker as (status, index, job) with status 'job',
+            'wait' (jobs still running elsewhere) or 'done'
+        """
+        with self.lock:
+
+            # requeue jobs whose lease ran out
+            if self.lease is not None:
+                t_now = time.time()
+                for i_job in list(self.running.keys()):
+                    if (t_now - self.running[i_job][1]) > self.lease:
+                        del self.running[i_job]
+                        self.todo.append(i_job)
+
+            if self.todo:
+                i_job = self.todo.popleft()
+                self.running[i_job] = (WorkerID,time.time())
+            elif self.running or self.open:
+                return 'wait', None, None
+            else:
+                return 'done', None, None
+
+        if self.journal is not None:
+            jr_journal.SetCaseState(self.journal,self.jobs[i_job]['Name'],
+                                    'running',ExitCode=None,Error=None)
+
+        return 'job', i_job, self.jobs[i_job]
+
+    def put_result(self,WorkerID,i_job,result):
+        """ Record result of job (duplicates of requeued jobs are ignored)
+        """
+        with self.lock:
+            first = self.results[i_job] is None
+            if first:
+                result['Worker'] = WorkerID
+                self.results[i_job] = result
+                self.workers[WorkerID.rsplit(':',1)[0]] += 1
+            self.running.pop(i_job,None)
+            if i_job in self.todo:
+                self.todo.remove(i_job)
+
+        if first and (self.journal is not None):
+            jr_run.RecordJobResult(self.journal,self.jobs[i_job],result)
+
+    def put(self,job):
+        """ Add job to end of queue of open-ended server, return its index
+        """
+        with self.lock:
+            if not self.open:
+                raise ValueError('Job queue is closed.')
+            self.jobs.append(job)
+            self.results.append(None)
+            self.todo.append(len(self.jobs) - 1)
+            return len(self.jobs) - 1
+
+    def drop_worker(self,prefix):
+        """ Requeue jobs of a dead worker process (IDs starting with
+            prefix), return their number
+        """
+        with self.lock:
+            dropped = [i_job for i_job, (WorkerID, t_start) \
+                            in self.running.items() \
+                            if WorkerID.startswith(prefix)]
+            for i_job in dropped:
+                del self.running[i_job]
+                self.todo.appendleft(i_job)
+            return len(dropped)
+
+    def fail_pending(self,Error):
+        """ Give all jobs without result a failed result (no workers
+            left), close queue and return their number
+        """
+        with self.lock:
+            pending = [i_job for i_job in range(len(self.jobs)) \
+                            if self.results[i_job] is None]
+            for i_job in pending:
+                job = self.jobs[i_job]
+                self.results[i_job] = {'Name':job['Name'],'Cmd':job['Cmd'],
+                                       'LogPath':job.get('LogPath',None),
+                                       'ExitCode':-1,'TimedOut':False,
+                                       'Time':0.,'Cached':False,
+                                       'Worker':None,'Error':Error}
+            self.todo.clear()
+            self.running.clear()
+            self.open = False
+        if self.journal is not None:
+            for i_job in pending:
+                jr_journal.SetCaseState(self.journal,self.jobs[i_job]['Name'],
+                                        'failed',ExitCode=-1,Error=Error)
+        return len(pending)
+
+    def close(self):
+        """ Accept no more jobs (server finishes when all have results)
+        """
+        with self.lock:
+            self.open = False
+
+    def get_status(self):
+        """ Number of queued, running and finished jobs
+        """
+        with self.lock:
+            n_done = len([r for r in self.results if r is not None])
+            return {'Queued':len(self.todo),'Running':len(self.running),
+                    'Done':n_done,'Workers':dict(self.workers),
+                    'Open':self.open}
+
+    def is_done(self):
+        """ Whether all jobs have a result
+        """
+        with self.lock:
+            return (not self.open) and \
+                    all([r is not None for r in self.results])
+
+
+class _QueueServer(Server):
+    """ Manager server whose accepter stops with the server (so the
+        listening socket can be closed)
+    """
+
+    def accepter(self):
+        while not self.stop_event.is_set():
+            try:
+                c = self.listener.accept()
+            except (OSError,EOFError,AuthenticationError):
+                continue
+            t = threading.Thread(target=self.handle_request,args=(c,))
+            t.daemon = True
+            t.start()
+
+class _QueueManager(BaseManager):
+
+    def get_server(self):
+        return _QueueServer(self._registry,self._address,self._authkey,
+                            self._serializer)
+
+class _ClientManager(BaseManager):
+    """ Client side of _QueueManager (own registry, so a coordinator and
+        its clients can share a process)
+    """
+    pass
+
+
+def ServeJobs(jobs,
+              address=('',QueuePort),authkey=QueueAuthKey,lease=None,
+              open_ended=False,JournalPath=None,WorkerProcs=None,verbose=0):
+    """ Coordinator that serves jobs to workers until all have finished
+
+        Args:
+            jobs (list): list of job dictionaries (see jr_run.MakeJob)
+            address (tuple): (host, port) to listen on [opt]
+            authkey (bytes): authentication key shared with workers [opt]
+            lease (float): seconds after which an unreported job is handed
+                           out again [opt, never]
+            open_ended (int): flag to accept jobs from clients until the
+                              server is closed (see ConnectJobServer) [opt]
+            JournalPath (string): path to campaign journal to record the
+                                  cases in from the coordinator [opt]
+            WorkerProcs (list): worker processes on this host (e.g.,
+                                multiprocessing.Process running WorkJobs);
+                                jobs of dead ones are requeued, and jobs
+                                fail when all are dead [opt]
+            verbose (int): flag to suppress print statements [opt]
+
+        Returns:
+            results (list): result dictionaries in order of jobs (including
+                            added jobs), with the worker that ran each job
+                            in 'Worker' (and 'Error' for jobs failed
+                            because no worker was left)
+    """
+
+    server = _JobServer(jobs,lease=lease,open_ended=open_ended,
+                        JournalPath=JournalPath)
+    _QueueManager.register('JobServer',callable=lambda: server)
+    manager = _QueueManager(address=address,authkey=authkey)
+    mgr_server = manager.get_server()
+
+    if verbose:
+        print('\nServing {:d} jobs on {:s}:{:d}...'.format(len(jobs),
+              address[0] or socket.gethostname(),mgr_server.address[1]))
+
+    # serve in background thread until all results are in
+    thread = threading.Thread(target=mgr_server.serve_forever)
+    thread.daemon = True
+    thread.start()
+    t_print = time.time()
+    alive   = list(WorkerProcs or [])
+    while not server.is_done():
+        time.sleep(0.1)
+
+        # requeue jobs of local workers that died
+        for proc in [proc for proc in alive if not proc.is_alive()]:
+            alive.remove(proc)
+            n_jobs = server.drop_worker('{:s}:{:d}:'.format(
+                                        socket.gethostname(),proc.pid))
+            if verbose:
+                sys.stdout.write('  Worker process {:d} '.format(proc.pid) + \
+                                 'died (exit code {:s}), '.format(
+                                 str(proc.exitcode)) + \
+                                 '{:d} jobs requeued.\n'.format(n_jobs))
+        if WorkerProcs and (not alive):
+            n_jobs = server.fail_pending('No worker process left.')
+            if verbose:
+                sys.stdout.write('  No worker process left, ' + \
+                                 '{:d} jobs failed.\n'.format(n_jobs))
+
+        if verbose and (time.time() - t_print > 10.):
+            sys.stdout.write('  {:s}\n'.format(str(server.get_status())))
+            t_print = time.time()
+
+    # give workers a moment to receive 'done' before shutting down
+    time.sleep(0.5)
+    mgr_server.stop_event.set()
+    thread.join()
+
+    # wake accepter with a dummy connection, then free the address
+    host, port = mgr_server.address
+    try:
+        with socket.create_connection((host or 'localhost',port),timeout=5.):
+            pass
+    except OSError:
+        pass
+    mgr_server.listener.close()
+
+    if verbose:
+        print('done. Jobs per worker process: ' + \
+              '{:s}'.format(str(dict(server.workers))))
+
+    return server.results
+
+def ConnectJobServer(address=('localhost',QueuePort),authkey=QueueAuthKey,
+                     retry=30.):
+    """ Proxy of the job server of a coordinator
+
+        Args:
+            address (tuple): (host, port) of coordinator [opt]
+            authkey (bytes): authentication key of coordinator [opt]
+            retry (float): seconds to keep trying to reach the
+                           coordinator [opt]
+
+        Returns:
+            server (proxy): job server (get_job, put_result, put, close,
+                            get_status)
+    """
+
+    _ClientManager.register('JobServer')
+    manager = _ClientManager(address=address,authkey=authkey)
+
+    # connect, retrying while the coordinator starts
+    t_start = time.time()
+    while True:
+        try:
+            manager.connect()
+            break
+        except (ConnectionRefusedError,OSError):
+            if time.time() - t_start > retry:
+                raise
+            time.sleep(0.5)
+
+    return manager.JobServer()
+
+def WorkJobs(address=('localhost',QueuePort),authkey=QueueAuthKey,
+             n_workers=None,timeout=None,JournalPath=None,
+             retry=30.,verbose=0):
+    """ Worker that pulls jobs from a coordinator and runs them
+
+        Args:
+            address (tuple): (host, port) of coordinator [opt]
+            authkey (bytes): authentication key of coordinator [opt]
+            n_workers (int): number of simultaneous jobs [opt, no. of cores]
+            timeout (float): per-job timeout in seconds [opt]
+            JournalPath (string): path to campaign journal [opt]
+            retry (float): seconds to keep trying to reach the
+                           coordinator [opt]
+            verbose (int): flag to suppress print statements [opt]
+
+        Returns:
+            n_jobs (int): number of jobs run by this worker
+    """
+
+    n_workers = jr_run.GetNumWorkers(n_workers)
+    server    = ConnectJobServer(address=address,authkey=authkey,retry=retry)
+
+    if verbose:
+        print('\nWorker on {:s} running '.format(socket.gethostname()) + \
+              '{:d} slots...'.format(n_workers))
+
+    counts = [0] * n_workers
+
+    # each slot pulls jobs until the coordinator has none left
+    def Slot(i_slot):
+        WorkerID = '{:s}:{:d}:{:d}'.format(socket.gethostname(),
+                                           os.getpid(),i_slot)
+        while True:
+            try:
+                status, i_job, job = server.get_job(WorkerID)
+            except (EOFError,ConnectionError):
+                break
+            if status == 'done':
+                break
+            elif status == 'wait':
+                time.sleep(1.)
+                continue
+            result = jr_run.RunJob(job,timeout,JournalPath)
+            server.put_result(WorkerID,i_job,result)
+            counts[i_slot] += 1
+            if verbose:
+                sys.stdout.write('  {:s}: exit code {:d}\n'.format(
+                                 result['Name'],result['ExitCode']))
+
+    threads = [threading.Thread(target=Slot,args=(i_slot,)) \
+                    for i_slot in range(n_workers)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    return sum(counts)
+
+def RunWorkQueue(jobs,
+                 n_nodes=2,n_workers=1,port=0,timeout=None,JournalPath=None,
+                 lease=None,verbose=0):
+    """ Run jobs with a coordinator and local worker processes
+
+        Local stand-in for a multi-node run: each worker process acts as
+        one node.
+
+        Args:
+            jobs (list): list of job dictionaries (see jr_run.MakeJob)
+            n_nodes (int): number of worker processes [opt]
+            n_workers (int): simultaneous jobs per worker process [opt]
+            port (int): port for coordinator [opt, any free port]
+            timeout (float): per-job timeout in seconds [opt]
+            JournalPath (string): path to campaign journal, recorded by
+                                  the coordinator [opt]
+            lease (float): seconds after which an unreported job is handed
+                           out again [opt, never]
+            verbose (int): flag to suppress print statements [opt]
+
+        Returns:
+            results (list): result dictionaries in order of jobs
+    """
+
+    # pick free port so the workers know where to connect
+    if not port:
+        with socket.socket() as sock:
+            sock.bind(('localhost',0))
+            port = sock.getsockname()[1]
+
+    # start workers, which wait for the coordinator to come up
+    ctx   = multiprocessing.get_context('spawn')
+    procs = [ctx.Process(target=WorkJobs,
+                         kwargs={'address':('localhost',port),
+                                 'n_workers':n_workers,'timeout':timeout})
+             for i_node in range(n_nodes)]
+    for proc in procs:
+        proc.start()
+
+    results = ServeJobs(jobs,address=('localhost',port),lease=lease,
+                        JournalPath=JournalPath,WorkerProcs=procs,
+                        verbose=verbose)
+
+    for proc in procs:
+        proc.join()
+
+    return results
@@ -0,0 +1,199 @@
+"""
+A series of Python functions for downsampling full-field wind files in time
+and space (e.g., for cheap screening runs).
+
+AUTHOR:  Jenni Rinker, Duke University
+CONTACT: jennifer.rinker@duke.edu
+
+
+NOTES:
+    In time, the field is low-pass filtered with a linear-phase windowed-
+    sinc filter (cut-off at the new Nyquist frequency) and decimated by an
+    integer factor. The filter is only evaluated at the kept time steps and
+    the ends are padded with the first/last value, so the field is not
+    shifted in time. In space, each coarse grid point is the area-weighted
+    average of the fine points in its cell (cells at the grid edges are
+    truncated), keeping the lowest grid point and the grid extent.
+
+    The input file is streamed in blocks of time steps
+    (jr_wind.ReadWindBlocks); only the (small) downsampled field is held in
+    memory before it is written as .bts or .wnd with matching dt, dy, dz.
+
+        jr_resample.ResampleWind('full.bts','coarse.bts',q_t=4,q_y=2,q_z=2)
+
+"""
+
+# module dependencies
+import jr_wind, jr_timing
+import os
+import numpy as np
+
+
+def GetLowPassTaps(q_t,
+                   n_half=4):
+    """ Windowed-sinc low-pass filter for decimation by q_t
+
+        Args:
+            q_t (int): decimation factor
+            n_half (int): half length of filter in multiples of q_t [opt]
+
+        Returns:
+            taps (numpy array): [2*n_half*q_t + 1] symmetric filter taps
+                                (sum 1)
+    """
+
+    n_d  = n_half * q_t
+    k    = np.arange(-n_d,n_d + 1)
+    taps = np.sinc(k / q_t) * np.hamming(2 * n_d + 1)
+
+    return taps / taps.sum()
+
+def GetAreaWeights(n,q):
+    """ Area-averaging weights of coarse grid points along one grid axis
+
+        Coarse point i is at fine point i*q, its cell spans q fine spacings.
+
+        Args:
+            n (int): number of fine grid points ((n - 1) divisible by q)
+            q (int): coarsening factor
+
+        Returns:
+            W (numpy array): [n_coarse x n] weights (rows sum to 1)
+    """
+
+    if (n - 1) % q:
+        errStr = 'Cannot coarsen {:d} grid points by {:d} '.format(n,q) + \
+                 '(n - 1 must be divisible by factor).'
+        raise ValueError(errStr)
+
+    # overlap of fine cell [j-0.5,j+0.5] with coarse cell [c-q/2,c+q/2]
+    c = q * np.arange((n - 1) // q + 1)[:,None]
+    j = np.arange(n)[None,:]
+    lo = np.maximum(j - 0.5,np.maximum(c - q / 2.,-0.5))
+    hi = np.minimum(j + 0.5,np.minimum(c + q / 2.,n - 0.5))
+    W  = np.maximum(hi - lo,0.)
+
+    return W / W.sum(axis=1,keepdims=True)
+
+def DecimateBlocks(blocks,q_t,n_t,
+                   n_half=4):
+    """ Low-pass filter and decimate stream of time blocks
+
+        Args:
+            blocks (iterable): [... x n_b] arrays of consecutive time steps
+            q_t (int): decimation factor
+            n_t (int): total number of time steps
+            n_half (int): half length of filter in multiples of q_t [opt]
+
+        Returns:
+            out (generator): [... x n_o] arrays of decimated time steps
+                             (ceil(n_t/q_t) in total)
+    """
+
+    if q_t == 1:
+        for block in blocks:
+            yield block
+        return
+
+    taps  = GetLowPassTaps(q_t,n_half=n_half).astype(np.float32)
+    n_d   = (taps.size - 1) // 2
+    n_out = -(-n_t // q_t)
+    buf, i_out = None, 0
+    for i_block, block in enumerate(blocks):
+
+        # pad start with first value, append block to buffer
+        if buf is None:
+            buf = np.repeat(block[...,:1],n_d,axis=-1)
+        buf = np.concatenate([buf,block],axis=-1)
+        last = block[...,-1:]
+
+        # outputs whose filter window is complete (window of output k
+        #   starts at buffer index k*q_t - (consumed samples))
+        n_ready = max((buf.shape[-1] - taps.size) // q_t + 1,0)
+        n_ready = min(n_ready,n_out - i_out)
+        if n_ready:
+            windows = np.lib.stride_tricks.sliding_window_view(buf,taps.size,
+                                                               axis=-1)
+            yield windows[...,:n_ready * q_t:q_t,:].dot(taps)
+            i_out += n_ready
+            buf = buf[...,n_ready * q_t:]
+
+    # pad end with last value and flush remaining outputs
+    if i_out < n_out:
+        buf = np.concatenate([buf,np.repeat(last,n_d + q_t,axis=-1)],
+                             axis=-1)
+        windows = np.lib.stride_tricks.sliding_window_view(buf,taps.size,
+                                                           axis=-1)
+        yield windows[...,:(n_out - i_out) * q_t:q_t,:].dot(taps)
+
+    return
+
+def ResampleWind(InPath,OutPath,
+                 q_t=1,q_y=1,q_z=1,n_block=1024,n_half=4,verbose=0):
+    """ Downsampled copy of binary full-field wind file
+
+        Args:
+            InPath (string): path to .bts, .wnd or .bl file
+            OutPath (string): path of downsampled file (.bts or .wnd)
+            q_t (int): time decimation factor [opt]
+            q_y (int): lateral coarsening factor [opt]
+            q_z (int): vertical coarsening factor [opt]
+            n_block (int): time steps read at once [opt]
+            n_half (int): half length of time filter in multiples of q_t
+                          [opt]
+            verbose (int): flag to suppress print statements [opt]
+
+        Returns:
+            header (dictionary): header of written file (see
+                                 jr_wind.ReadWindHeader)
+    """
+
+    header = jr_wind.ReadWindHeader(InPath)
+    if header['n_t'] is None:
+        errStr = 'Wind file {:s} is not a binary full-field file.'.format(
+                                                                InPath)
+        raise ValueError(errStr)
+    if not OutPath.endswith(('.bts','.wnd')):
+        errStr = 'Uncoded output file extension \"{:s}\".'.format(
+                                            os.path.splitext(OutPath)[1])
+        raise ValueError(errStr)
+
+    W_y = GetAreaWeights(header['n_y'],q_y).astype(np.float32)
+    W_z = GetAreaWeights(header['n_z'],q_z).astype(np.float32)
+    if verbose:
+        print('\nResampling {:s} ({:d} x {:d} x {:d}) '.format(InPath,
+                    header['n_z'],header['n_y'],header['n_t']) + \
+              'to {:d} x {:d} x {:d}...'.format(W_z.shape[0],W_y.shape[0],
+                    -(-header['n_t'] // q_t)))
+
+    # coarsen each block in space, then filter and decimate in time
+    def Coarsened():
+        for i_t0, turb in jr_wind.ReadWindBlocks(InPath,n_block=n_block):
+            with jr_timing.Stage('resample.space'):
+                yield np.einsum('az,czyt,by->cabt',W_z,turb,W_y,
+                                optimize=True)
+
+    with jr_timing.Stage('resample.time'):
+        turb = np.concatenate(list(DecimateBlocks(Coarsened(),q_t,
+                                                  header['n_t'],
+                                                  n_half=n_half)),axis=-1)
+
+    # grid of coarse field starts at the same lowest point
+    dt, dy, dz = header['dt'] * q_t, header['dy'] * q_y, header['dz'] * q_z
+    if 'z0' in header:
+        z0, zhub = header['z0'], header['zhub']
+    else:
+        zhub = header['zhub']
+        z0   = zhub - 0.5 * (header['n_z'] - 1) * header['dz']
+    with jr_timing.Stage('resample.write'):
+        if OutPath.endswith('.bts'):
+            jr_wind.WriteBTS(OutPath,turb,dz,dy,dt,zhub,z0,
+                             uhub=header['uhub'],
+                             desc='Resampled from {:s} (q_t={:d}, '.format(
+                                os.path.basename(InPath),q_t) + \
+                                'q_y={:d}, q_z={:d})'.format(q_y,q_z))
+        else:
+            z_c = z0 + 0.5 * (turb.shape[1] - 1) * dz
+            jr_wind.WriteWnd(OutPath,turb,dz,dy,dt,z_c,uhub=header['uhub'])
+
+    return jr_wind.ReadWindHeader(OutPath)
@@ -0,0 +1,154 @@
+"""
+A series of Python functions for sampling full-field wind at the rotating
+blade nodes of a turbine (rotationally sampled turbulence).
+
+AUTHOR:  Jenni Rinker, Duke University
+CONTACT: jennifer.rinker@duke.edu
+
+
+NOTES:
+    Blade nodes are the AeroDyn nodes (RNodes in ADSched, measured from the
+    rotor apex) of each of the NumBl blades, projected on the rotor plane
+    with the blade cone angle. The rotor turns at constant speed RotSpeed
+    [rpm], clockwise when looking downwind, with blade 1 pointing up at
+    Azimuth = 0 (as in FAST). At azimuth psi a node at radius r is at
+        y = -r sin(psi),   z = HubHt + r cos(psi)
+    on the wind grid (y = 0 at the grid centre). Tilt, overhang and yaw are
+    neglected, and the grid is sampled at the rotor plane at time t
+    (frozen turbulence, as the full-field files are read by AeroDyn).
+
+    The field is read in blocks of time steps (jr_wind.ReadWindBlocks) and
+    each block is interpolated bilinearly at all blade nodes and time
+    steps with one batched gather.
+
+"""
+
+# module dependencies
+import jr_fast, jr_wind, jr_timing
+import numpy as np
+from warnings import warn
+
+
+def GetBladeNodes(TurbDict):
+    """ Radii of AeroDyn nodes in rotor plane, per blade
+
+        Args:
+            TurbDict (dictionary): turbine dictionary (ADSched, NumBl,
+                                   PreCone(<n>))
+
+        Returns:
+            r (numpy array): [n_blades x n_nodes] radii in rotor plane [m]
+    """
+
+    RNodes = np.array([row[0] for row in TurbDict['ADSched']],dtype=float)
+    NumBl  = int(TurbDict['NumBl'])
+    cone   = np.radians([TurbDict.get('PreCone({:d})'.format(i_bl),0.) \
+                            for i_bl in range(1,NumBl + 1)])
+
+    return np.cos(cone)[:,None] * RNodes[None,:]
+
+def GetBladeAzimuths(NumBl,t,RotSpeed,
+                     Azimuth=0.):
+    """ Azimuth of each blade over time
+
+        Args:
+            NumBl (int): number of blades
+            t (numpy array): [n_t] times [s]
+            RotSpeed (float): rotor speed [rpm]
+            Azimuth (float): azimuth of blade 1 at t = 0 [deg] [opt]
+
+        Returns:
+            psi (numpy array): [n_blades x n_t] azimuths [rad]
+    """
+
+    psi_bl = 2. * np.pi * np.arange(NumBl) / NumBl
+    Omega  = RotSpeed * np.pi / 30.
+
+    return np.radians(Azimuth) + psi_bl[:,None] + Omega * np.asarray(t)[None,:]
+
+def SampleRotorWind(TurbDict,WindPath,RotSpeed,
+                    Azimuth=0.,components=(0,1,2),n_block=1024,verbose=0):
+    """ Wind at rotating blade nodes over the full wind file
+
+        Args:
+            TurbDict (dictionary): turbine dictionary (ADSched, NumBl,
+                                   PreCone(<n>), hub height from
+                                   jr_fast.GetHubHeight)
+            WindPath (string): path to binary full-field wind file
+            RotSpeed (float): rotor speed [rpm]
+            Azimuth (float): azimuth of blade 1 at t = 0 [deg] [opt]
+            components (tuple): wind components to sample (0 = u, 1 = v,
+                                2 = w) [opt]
+            n_block (int): time steps read and interpolated at once [opt]
+            verbose (int): flag to suppress print statements [opt]
+
+        Returns:
+            turb_rot (numpy array): [n_comp x n_blades x n_nodes x n_t]
+                                    wind velocities at blade nodes
+            t (numpy array): [n_t] times [s]
+            psi (numpy array): [n_blades x n_t] blade azimuths [rad]
+    """
+
+    header = jr_wind.ReadWindHeader(WindPath)
+    n_z, n_y, n_t, dt = header['n_z'], header['n_y'], header['n_t'], \
+                        header['dt']
+    if n_t is None:
+        errStr = 'Wind file {:s} is not a binary full-field file.'.format(
+                                                                WindPath)
+        raise ValueError(errStr)
+    if (n_z < 2) or (n_y < 2):
+        errStr = 'Wind grid must have at least 2 x 2 points.'
+        raise ValueError(errStr)
+
+    # grid origin (lowest, leftmost point) relative to hub
+    HubHt = jr_fast.GetHubHeight(TurbDict)
+    y_0   = -header['dy'] * (n_y - 1) / 2.
+    if 'z0' in header:
+        z_0 = header['z0'] - HubHt
+    else:
+        z_0 = header['zhub'] - HubHt - header['dz'] * (n_z - 1) / 2.
+
+    r   = GetBladeNodes(TurbDict)                           # [n_bl x n_n]
+    t   = dt * np.arange(n_t)
+    psi = GetBladeAzimuths(r.shape[0],t,RotSpeed,Azimuth=Azimuth)
+    if verbose:
+        print('\nSampling {:s} at {:d} x {:d} blade nodes...'.format(
+                                        WindPath,r.shape[0],r.shape[1]))
+
+    # fractional grid indices of all nodes at all times
+    f_y = (-r[:,:,None] * np.sin(psi)[:,None,:] - y_0) / header['dy']
+    f_z = (r[:,:,None] * np.cos(psi)[:,None,:] - z_0) / header['dz']
+    n_out = np.count_nonzero((f_y < 0) | (f_y > n_y - 1) | \
+                             (f_z < 0) | (f_z > n_z - 1))
+    if n_out:
+        warn('{:d} blade node positions outside wind grid '.format(n_out) + \
+             'of {:s}; using nearest grid edge.'.format(WindPath))
+    f_y = np.clip(f_y,0.,n_y - 1.)
+    f_z = np.clip(f_z,0.,n_z - 1.)
+    i_y = np.minimum(f_y.astype(np.intp),n_y - 2)
+    i_z = np.minimum(f_z.astype(np.intp),n_z - 2)
+    a_y = (f_y - i_y).astype(np.float32)
+    a_z = (f_z - i_z).astype(np.float32)
+    del f_y, f_z
+
+    components = list(components)
+    turb_rot   = np.empty((len(components),) + psi.shape[:1] + \
+                          r.shape[1:] + (n_t,),dtype=np.float32)
+    with jr_timing.Stage('rotwind.sample'):
+        for i_t0, turb in jr_wind.ReadWindBlocks(WindPath,n_block=n_block):
+            n_b  = turb.shape[3]
+            sl   = slice(i_t0,i_t0 + n_b)
+            flat = turb[components].reshape(len(components),-1)
+
+            # flat index of lower-left corner for [n_bl x n_n x n_b] nodes
+            i_t  = np.arange(n_b)[None,None,:]
+            i_00 = (i_z[:,:,sl] * n_y + i_y[:,:,sl]) * n_b + i_t
+            c_00 = flat[:,i_00]
+            c_01 = flat[:,i_00 + n_b]                   # y + 1
+            c_10 = flat[:,i_00 + n_y * n_b]             # z + 1
+            c_11 = flat[:,i_00 + (n_y + 1) * n_b]
+            ay, az = a_y[:,:,sl], a_z[:,:,sl]
+            turb_rot[...,sl] = (1 - az) * ((1 - ay) * c_00 + ay * c_01) + \
+                                az * ((1 - ay) * c_10 + ay * c_11)
+
+    return turb_rot, t, psi
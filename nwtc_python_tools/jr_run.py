@@ -0,0 +1,721 @@
+"""
+A series of Python functions for running NWTC CAE executables (e.g., FAST,
+TurbSim) locally on Linux in place of the Windows batch files in templates/.
+
+AUTHOR:  Jenni Rinker, Duke University
+CONTACT: jennifer.rinker@duke.edu
+
+
+NOTES:
+    Jobs are plain dictionaries with keys 'Name', 'Cmd' and (optionally)
+    'Cwd', 'LogPath' and, for FAST jobs, 'CacheDir' and 'CacheMB' of a
+    result cache (see jr_cache) and 'StageDir' of node-local copies of the
+    inputs (see jr_stage). Each job's stdout/stderr is captured to a log file
+    in a "Messages" directory, which replaces the %SMSSFILE% message files
+    written by the batch templates.
+
+"""
+
+# module dependencies
+import jr_fast, jr_wind, jr_journal, jr_cache, jr_stage
+import os, sys, time, json, heapq, socket, subprocess, asyncio
+from concurrent.futures import ThreadPoolExecutor
+
+
+def GetNumWorkers(n_workers=None):
+    """ Number of simultaneous jobs to run on this node
+
+        Args:
+            n_workers (int): requested number of workers [opt]
+
+        Returns:
+            n_workers (int): number of workers (defaults to available cores)
+    """
+
+    if n_workers is None:
+        try:
+            n_workers = len(os.sched_getaffinity(0))
+        except AttributeError:
+            n_workers = os.cpu_count() or 1
+
+    return max(int(n_workers),1)
+
+def MakeJob(Name,ExePath,InpPath,Cwd=None,LogDir=None):
+    """ Job dictionary for running an executable on one input file
+
+        Args:
+            Name (string): job name (e.g., FAST file name without extension)
+            ExePath (string or list): path to executable, or list with the
+                                      executable and leading arguments (e.g.,
+                                      [sys.executable, 'stand_in.py'])
+            InpPath (string): path to input file
+            Cwd (string): directory to run in [opt, dir of InpPath]
+            LogDir (string): directory for message files [opt,
+                             <Cwd>/Messages]
+
+        Returns:
+            job (dictionary): job dictionary
+    """
+
+    # executable can be a single path or a command prefix
+    if isinstance(ExePath,str):
+        Cmd = [ExePath]
+    else:
+        Cmd = list(ExePath)
+    InpPath = os.path.abspath(InpPath)
+    Cmd.append(InpPath)
+
+    # default run and log directories
+    if Cwd is None:
+        Cwd = os.path.dirname(InpPath)
+    if LogDir is None:
+        LogDir = os.path.join(Cwd,'Messages')
+
+    job = {'Name':Name,'Cmd':Cmd,'Cwd':Cwd,
+           'LogPath':os.path.join(LogDir,Name+'.log')}
+
+    return job
+
+def RunJob(job,timeout=None,JournalPath=None):
+    """ Run a single job, capturing output to its log file
+
+        Args:
+            job (dictionary): job dictionary (see MakeJob)
+            timeout (float): seconds before the job is killed [opt]
+            JournalPath (string): path to campaign journal to record job
+                                  state and output hash in [opt]
+
+        Returns:
+            result (dictionary): job name, command, exit code, wall time,
+                                 timeout flag, log path and flag for
+                                 outputs restored from result cache
+    """
+
+    Cwd     = job.get('Cwd',None)
+    LogPath = job.get('LogPath',None)
+    if LogPath is None:
+        LogPath = os.devnull
+    elif os.path.dirname(LogPath):
+        os.makedirs(os.path.dirname(LogPath),exist_ok=True)
+
+    result = {'Name':job['Name'],'Cmd':job['Cmd'],'LogPath':LogPath,
+              'ExitCode':None,'TimedOut':False,'Time':0.,'Cached':False}
+
+    if JournalPath is not None:
+        jr_journal.SetCaseState(JournalPath,job['Name'],'running',
+                                ExitCode=None,Error=None)
+
+    # look up outputs of identical inputs and solver in result cache
+    CacheDir, key, OutPaths = job.get('CacheDir',None), None, None
+    t_start = time.time()
+    if CacheDir is not None:
+        key = jr_cache.GetCaseKey(job['Cmd'][-1],job['Cmd'][:-1],Cwd=Cwd,
+                                  CacheDir=CacheDir)
+        OutPaths = jr_cache.RestoreOutputs(CacheDir,key,job['Cmd'][-1])
+
+    with open(LogPath,'w') as f_log:
+        f_log.write(' ========= Simulation {:s} ========= \n'.format(job['Name']))
+        f_log.write('This job is running on: {:s} at {:s}\n'.format(
+                    socket.gethostname(),time.ctime(t_start)))
+        f_log.write('  Command: {:s}\n'.format(' '.join(job['Cmd'])))
+        f_log.flush()
+
+        # run executable, sending output to message file
+        if OutPaths is not None:
+            f_log.write('  Outputs restored from result cache ' + \
+                        '(key {:s}).\n'.format(key))
+            result['ExitCode'] = 0
+            result['Cached']   = True
+        else:
+            try:
+                proc = subprocess.run(job['Cmd'],cwd=Cwd,stdout=f_log,
+                                      stderr=subprocess.STDOUT,
+                                      timeout=timeout)
+                result['ExitCode'] = proc.returncode
+            except subprocess.TimeoutExpired:
+                result['TimedOut'] = True
+                result['ExitCode'] = -1
+            except OSError as err:
+                f_log.write('Could not start executable: ' + \
+                            '{:s}\n'.format(str(err)))
+                result['ExitCode'] = -1
+        result['Time'] = time.time() - t_start
+
+        # write status footer
+        if result['TimedOut']:
+            f_log.write('  ==( {:s} timed out after '.format(job['Name']) + \
+                        '{:.1f} s )==\n'.format(timeout))
+        elif result['ExitCode']:
+            f_log.write('  ==( {:s} failed with '.format(job['Name']) + \
+                        'exit code {:d} )==\n'.format(result['ExitCode']))
+        else:
+            f_log.write('{:s} ran successfully.\n'.format(job['Name']))
+        f_log.write('This job ran on: {:s} finishing at {:s}\n'.format(
+                    socket.gethostname(),time.ctime()))
+
+    # add outputs of successful run to result cache
+    if (CacheDir is not None) and (not result['Cached']) and \
+            (not result['ExitCode']) and (not result['TimedOut']):
+        jr_cache.StoreOutputs(CacheDir,key,GetFastOutPaths(job['Cmd'][-1]),
+                              MaxMB=job.get('CacheMB',None))
+
+    # staged inputs of a successful case may be evicted now
+    if (job.get('StageDir',None) is not None) and \
+            (not result['ExitCode']) and (not result['TimedOut']):
+        jr_stage.UnpinCase(job['StageDir'],os.path.abspath(job['Cmd'][-1]))
+
+    # record final state, hashing output files next to the input file
+    if JournalPath is not None:
+        RecordJobResult(JournalPath,job,result)
+
+    return result
+
+def RecordJobResult(JournalPath,job,result):
+    """ Record final state of job in campaign journal
+
+        Args:
+            JournalPath (string): path to campaign journal
+            job (dictionary): job dictionary (see MakeJob)
+            result (dictionary): result dictionary from RunJob
+    """
+
+    if result['ExitCode'] or result['TimedOut']:
+        jr_journal.SetCaseState(JournalPath,job['Name'],'failed',
+                                ExitCode=result['ExitCode'],
+                                Error='see ' + result['LogPath'])
+    else:
+        jr_journal.SetCaseState(JournalPath,job['Name'],'done',
+                                ExitCode=result['ExitCode'],
+                                OutHash=jr_journal.HashFiles(
+                                    GetFastOutPaths(job['Cmd'][-1])))
+
+    return
+
+def RunJobs(jobs,n_workers=None,timeout=None,JournalPath=None,verbose=0):
+    """ Run list of jobs with at most n_workers running at once
+
+        Args:
+            jobs (list): list of job dictionaries (see MakeJob)
+            n_workers (int): number of simultaneous jobs [opt, no. of cores]
+            timeout (float): per-job timeout in seconds [opt]
+            JournalPath (string): path to campaign journal [opt]
+            verbose (int): flag to suppress print statements [opt]
+
+        Returns:
+            results (list): list of result dictionaries in order of jobs
+    """
+
+    n_workers = GetNumWorkers(n_workers)
+    if verbose:
+        print('\nRunning {:d} jobs on {:d} workers...'.format(len(jobs),
+                                                            n_workers))
+
+    # threads only wait on the subprocesses, so a thread pool is sufficient
+    results = [None] * len(jobs)
+    with ThreadPoolExecutor(max_workers=n_workers) as pool:
+        futures = [pool.submit(RunJob,job,timeout,JournalPath) \
+                        for job in jobs]
+        for i_job in range(len(jobs)):
+            results[i_job] = futures[i_job].result()
+            if verbose:
+                sys.stdout.write('  {:s}: exit code {:d} '.format(
+                                results[i_job]['Name'],
+                                results[i_job]['ExitCode']) + \
+                                '({:.1f} s{:s})\n'.format(results[i_job]['Time'],
+                                ', cached' * results[i_job]['Cached']))
+
+    if verbose:
+        n_fail = len(GetFailedJobs(results))
+        print('done. {:d} of {:d} jobs failed.'.format(n_fail,len(jobs)))
+
+    return results
+
+def GetFailedJobs(results):
+    """ Names of jobs that failed or timed out
+
+        Args:
+            results (list): list of result dictionaries from RunJobs
+
+        Returns:
+            failed (list): names of failed jobs
+    """
+
+    failed = [r['Name'] for r in results if (r['ExitCode'] or r['TimedOut'])]
+
+    return failed
+
+def RunFastAll(FastDir,ExePath,
+               n_workers=None,timeout=None,LogDir=None,JournalPath=None,
+               resume=0,CacheDir=None,CacheMB=None,StageDir=None,verbose=0):
+    """ Run FAST on all .fst files in directory
+
+        Local replacement for Template.bat/Template_GrpBat.bat with
+        Template_IndBat.bat.
+
+        Args:
+            FastDir (string): directory with .fst files
+            ExePath (string or list): FAST executable or stand-in command
+            n_workers (int): number of simultaneous jobs [opt, no. of cores]
+            timeout (float): per-job timeout in seconds [opt]
+            LogDir (string): directory for message files [opt,
+                             <FastDir>/Messages]
+            JournalPath (string): path to campaign journal to record
+                                  running/done/failed cases in [opt]
+            resume (int): flag to only run cases the journal does not
+                          record as done [opt]
+            CacheDir (string): result cache to restore outputs of identical
+                               cases from and add new outputs to (see
+                               jr_cache) [opt]
+            CacheMB (float): size limit of result cache in MB [opt]
+            StageDir (string): stage directory the inputs were staged to
+                               (see jr_stage); staged files of successful
+                               cases are unpinned [opt]
+            verbose (int): flag to suppress print statements [opt]
+
+        Returns:
+            results (list): list of result dictionaries
+    """
+
+    # get sorted list of FAST files from directory
+    FastNames = sorted([f for f in os.listdir(FastDir) if f.endswith('.fst')])
+
+    # skip finished cases if resuming
+    if resume and (JournalPath is not None):
+        todo = set(jr_journal.GetResumeCases(JournalPath,
+                        [os.path.splitext(f)[0] for f in FastNames]))
+        FastNames = [f for f in FastNames if os.path.splitext(f)[0] in todo]
+
+    # create job for each FAST file
+    jobs = [MakeJob(os.path.splitext(FastName)[0],ExePath,
+                    os.path.join(FastDir,FastName),Cwd=FastDir,LogDir=LogDir)
+            for FastName in FastNames]
+    if CacheDir is not None:
+        for job in jobs:
+            job.update({'CacheDir':CacheDir,'CacheMB':CacheMB})
+    if StageDir is not None:
+        for job in jobs:
+            job['StageDir'] = StageDir
+
+    results = RunJobs(jobs,n_workers=n_workers,timeout=timeout,
+                      JournalPath=JournalPath,verbose=verbose)
+
+    return results
+
+def RunTurbSimAll(InpPaths,ExePath,
+                  overwrite=0,n_workers=None,timeout=None,LogDir=None,
+                  verbose=0):
+    """ Run TurbSim on list of input files
+
+        TurbSim writes <RootName>.bts next to each input file, so input
+        files written to the wind directory (see jr_wind.WriteTurbSimAll)
+        produce their wind files there. Local replacement for
+        Template_TurbSimBat.bat.
+
+        Args:
+            InpPaths (list): paths to TurbSim input files
+            ExePath (string or list): TurbSim executable (e.g.,
+                                      bin/TurbSim_glin64 built with the
+                                      compiling-turbsim-v2.0 Makefile) or
+                                      stand-in command
+            overwrite (int): flag to rerun cases whose .bts file exists [opt]
+            n_workers (int): number of simultaneous jobs [opt, no. of cores]
+            timeout (float): per-job timeout in seconds [opt]
+            LogDir (string): directory for message files [opt,
+                             <input dir>/Messages]
+            verbose (int): flag to suppress print statements [opt]
+
+        Returns:
+            results (list): list of result dictionaries
+    """
+
+    # create job for each input file without a wind file
+    jobs = []
+    for InpPath in InpPaths:
+        RootPath = os.path.splitext(InpPath)[0]
+        if (not overwrite) and os.path.exists(RootPath + '.bts'):
+            continue
+        jobs.append(MakeJob(os.path.basename(RootPath),ExePath,InpPath,
+                            LogDir=LogDir))
+
+    results = RunJobs(jobs,n_workers=n_workers,timeout=timeout,
+                      verbose=verbose)
+
+    return results
+
+def GetFastOutPaths(FastPath):
+    """ Paths to existing FAST output files for .fst file
+
+        Args:
+            FastPath (string): path to .fst file
+
+        Returns:
+            OutPaths (list): paths to .out/.outb files that exist
+    """
+
+    RootPath = os.path.splitext(FastPath)[0]
+    OutPaths = [RootPath + ext for ext in ('.out','.outb') \
+                    if os.path.exists(RootPath + ext)]
+
+    return OutPaths
+
+def RunPipeline(WindSrcs,TurbName,ModlDir,FastDir,FastExe,
+                TurbSimExe=None,PostFcn=None,Naming=1,version=7,
+                n_workers=None,QueueSize=None,timeout=None,
+                CleanWind=0,CleanOut=0,verbose=0,
+                **kwargs):
+    """ Run TurbSim, FAST input generation, FAST and post-processing as
+        an overlapping pipeline
+
+        Each case moves to the next stage as soon as its previous stage
+        finishes, so TurbSim, FAST and post-processing run at the same
+        time on different cases. Stages are connected by bounded queues:
+        at most QueueSize wind files wait for FAST at any time, which also
+        bounds the disk used by wind files when CleanWind is set.
+
+        Args:
+            WindSrcs (list): TurbSim input files (.inp) and/or existing
+                             wind files (.bts, .wnd, .bl)
+            TurbName (string): turbine name
+            ModlDir (string): directory with wind-independent files (e.g.,
+                              Blade, Tower, Pitch files)
+            FastDir (string): directory to write FAST & AeroDyn files to
+            FastExe (string or list): FAST executable or stand-in command
+            TurbSimExe (string or list): TurbSim executable or stand-in
+                                         command (needed for .inp) [opt]
+            PostFcn (function): post-processing function called as
+                                PostFcn(FastName,OutPaths); its return value
+                                is saved in the case dictionary [opt]
+            Naming (string): flag for naming convention for FAST files [opt]
+                                1 = '<WindName>.fst'
+                                2 = '<TurbName>_<WindName>.fst'
+            version (int): FAST version (7 or 8) [opt]
+            n_workers (int): number of simultaneous executables [opt, no.
+                             of cores]
+            QueueSize (int): maximum cases waiting between stages [opt,
+                             2*n_workers]
+            timeout (float): per-executable timeout in seconds [opt]
+            CleanWind (int): flag to delete wind files after FAST ran [opt]
+            CleanOut (int): flag to delete FAST output files after
+                            post-processing [opt]
+            verbose (int): flag to suppress print statements [opt]
+            kwargs (dictionary): keyword arguments to WriteFastADOne [opt]
+
+        Returns:
+            cases (list): case dictionaries sorted by name, with results
+                          from each stage and 'Error' for failed cases
+    """
+
+    n_workers = GetNumWorkers(n_workers)
+    if QueueSize is None:
+        QueueSize = 2 * n_workers
+
+    if verbose:
+        print('\nRunning pipeline for {:d} cases '.format(len(WindSrcs)) + \
+              'on {:d} workers...'.format(n_workers))
+
+    cases = asyncio.run(_RunPipelineAsync(WindSrcs,TurbName,ModlDir,FastDir,
+                            FastExe,TurbSimExe,PostFcn,Naming,version,
+                            n_workers,QueueSize,timeout,CleanWind,CleanOut,
+                            verbose,kwargs))
+
+    if verbose:
+        n_fail = len([case for case in cases if case['Error']])
+        print('done. {:d} of {:d} cases failed.'.format(n_fail,len(cases)))
+
+    return sorted(cases,key=lambda case: case['Name'])
+
+async def _RunPipelineAsync(WindSrcs,TurbName,ModlDir,FastDir,FastExe,
+                            TurbSimExe,PostFcn,Naming,version,n_workers,
+                            QueueSize,timeout,CleanWind,CleanOut,verbose,
+                            kwargs):
+    """ Coroutine for RunPipeline (see RunPipeline for arguments)
+    """
+
+    # executables share the cores; each stage has its own worker tasks
+    cores   = asyncio.Semaphore(n_workers)
+    q_src   = asyncio.Queue()
+    q_wind  = asyncio.Queue(maxsize=QueueSize)
+    q_fast  = asyncio.Queue(maxsize=QueueSize)
+    q_post  = asyncio.Queue(maxsize=QueueSize)
+    cases   = []
+
+    async def RunExe(Name,ExePath,InpPath,StageDir=None):
+        async with cores:
+            job = MakeJob(Name,ExePath,InpPath)
+            if StageDir is not None:
+                job['StageDir'] = StageDir
+            return await asyncio.to_thread(RunJob,job,timeout)
+
+    # stage 1: TurbSim (wind files are passed through)
+    async def TurbSimStage(case):
+        if case['WindSrc'].endswith('.inp'):
+            if TurbSimExe is None:
+                raise ValueError('TurbSim executable needed ' + \
+                                 'for {:s}'.format(case['WindSrc']))
+            result = await RunExe(case['Name'],TurbSimExe,case['WindSrc'])
+            case['TurbSim'] = result
+            if result['ExitCode'] or result['TimedOut']:
+                raise RuntimeError('TurbSim failed, see ' + result['LogPath'])
+            case['WindPath'] = os.path.splitext(case['WindSrc'])[0] + '.bts'
+        elif os.path.exists(case['WindSrc']):
+            case['WindPath'] = case['WindSrc']
+        else:
+            raise IOError('No such wind file: ' + case['WindSrc'])
+
+    # stage 2: FAST/AeroDyn input files
+    async def InputStage(case):
+        case['FastName'] = jr_fast.GetFastName(TurbName,case['WindPath'],
+                                               Naming)
+        await asyncio.to_thread(jr_fast.WriteFastADOne,TurbName,
+                                case['WindPath'],case['FastName'],ModlDir,
+                                FastDir,version=version,**kwargs)
+        case['FastPath'] = os.path.join(FastDir,case['FastName']+'.fst')
+
+    # stage 3: FAST
+    async def FastStage(case):
+        result = await RunExe(case['FastName'],FastExe,case['FastPath'],
+                              StageDir=kwargs.get('StageDir',None))
+        case['Fast'] = result
+        if CleanWind and case['WindSrc'] != case['WindPath']:
+            os.remove(case['WindPath'])
+        if result['ExitCode'] or result['TimedOut']:
+            raise RuntimeError('FAST failed, see ' + result['LogPath'])
+        case['OutPaths'] = GetFastOutPaths(case['FastPath'])
+
+    # stage 4: post-processing
+    async def PostStage(case):
+        if PostFcn is not None:
+            case['Post'] = await asyncio.to_thread(PostFcn,case['FastName'],
+                                                   case['OutPaths'])
+        if CleanOut:
+            for OutPath in case['OutPaths']:
+                os.remove(OutPath)
+        if verbose:
+            sys.stdout.write('  {:s}: complete.\n'.format(case['Name']))
+
+    async def Worker(Stage,q_in,q_out):
+        while True:
+            case = await q_in.get()
+            if case is None:
+                break
+            if not case['Error']:
+                try:
+                    await Stage(case)
+                except Exception as err:
+                    case['Error'] = '{:s}: {:s}'.format(type(err).__name__,
+                                                        str(err))
+                    if verbose:
+                        sys.stdout.write('  {:s}: {:s}\n'.format(case['Name'],
+                                                        case['Error']))
+            if q_out is None:
+                cases.append(case)
+            else:
+                await q_out.put(case)
+
+    async def RunStage(Stage,q_in,q_out,n_tasks):
+        await asyncio.gather(*[Worker(Stage,q_in,q_out) \
+                               for i_task in range(n_tasks)])
+        if q_out is not None:
+            for i_task in range(n_workers):
+                await q_out.put(None)
+
+    # fill source queue, then let each stage stop its successor when done
+    for WindSrc in WindSrcs:
+        q_src.put_nowait({'Name':os.path.splitext(os.path.basename(WindSrc))[0],
+                          'WindSrc':WindSrc,'Error':None})
+    for i_task in range(n_workers):
+        q_src.put_nowait(None)
+
+    await asyncio.gather(RunStage(TurbSimStage,q_src,q_wind,n_workers),
+                         RunStage(InputStage,q_wind,q_fast,n_workers),
+                         RunStage(FastStage,q_fast,q_post,n_workers),
+                         RunStage(PostStage,q_post,None,n_workers))
+
+    return cases
+
+# ----------------------------- load balancing --------------------------------
+
+# features of the runtime cost model; all but the constant scale with the
+# number of time steps
+CostFeatures = ['Const','Steps','StepsAero','StepsOut','StepsGrid']
+
+# default cost-model coefficients [s] (rough FAST v7 values, recalibrate with
+#   FitCostModel from timings of past runs)
+CostCoeffs = [2.0, 2.0e-5, 1.0e-6, 1.0e-7, 0.0]
+
+
+def GetCostFeatures(TurbDict,WindPath=None,
+                    **kwargs):
+    """ Features for the runtime cost model of one simulation
+
+        Args:
+            TurbDict (dictionary): dictionary with FAST parameters
+            WindPath (string): path to wind file (for grid size) [opt]
+            kwargs (dictionary): simulation specifications that override
+                                 TurbDict (e.g., TMax, DT) [opt]
+
+        Returns:
+            features (list): feature values in order of CostFeatures
+    """
+
+    TMax     = kwargs.get('TMax',TurbDict['TMax'])
+    DT       = kwargs.get('DT',TurbDict['DT'])
+    n_aero   = TurbDict['NumBl'] * TurbDict['BldNodes']
+    n_out    = len(jr_fast.GetOutChannels(TurbDict['OutList']))
+
+    # wind grid size from header
+    n_grid = 1
+    if WindPath is not None:
+        header = jr_wind.ReadWindHeader(WindPath)
+        n_grid = header['n_y'] * header['n_z']
+
+    n_steps  = TMax / DT
+    features = [1., n_steps, n_steps*n_aero, n_steps*n_out, n_steps*n_grid]
+
+    return features
+
+def PredictCost(features,CostModel=None):
+    """ Predicted runtime of simulation(s)
+
+        Args:
+            features (list or array): features for one simulation or
+                                      [n_sims x n_features] array
+            CostModel (dictionary): cost model with 'Features' and
+                                    'Coeffs' [opt, default coefficients]
+
+        Returns:
+            cost (float or array): predicted runtime in seconds
+    """
+
+    import numpy as np
+    if CostModel is None:
+        CostModel = {'Features':CostFeatures,'Coeffs':CostCoeffs}
+
+    cost = np.dot(np.asarray(features,dtype=float),CostModel['Coeffs'])
+
+    return cost
+
+def FitCostModel(features,times):
+    """ Calibrate cost model from timings of past runs
+
+        Coefficients are fit with non-negative least squares so that each
+        feature can only add to the runtime.
+
+        Args:
+            features (list): [n_sims x n_features] features of past runs
+            times (list): wall-clock times of past runs [s] (e.g., 'Time'
+                          from RunJobs results)
+
+        Returns:
+            CostModel (dictionary): cost model with 'Features', 'Coeffs'
+                                    and relative RMS error 'RelErr'
+    """
+
+    import numpy as np
+    from scipy.optimize import nnls
+    X = np.asarray(features,dtype=float)
+    y = np.asarray(times,dtype=float)
+
+    # scale columns so the fit is well conditioned
+    scale = np.abs(X).max(axis=0)
+    scale[scale == 0] = 1.
+    coeffs, res = nnls(X/scale,y)
+    coeffs /= scale
+
+    RelErr = np.sqrt(np.mean((np.dot(X,coeffs) - y)**2)) / np.mean(y)
+    CostModel = {'Features':CostFeatures,'Coeffs':[float(c) for c in coeffs],
+                 'RelErr':float(RelErr)}
+
+    return CostModel
+
+def SaveCostModel(CostModel,fpath):
+    """ Save cost model to JSON file
+
+        Args:
+            CostModel (dictionary): cost model from FitCostModel
+            fpath (string): path to file
+    """
+
+    with open(fpath,'w') as f:
+        json.dump(CostModel,f)
+
+    return
+
+def LoadCostModel(fpath):
+    """ Load cost model from JSON file
+
+        Args:
+            fpath (string): path to file
+
+        Returns:
+            CostModel (dictionary): cost model
+    """
+
+    with open(fpath,'r') as f:
+        CostModel = json.load(f)
+
+    return CostModel
+
+def BalanceJobs(jobs,costs,n_groups):
+    """ Bin-pack jobs into groups with (nearly) equal total cost
+
+        Jobs are assigned longest-first to the group with the smallest
+        total cost so far (LPT rule), which keeps the longest group
+        within 4/3 of the best possible wall-clock time. Within each group
+        jobs are ordered longest-first.
+
+        Args:
+            jobs (list): job dictionaries (or any items, e.g., case names)
+            costs (list): predicted cost of each job
+            n_groups (int): number of worker groups or job-array chunks
+
+        Returns:
+            groups (list): list of n_groups lists of jobs
+            loads (list): predicted total cost of each group
+    """
+
+    import numpy as np
+    groups = [[] for i_grp in range(n_groups)]
+    loads  = [0.] * n_groups
+
+    # heap of (group load, group index)
+    heap = [(0.,i_grp) for i_grp in range(n_groups)]
+    for i_job in np.argsort(costs)[::-1]:
+        load, i_grp = heapq.heappop(heap)
+        groups[i_grp].append(jobs[i_job])
+        loads[i_grp] = load + costs[i_job]
+        heapq.heappush(heap,(loads[i_grp],i_grp))
+
+    return groups, loads
+
+def WriteJobGroups(groups,fpath):
+    """ Save job groups to JSON file for job-array execution
+
+        Each array task loads its own group with ReadJobGroup and passes
+        it to RunJobs.
+
+        Args:
+            groups (list): groups from BalanceJobs
+            fpath (string): path to file
+    """
+
+    with open(fpath,'w') as f:
+        json.dump(groups,f)
+
+    return
+
+def ReadJobGroup(fpath,i_group):
+    """ Load one job group saved with WriteJobGroups
+
+        Args:
+            fpath (string): path to file
+            i_group (int): group index (e.g., job-array task ID)
+
+        Returns:
+            jobs (list): jobs in group
+    """
+
+    with open(fpath,'r') as f:
+        groups = json.load(f)
+
+    return groups[i_group]
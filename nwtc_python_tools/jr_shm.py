@@ -0,0 +1,211 @@
+"""
+A series of Python functions for sharing decoded wind fields between
+parallel worker processes on one node.
+
+AUTHOR:  Jenni Rinker, Duke University
+CONTACT: jennifer.rinker@duke.edu
+
+
+NOTES:
+    The parent process decodes a wind file once (jr_wind.readModel) into a
+    block of multiprocessing.shared_memory and passes the small handle
+    returned by ShareWind to its workers. Workers call AttachWind to get a
+    read-only numpy view of the field without copying, so N workers cost
+    one field's worth of memory:
+
+        handle = jr_shm.ShareWind(WindPath)
+        try:
+            ... pool.submit(fcn,handle,...) ...   # turb = AttachWind(handle)
+        finally:
+            jr_shm.ReleaseWind(WindPath)
+
+    or simply jr_shm.MapWind(fcn,WindPath,args_list). The parent counts
+    the handles it gives out for each file, and the block is unlinked when
+    the last one is released (or at exit of the parent). Workers keep their
+    mapping open for later tasks on the same field until DetachWind.
+    Workers must be started with multiprocessing (any start method) by the
+    process that shared the field.
+
+"""
+
+# module dependencies
+import jr_wind, jr_timing, jr_run
+import os, sys, atexit
+from multiprocessing import shared_memory
+from concurrent.futures import ProcessPoolExecutor
+import numpy as np
+
+
+# fields shared by this process: path -> [modification time, shm, handle,
+#   number of references]; forked workers inherit a copy but do not own it
+_Shared   = {}
+_OwnerPid = os.getpid()
+
+# fields attached in this process: shared-memory name -> (shm, turb)
+_Attached = {}
+
+
+def ShareWind(WindPath):
+    """ Decode wind file into shared memory (once) and add a reference
+
+        Args:
+            WindPath (string): path to wind file (.bts, .wnd or .bl)
+
+        Returns:
+            handle (dictionary): 'Name' of shared-memory block, 'Shape' and
+                                 'DType' of field and 'Path' of wind file
+    """
+
+    mtime = os.path.getmtime(WindPath)
+    entry = _Shared.get(WindPath)
+    if (entry is not None) and (entry[0] == mtime):
+        entry[3] += 1
+        return entry[2]
+    if entry is not None:
+        _Unlink(WindPath)
+
+    # decode field, then copy into shared block (decoded copy is freed)
+    with jr_timing.Stage('read.wind'):
+        turb = jr_wind.readModel(WindPath)
+    with jr_timing.Stage('share.wind'):
+        shm  = shared_memory.SharedMemory(create=True,size=max(turb.nbytes,1))
+        view = np.ndarray(turb.shape,dtype=turb.dtype,buffer=shm.buf)
+        view[...] = turb
+    jr_timing.Count('bytes.shared',turb.nbytes)
+    handle = {'Name':shm.name,'Shape':list(turb.shape),
+              'DType':turb.dtype.str,'Path':WindPath}
+    del turb, view
+
+    _Shared[WindPath] = [mtime,shm,handle,1]
+
+    return handle
+
+def ReleaseWind(WindPath):
+    """ Remove a reference to a shared field (unlinked after the last one)
+
+        Args:
+            WindPath (string): path to wind file given to ShareWind
+
+        Returns:
+            n_refs (int): number of remaining references
+    """
+
+    entry = _Shared.get(WindPath)
+    if entry is None:
+        errStr = 'Wind file {:s} is not shared.'.format(WindPath)
+        raise ValueError(errStr)
+
+    entry[3] -= 1
+    if entry[3] > 0:
+        return entry[3]
+    _Unlink(WindPath)
+
+    return 0
+
+def ReleaseAll():
+    """ Unlink all fields shared by this process
+    """
+
+    if os.getpid() != _OwnerPid:
+        return
+    for WindPath in list(_Shared):
+        _Unlink(WindPath)
+
+    return
+
+def _Unlink(WindPath):
+    """ Close and unlink shared block of wind file
+    """
+
+    shm = _Shared.pop(WindPath)[1]
+    DetachWind(shm.name)
+    shm.close()
+    shm.unlink()
+
+    return
+
+def AttachWind(handle):
+    """ Read-only view of shared wind field (no copy)
+
+        Args:
+            handle (dictionary): handle from ShareWind
+
+        Returns:
+            turb (numpy array): [3 x n_z x n_y x n_t] wind velocities
+    """
+
+    name = handle['Name']
+    if name in _Attached:
+        return _Attached[name][1]
+
+    # workers started by multiprocessing share the resource tracker of the
+    #   owner, which unlinks the block if the owner dies without releasing
+    if sys.version_info >= (3,13):
+        shm = shared_memory.SharedMemory(name=name,track=False)
+    else:
+        shm = shared_memory.SharedMemory(name=name)
+
+    turb = np.ndarray(handle['Shape'],dtype=np.dtype(handle['DType']),
+                      buffer=shm.buf)
+    turb.flags.writeable = False
+    _Attached[name] = (shm,turb)
+
+    return turb
+
+def DetachWind(name):
+    """ Close mapping of shared field in this process
+
+        Arrays returned by AttachWind must not be used afterwards.
+
+        Args:
+            name (string or dictionary): shared-memory name or handle
+    """
+
+    if isinstance(name,dict):
+        name = name['Name']
+    if name in _Attached:
+        shm = _Attached.pop(name)[0]
+        try:
+            shm.close()
+        except BufferError:
+            pass    # views still exist, mapping is closed at exit
+
+    return
+
+def _CallOnWind(fcn,handle,args):
+    """ Call fcn(turb,*args) on attached shared field (in worker)
+    """
+
+    return fcn(AttachWind(handle),*args)
+
+def MapWind(fcn,WindPath,args_list,
+            n_workers=None):
+    """ Call function on one shared wind field with many arguments in parallel
+
+        Args:
+            fcn (function): module-level function fcn(turb,*args) (must be
+                            picklable), turb is read-only
+            WindPath (string): path to wind file
+            args_list (list): tuple of further arguments for each call
+            n_workers (int): number of worker processes [opt, no. of cores]
+
+        Returns:
+            results (list): return value of each call, in order of args_list
+    """
+
+    n_workers = jr_run.GetNumWorkers(n_workers)
+
+    handle = ShareWind(WindPath)
+    try:
+        with ProcessPoolExecutor(max_workers=n_workers) as pool:
+            futures = [pool.submit(_CallOnWind,fcn,handle,tuple(args)) \
+                            for args in args_list]
+            results = [future.result() for future in futures]
+    finally:
+        ReleaseWind(WindPath)
+
+    return results
+
+
+# do not leave shared blocks behind if the owner exits without releasing
+atexit.register(ReleaseAll)
@@ -0,0 +1,268 @@
+"""
+A series of Python functions for creating the steady-state look-up table
+"steady_state/<TurbName>_SS.mat" that WriteFastADOne interpolates initial
+conditions from.
+
+AUTHOR:  Jenni Rinker, Duke University
+CONTACT: jennifer.rinker@duke.edu
+
+
+NOTES:
+    The look-up table has a 'Fields' array of field names (the first is
+    'WindVxi') and an 'SS' array with one row per wind speed and one column
+    per field. Fields are matched to FAST output channels by name, or by
+    the first channel starting with the field name (e.g., 'BldPitch' is
+    taken from 'BldPitch1').
+
+"""
+
+# module dependencies
+import jr_fast, jr_run
+import os, sys
+from warnings import warn
+import scipy.io as scio
+import numpy as np
+
+
+# fields in the steady-state look-up table
+SSFields = ['WindVxi','GenSpeed','RotPwr','GenPwr','RotThrust','RotTorq',
+            'RotSpeed','BldPitch','GenTq','TSR','OoPDefl','IPDefl',
+            'TTDspFA','TTDspSS']
+
+
+def WriteSteadyWind(URef,WindDir,
+                    TMax=100.,dt=1.):
+    """ Hub-height wind file with steady, uniform wind
+
+        Args:
+            URef (float): wind speed
+            WindDir (string): directory to write wind file to
+            TMax (float): length of wind file [s] [opt]
+            dt (float): time step of wind file [s] [opt]
+
+        Returns:
+            WindPath (string): path to wind file 'SS_U<10*URef>.wnd'
+    """
+
+    WindPath = os.path.join(WindDir,
+                            'SS_U{:04d}.wnd'.format(int(round(10*URef))))
+
+    with open(WindPath,'w') as f:
+        f.write('! Steady wind file: {:.2f} m/s\n'.format(URef))
+        f.write('! Time\tWind\tWind\tVert.\tHoriz.\tVert.\tLinV\tGust\n')
+        f.write('!\tSpeed\tDir\tSpeed\tShear\tShear\tShear\tSpeed\n')
+        for t in np.arange(0.,TMax + dt,dt):
+            f.write('{:7.2f}\t{:.3f}\t0.0\t0.0\t0.0\t0.0\t0.0\t0.0\n'.format(
+                    t,URef))
+
+    return WindPath
+
+def GetSettledValues(OutPath,
+                     Fields=SSFields,TAvg=20.):
+    """ Settled values of look-up-table fields from FAST output
+
+        Args:
+            OutPath (string): path to FAST .out file
+            Fields (list): look-up-table fields [opt]
+            TAvg (float): average over the last TAvg seconds [opt]
+
+        Returns:
+            values (numpy array): settled value of each field (NaN if the
+                                  field is not in the output)
+            stds (numpy array): standard deviation of each field over the
+                                averaging window (to check settling)
+    """
+
+    channels, units, data = jr_fast.ReadFAST7Out(OutPath)
+    time   = data[:,0]
+    i_avg  = time >= (time[-1] - TAvg)
+    values = np.full(len(Fields),np.nan)
+    stds   = np.full(len(Fields),np.nan)
+
+    for i_fld in range(len(Fields)):
+        field = Fields[i_fld]
+        if field in channels:
+            channel = field
+        else:
+            matches = [c for c in channels if c.startswith(field)]
+            if not matches:
+                continue
+            channel = matches[0]
+        values[i_fld] = data[i_avg,channels.index(channel)].mean()
+        stds[i_fld]   = data[i_avg,channels.index(channel)].std()
+
+    return values, stds
+
+def WriteSSLUT(TurbName,ModlDir,SS,
+               Fields=SSFields):
+    """ Save steady-state look-up table in layout read by WriteFastADOne
+
+        Args:
+            TurbName (string): turbine name
+            ModlDir (string): directory with wind-independent files
+            SS (numpy array): [n_U x n_fields] steady-state values, sorted
+                              by wind speed
+            Fields (list): look-up-table fields, first is 'WindVxi' [opt]
+
+        Returns:
+            LUTPath (string): path to <ModlDir>/steady_state/<TurbName>_SS.mat
+    """
+
+    if Fields[0] != 'WindVxi':
+        errStr = 'First look-up-table field must be \"WindVxi\".'
+        raise ValueError(errStr)
+
+    LUTDir  = os.path.join(ModlDir,'steady_state')
+    LUTPath = os.path.join(LUTDir,TurbName+'_SS.mat')
+    if not os.path.isdir(LUTDir):
+        os.makedirs(LUTDir)
+
+    # field names are saved as a padded character array
+    n_char = max([len(field) for field in Fields])
+    mdict  = {'Fields':np.array([field.ljust(n_char) for field in Fields]),
+              'SS':np.asarray(SS,dtype=float)}
+    scio.savemat(LUTPath,mdict)
+
+    return LUTPath
+
+def GetRefineSpeeds(URefs,SS,
+                    tol=0.02,dU_min=0.1):
+    """ Wind speeds to add where look-up-table values change sharply
+
+        Each field is normalized by its range. Where a value deviates from
+        the straight line through its neighbours by more than tol (e.g.,
+        at the kink around rated), the midpoints on both sides are added.
+
+        Args:
+            URefs (numpy array): sorted wind speeds
+            SS (numpy array): [n_U x n_fields] steady-state values
+            tol (float): allowed normalized deviation from linear [opt]
+            dU_min (float): smallest wind-speed spacing [opt]
+
+        Returns:
+            URefs_new (list): wind speeds to add
+    """
+
+    URefs = np.asarray(URefs,dtype=float)
+    if len(URefs) < 3:
+        return []
+
+    # normalize fields, ignoring fields missing in output
+    vals  = SS[:,~np.any(np.isnan(SS),axis=0)]
+    span  = vals.max(axis=0) - vals.min(axis=0)
+    vals  = vals[:,span > 0] / span[span > 0]
+
+    # deviation of interior points from linear interpolation of neighbours
+    w    = (URefs[1:-1] - URefs[:-2]) / (URefs[2:] - URefs[:-2])
+    lin  = vals[:-2] + w[:,None]*(vals[2:] - vals[:-2])
+    dev  = np.abs(vals[1:-1] - lin).max(axis=1) if vals.size else \
+                np.zeros(len(URefs)-2)
+
+    URefs_new = set()
+    for i_U in np.where(dev > tol)[0] + 1:
+        for j_U in (i_U - 1,i_U):
+            if (URefs[j_U+1] - URefs[j_U]) >= 2*dU_min:
+                URefs_new.add(round(0.5*(URefs[j_U] + URefs[j_U+1]),3))
+
+    return sorted(URefs_new)
+
+def RunSteadyState(TurbName,ModlDir,WorkDir,FastExe,URefs,
+                   TMax=100.,TAvg=20.,Fields=SSFields,n_refine=2,tol=0.02,
+                   dU_min=0.1,n_workers=None,timeout=None,verbose=0,
+                   **kwargs):
+    """ Steady-state look-up table from parallel steady-wind FAST runs
+
+        Writes steady uniform wind files and FAST/AeroDyn inputs for each
+        wind speed, runs them in parallel, averages the last TAvg seconds
+        of each output and refines the wind-speed grid where the values
+        change sharply. The table is saved to
+        <ModlDir>/steady_state/<TurbName>_SS.mat.
+
+        Args:
+            TurbName (string): turbine name
+            ModlDir (string): directory with wind-independent files and
+                              FAST/AeroDyn templates
+            WorkDir (string): directory for wind, FAST and output files
+            FastExe (string or list): FAST executable or stand-in command
+            URefs (list): initial wind speeds
+            TMax (float): simulation length [s] [opt]
+            TAvg (float): averaging window at end of simulation [s] [opt]
+            Fields (list): look-up-table fields [opt]
+            n_refine (int): maximum number of refinement passes [opt]
+            tol (float): refinement tolerance (see GetRefineSpeeds) [opt]
+            dU_min (float): smallest wind-speed spacing [opt]
+            n_workers (int): number of simultaneous runs [opt, no. cores]
+            timeout (float): per-run timeout in seconds [opt]
+            verbose (int): flag to suppress print statements [opt]
+            kwargs (dictionary): keyword arguments to WriteFastADOne (e.g.,
+                                 initial conditions) [opt]
+
+        Returns:
+            LUTPath (string): path to look-up table
+            SS (numpy array): [n_U x n_fields] steady-state values (fields
+                              missing in the FAST output are dropped)
+    """
+
+    if not os.path.isdir(WorkDir):
+        os.makedirs(WorkDir)
+
+    # only write output over averaging window
+    SimSpecs = {'TMax':TMax,'TStart':max(TMax - TAvg,0.)}
+    SimSpecs.update(kwargs)
+
+    results = {}
+    todo    = sorted(set([float(U) for U in URefs]))
+    for i_pass in range(n_refine + 1):
+
+        if verbose:
+            print('\nSteady-state pass {:d}: '.format(i_pass) + \
+                  '{:d} wind speeds...'.format(len(todo)))
+
+        # write wind and FAST files, then run in parallel
+        jobs = []
+        for URef in todo:
+            WindPath = WriteSteadyWind(URef,WorkDir,TMax=TMax)
+            FastName = os.path.splitext(os.path.basename(WindPath))[0]
+            jr_fast.WriteFastADOne(TurbName,WindPath,FastName,ModlDir,
+                                   WorkDir,**SimSpecs)
+            jobs.append(jr_run.MakeJob(FastName,FastExe,
+                                       os.path.join(WorkDir,FastName+'.fst')))
+        run_results = jr_run.RunJobs(jobs,n_workers=n_workers,
+                                     timeout=timeout,verbose=verbose)
+
+        # extract settled values of successful runs
+        for URef, job, result in zip(todo,jobs,run_results):
+            OutPath = os.path.join(WorkDir,job['Name']+'.out')
+            if result['ExitCode'] or result['TimedOut'] or \
+                    not os.path.exists(OutPath):
+                warn('Steady-state run {:s} failed.'.format(job['Name']))
+                continue
+            values, stds = GetSettledValues(OutPath,Fields=Fields,TAvg=TAvg)
+            values[0] = URef
+            results[URef] = values
+
+        # refine where values change sharply
+        if not results:
+            raise RuntimeError('All steady-state runs failed.')
+        URefs_done = np.array(sorted(results.keys()))
+        SS   = np.array([results[U] for U in URefs_done])
+        todo = [U for U in GetRefineSpeeds(URefs_done,SS,tol=tol,
+                                           dU_min=dU_min) \
+                    if U not in results]
+        if not todo:
+            break
+
+    # drop fields missing in output so they are not interpolated as NaN
+    i_keep  = ~np.any(np.isnan(SS),axis=0)
+    missing = [Fields[i] for i in range(len(Fields)) if not i_keep[i]]
+    if missing:
+        warn('Fields not in FAST output: {:s}'.format(', '.join(missing)))
+    SS     = SS[:,i_keep]
+    Fields = [Fields[i] for i in range(len(Fields)) if i_keep[i]]
+
+    LUTPath = WriteSSLUT(TurbName,ModlDir,SS,Fields=Fields)
+    if verbose:
+        sys.stdout.write('Look-up table with {:d} '.format(len(SS)) + \
+                         'wind speeds saved to {:s}\n'.format(LUTPath))
+
+    return LUTPath, SS
@@ -0,0 +1,353 @@
+"""
+A series of Python functions for staging wind and model files from a
+network share to node-local scratch.
+
+AUTHOR:  Jenni Rinker, Duke University
+CONTACT: jennifer.rinker@duke.edu
+
+
+NOTES:
+    A staged file is a copy of a source file in
+        <StageDir>/<hash of source directory>/<file name>,
+    so files from one source directory keep their names next to each other
+    (FAST finds the .sum file of a .wnd file by its root name). The copy is
+    made on first use and reused while the size and modification time of
+    the source are unchanged. The stage directory holds an SQLite index
+    (stage.db) of the staged files and their last use.
+
+    Concurrent requests for the same file (several workers or threads on a
+    node) are deduplicated with a lock file per entry: the first request
+    copies, the others wait and reuse the copy. Copies are written to a
+    temporary file and moved into place, so a staged path is never seen
+    half-written. fcntl is not available on Windows; there, concurrent
+    requests may copy the same file twice (safely).
+
+    Files can be pinned by a case (the path of its .fst file): pinned
+    files are never evicted, so cases that are written but not yet run
+    keep their inputs. With a size limit, the least recently used files
+    that are not pinned are removed until the stage fits (if the pinned
+    files alone are larger, the stage stays larger than the limit).
+
+    jr_fast.WriteFastADOne(...,StageDir=...) stages the wind file and every
+    file the .fst/_AD.ipt files reference (blade, tower and airfoil files),
+    pins them by the case and writes the staged paths into them, e.g. on
+    a worker node:
+
+        jr_fast.WriteFastADOne(TurbName,WindPath,FastName,ModlDir,FastDir,
+                               StageDir='/scratch/stage',StageMB=20000)
+        jr_run.RunFastAll(FastDir,ExePath,StageDir='/scratch/stage')
+
+    The runner (jr_run.RunJob with 'StageDir' in the job) unpins the files
+    of a case once it ran successfully. The job gets the StageDir from
+    jr_run.RunFastAll(...,StageDir=...), jr_run.RunPipeline(...,StageDir=...)
+    and jr_watch.WatchWindDir(...,StageDir=...). Failed cases stay pinned,
+    so they can be run again; UnpinCase releases them.
+
+    FAST v7 reads pitch.ipt from its working directory, not from a path in
+    the .fst file, so it is not staged.
+
+"""
+
+# module dependencies
+import jr_timing
+import os, re, time, shutil, hashlib, sqlite3, threading
+
+# file locks are only available on Unix
+try:
+    import fcntl
+except ImportError:
+    fcntl = None
+
+
+# files staged together with a file: extension -> companion extensions
+Companions = {'.wnd':('.sum',)}
+
+
+def OpenStage(StageDir):
+    """ Open (and create if needed) index of stage directory
+
+        Args:
+            StageDir (string): stage directory
+
+        Returns:
+            conn (sqlite3.Connection): connection to index
+    """
+
+    os.makedirs(StageDir,exist_ok=True)
+    conn = sqlite3.connect(os.path.join(StageDir,'stage.db'),timeout=60.)
+    conn.execute('PRAGMA journal_mode=WAL')
+    conn.execute('PRAGMA synchronous=NORMAL')
+    conn.execute('CREATE TABLE IF NOT EXISTS files (' + \
+                 'Path TEXT PRIMARY KEY, Staged TEXT, Size INTEGER, ' + \
+                 'MTime INTEGER, Created REAL, Used REAL, Hits INTEGER)')
+    conn.execute('CREATE TABLE IF NOT EXISTS pins (' + \
+                 'Case_ TEXT, Staged TEXT, PRIMARY KEY (Case_, Staged))')
+
+    return conn
+
+def GetStagedPath(StageDir,SrcPath):
+    """ Path of staged copy of source file
+
+        Args:
+            StageDir (string): stage directory
+            SrcPath (string): path to source file
+
+        Returns:
+            StagedPath (string): path to staged copy
+    """
+
+    SrcPath = os.path.abspath(SrcPath)
+    DirKey  = hashlib.sha1(os.path.dirname(SrcPath).encode()).hexdigest()
+
+    return os.path.join(os.path.abspath(StageDir),DirKey[:16],
+                        os.path.basename(SrcPath))
+
+class _EntryLock(object):
+    """ Exclusive lock of a staged file (no-op without fcntl)
+    """
+
+    def __init__(self,StagedPath,
+                 block=True):
+        self.path, self.block, self.f = StagedPath + '.lock', block, None
+
+    def __enter__(self):
+        if fcntl is None:
+            return True
+        self.f = open(self.path,'a')
+        try:
+            fcntl.flock(self.f,fcntl.LOCK_EX | \
+                        (0 if self.block else fcntl.LOCK_NB))
+        except BlockingIOError:
+            self.f.close()
+            self.f = None
+            return False
+        return True
+
+    def __exit__(self,*args):
+        if self.f is not None:
+            fcntl.flock(self.f,fcntl.LOCK_UN)
+            self.f.close()
+
+def _StageOne(conn,StageDir,SrcPath,
+              Case=None):
+    """ Staged copy of one file, copying it if missing or out of date
+        (and pinned by case)
+    """
+
+    SrcPath    = os.path.abspath(SrcPath)
+    StagedPath = GetStagedPath(StageDir,SrcPath)
+    st         = os.stat(SrcPath)
+    ident      = (st.st_size,st.st_mtime_ns)
+    os.makedirs(os.path.dirname(StagedPath),exist_ok=True)
+
+    with _EntryLock(StagedPath):
+        row = conn.execute('SELECT Size, MTime FROM files WHERE Path=?',
+                           (SrcPath,)).fetchone()
+        hit = (row is not None) and (tuple(row) == ident) and \
+                os.path.isfile(StagedPath)
+        if not hit:
+            tmpPath = StagedPath + '.{:d}.{:d}.tmp'.format(os.getpid(),
+                                                threading.get_ident())
+            with jr_timing.Stage('stage.copy'):
+                shutil.copyfile(SrcPath,tmpPath)
+                os.replace(tmpPath,StagedPath)
+            jr_timing.Count('bytes.staged',st.st_size)
+        now = time.time()
+        with conn:
+            if hit:
+                conn.execute('UPDATE files SET Used=?, Hits=Hits+1 ' + \
+                             'WHERE Path=?',(now,SrcPath))
+            else:
+                conn.execute('INSERT OR REPLACE INTO files VALUES ' + \
+                             '(?,?,?,?,?,?,0)',(SrcPath,StagedPath) + \
+                             ident + (now,now))
+            if Case is not None:
+                conn.execute('INSERT OR IGNORE INTO pins VALUES (?,?)',
+                             (Case,StagedPath))
+    jr_timing.Count('stage.hit' if hit else 'stage.miss')
+
+    return StagedPath
+
+def StageFiles(SrcPaths,StageDir,
+               MaxMB=None,Case=None):
+    """ Staged copies of source files (and their companion files)
+
+        Args:
+            SrcPaths (list): paths to source files
+            StageDir (string): stage directory
+            MaxMB (float): size limit of stage in MB [opt, no limit]
+            Case (string): case to pin the staged files by until it is
+                           unpinned (see UnpinCase), replacing earlier
+                           pins of the case [opt]
+
+        Returns:
+            StagedPaths (dictionary): staged path of each source path
+    """
+
+    StagedPaths, keep = {}, set()
+    conn = OpenStage(StageDir)
+    try:
+        if Case is not None:
+            with conn:
+                conn.execute('DELETE FROM pins WHERE Case_=?',(Case,))
+        for SrcPath in SrcPaths:
+            if SrcPath in StagedPaths:
+                continue
+            StagedPaths[SrcPath] = _StageOne(conn,StageDir,SrcPath,Case)
+            keep.add(StagedPaths[SrcPath])
+            root, ext = os.path.splitext(SrcPath)
+            for CompEnd in Companions.get(ext.lower(),()):
+                if os.path.isfile(root + CompEnd):
+                    keep.add(_StageOne(conn,StageDir,root + CompEnd,Case))
+    finally:
+        conn.close()
+
+    if MaxMB is not None:
+        EvictStage(StageDir,MaxMB,keep=keep)
+
+    return StagedPaths
+
+def StageFile(SrcPath,StageDir,
+              MaxMB=None):
+    """ Staged copy of one source file (see StageFiles)
+
+        Args:
+            SrcPath (string): path to source file
+            StageDir (string): stage directory
+            MaxMB (float): size limit of stage in MB [opt, no limit]
+
+        Returns:
+            StagedPath (string): path to staged copy
+    """
+
+    return StageFiles([SrcPath],StageDir,MaxMB=MaxMB)[SrcPath]
+
+def GetReferencedFiles(lines,
+                       skip=()):
+    """ Existing files referenced by quoted paths in input file lines
+
+        Args:
+            lines (list): lines of input file
+            skip (list): paths not to return (e.g., files written with the
+                         input file) [opt]
+
+        Returns:
+            SrcPaths (list): referenced paths, in order of first appearance
+    """
+
+    skip     = set([os.path.abspath(path) for path in skip])
+    SrcPaths = []
+    for line in lines:
+        for path in re.findall(r'"([^"\n]+)"',line):
+            if (path not in SrcPaths) and os.path.isfile(path) and \
+                    (os.path.abspath(path) not in skip):
+                SrcPaths.append(path)
+
+    return SrcPaths
+
+def ReplacePaths(lines,StagedPaths):
+    """ Input file lines with quoted source paths replaced by staged paths
+
+        Args:
+            lines (list): lines of input file
+            StagedPaths (dictionary): staged path of each source path
+
+        Returns:
+            lines (list): lines with staged paths
+    """
+
+    def Replace(match):
+        return '\"' + StagedPaths.get(match.group(1),match.group(1)) + '\"'
+
+    return [re.sub(r'"([^"\n]+)"',Replace,line) if '\"' in line else line \
+                for line in lines]
+
+def UnpinCase(StageDir,Case):
+    """ Release the staged files pinned by a case (they can be evicted)
+
+        Args:
+            StageDir (string): stage directory
+            Case (string): case the files are pinned by
+
+        Returns:
+            n_pins (int): number of released files
+    """
+
+    conn = OpenStage(StageDir)
+    try:
+        with conn:
+            n_pins = conn.execute('DELETE FROM pins WHERE Case_=?',
+                                  (Case,)).rowcount
+    finally:
+        conn.close()
+
+    return n_pins
+
+def EvictStage(StageDir,MaxMB,
+               keep=()):
+    """ Remove least recently used files until stage fits size limit
+
+        Pinned files and files that are being staged by another process
+        are skipped.
+
+        Args:
+            StageDir (string): stage directory
+            MaxMB (float): size limit of stage in MB
+            keep (list): staged paths not to remove [opt]
+
+        Returns:
+            n_evicted (int): number of removed files
+    """
+
+    keep = set(keep)
+    conn = OpenStage(StageDir)
+    try:
+        rows  = conn.execute('SELECT Path, Staged, Size FROM files ' + \
+                             'ORDER BY Used DESC').fetchall()
+        total = sum([row[2] for row in rows])
+        n_evicted = 0
+        for SrcPath, StagedPath, n_bytes in rows[::-1]:
+            if total <= MaxMB * 2**20:
+                break
+            if StagedPath in keep:
+                continue
+            with _EntryLock(StagedPath,block=False) as locked:
+                if (not locked) or conn.execute('SELECT 1 FROM pins ' + \
+                        'WHERE Staged=? LIMIT 1',(StagedPath,)).fetchone():
+                    continue
+                with conn:
+                    conn.execute('DELETE FROM files WHERE Path=?',(SrcPath,))
+                try:
+                    os.remove(StagedPath)
+                except FileNotFoundError:
+                    pass
+            total     -= n_bytes
+            n_evicted += 1
+    finally:
+        conn.close()
+    jr_timing.Count('stage.evicted',n_evicted)
+
+    return n_evicted
+
+def GetStageSummary(StageDir):
+    """ Number of files, size and hits of stage directory
+
+        Args:
+            StageDir (string): stage directory
+
+        Returns:
+            summary (dictionary): 'Files', 'Bytes', 'Hits', 'Pinned'
+                                  (files) and 'Cases' (with pinned files)
+    """
+
+    conn = OpenStage(StageDir)
+    try:
+        row = conn.execute('SELECT COUNT(*), COALESCE(SUM(Size),0), ' + \
+                           'COALESCE(SUM(Hits),0) FROM files').fetchone()
+        pins = conn.execute('SELECT COUNT(DISTINCT Staged), ' + \
+                            'COUNT(DISTINCT Case_) FROM pins').fetchone()
+    finally:
+        conn.close()
+
+    return {'Files':row[0],'Bytes':row[1],'Hits':row[2],
+            'Pinned':pins[0],'Cases':pins[1]}
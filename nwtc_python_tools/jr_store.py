@@ -0,0 +1,213 @@
+"""
+A series of Python functions for a content-addressed store of generated
+input files, so that identical files are written only once.
+
+AUTHOR:  Jenni Rinker, Duke University
+CONTACT: jennifer.rinker@duke.edu
+
+
+NOTES:
+    Each file is kept once in the store directory under its SHA-256 hash
+    (<StoreDir>/<hash[:2]>/<hash>). The requested output path is a hard
+    link to the stored file, or a symbolic link if hard links are not
+    possible (e.g., store on another file system), or a copy as a last
+    resort. Writers open their output with OpenOutput, which writes
+    directly when no store directory is given:
+
+        with jr_store.OpenOutput(fpath_out,StoreDir) as f_write:
+            f_write.write(...)
+
+    Stored files are never modified in place, so the links must not be
+    opened for writing by other tools. Rewriting an output path replaces
+    the link, not the stored file.
+
+"""
+
+# module dependencies
+import jr_timing
+import os, io, shutil, hashlib, threading
+
+
+# link modes in order of preference
+LinkModes = ('hard','sym','copy')
+
+
+class _StoreWriter(io.StringIO):
+    """ Text buffer that is saved to the store when closed
+    """
+
+    def __init__(self,fpath,StoreDir,link):
+        io.StringIO.__init__(self)
+        self.fpath, self.StoreDir, self.link = fpath, StoreDir, link
+        self.digest = None
+
+    def close(self):
+        if not self.closed:
+            content = self.getvalue()
+            io.StringIO.close(self)
+            self.digest = StoreText(content,self.fpath,self.StoreDir,
+                                    link=self.link)
+
+
+def OpenOutput(fpath,
+               StoreDir=None,link='hard'):
+    """ File object for writing text output, optionally through the store
+
+        Args:
+            fpath (string): path of output file
+            StoreDir (string): store directory, None to write directly [opt]
+            link (string): preferred link mode ('hard', 'sym' or 'copy') [opt]
+
+        Returns:
+            f_write (file object): file to write text to (use in "with")
+    """
+
+    if StoreDir is None:
+
+        # do not write through a link into the store
+        if os.path.islink(fpath) or \
+                (os.path.exists(fpath) and os.stat(fpath).st_nlink > 1):
+            os.remove(fpath)
+        return open(fpath,'w')
+    return _StoreWriter(fpath,StoreDir,link)
+
+def GetStorePath(digest,StoreDir):
+    """ Path of stored file with given hash
+
+        Args:
+            digest (string): hexadecimal SHA-256 hash of content
+            StoreDir (string): store directory
+
+        Returns:
+            StorePath (string): path of file in store
+    """
+
+    return os.path.join(StoreDir,digest[:2],digest)
+
+def StoreText(content,fpath,StoreDir,
+              link='hard'):
+    """ Save text to the store (if not there yet) and link output path to it
+
+        Args:
+            content (string): file content
+            fpath (string): path of output file
+            StoreDir (string): store directory
+            link (string): preferred link mode ('hard', 'sym' or 'copy') [opt]
+
+        Returns:
+            digest (string): hexadecimal SHA-256 hash of content
+    """
+
+    if link not in LinkModes:
+        errStr = 'Unknown link mode \"{:s}\".'.format(link)
+        raise ValueError(errStr)
+
+    data      = content.encode()
+    digest    = hashlib.sha256(data).hexdigest()
+    StorePath = GetStorePath(digest,StoreDir)
+
+    # write unique content once (atomically, other processes may share store)
+    if not os.path.exists(StorePath):
+        os.makedirs(os.path.dirname(StorePath),exist_ok=True)
+        tmpPath = StorePath + '.{:d}.{:d}.tmp'.format(os.getpid(),
+                                                      threading.get_ident())
+        with jr_timing.Stage('write.store'), open(tmpPath,'wb') as f_store:
+            f_store.write(data)
+        os.replace(tmpPath,StorePath)
+        jr_timing.Count('bytes.store',len(data))
+    else:
+        jr_timing.Count('dedup.store')
+
+    LinkFile(StorePath,fpath,link=link)
+
+    return digest
+
+def LinkFile(StorePath,fpath,
+             link='hard'):
+    """ Replace output path with link to stored file
+
+        Falls back from hard link to symbolic link to copy if a mode is not
+        possible on the file system.
+
+        Args:
+            StorePath (string): path of file in store
+            fpath (string): path of output file
+            link (string): preferred link mode ('hard', 'sym' or 'copy') [opt]
+
+        Returns:
+            mode (string): link mode used
+    """
+
+    # nothing to do if output already is the stored file
+    if os.path.exists(fpath) and os.path.samefile(StorePath,fpath):
+        return 'sym' if os.path.islink(fpath) else 'hard'
+
+    # link to temporary name (unique per thread), then replace output path
+    #   atomically
+    tmpPath = fpath + '.{:d}.{:d}.tmp'.format(os.getpid(),
+                                              threading.get_ident())
+    for mode in LinkModes[LinkModes.index(link):]:
+        try:
+            if mode == 'hard':
+                os.link(StorePath,tmpPath)
+            elif mode == 'sym':
+                os.symlink(os.path.abspath(StorePath),tmpPath)
+            else:
+                shutil.copyfile(StorePath,tmpPath)
+        except OSError:
+            continue
+        os.replace(tmpPath,fpath)
+
+        # rename does nothing if another thread linked the same file first
+        if os.path.lexists(tmpPath):
+            os.remove(tmpPath)
+        return mode
+
+    errStr = 'Could not link {:s} to {:s}.'.format(fpath,StorePath)
+    raise OSError(errStr)
+
+def GetContentHash(fpath):
+    """ Content hash of output file (no read for symbolic links to store)
+
+        Args:
+            fpath (string): path of output file
+
+        Returns:
+            digest (string): hexadecimal SHA-256 hash of content
+    """
+
+    # symbolic links into the store are named by the hash
+    if os.path.islink(fpath):
+        digest = os.path.basename(os.readlink(fpath))
+        if len(digest) == 64:
+            return digest
+
+    sha = hashlib.sha256()
+    with open(fpath,'rb') as f:
+        for block in iter(lambda: f.read(1 << 20),b''):
+            sha.update(block)
+
+    return sha.hexdigest()
+
+def GetStoreSummary(StoreDir):
+    """ Number of stored files, their size and the number of links to them
+
+        Args:
+            StoreDir (string): store directory
+
+        Returns:
+            summary (dictionary): 'Files', 'Bytes' and 'Links' (hard links
+                                  beyond the stored file itself)
+    """
+
+    summary = {'Files':0,'Bytes':0,'Links':0}
+    for root, dirs, fnames in os.walk(StoreDir):
+        for fname in fnames:
+            if fname.endswith('.tmp'):
+                continue
+            st = os.stat(os.path.join(root,fname))
+            summary['Files'] += 1
+            summary['Bytes'] += st.st_size
+            summary['Links'] += st.st_nlink - 1
+
+    return summary
@@ -0,0 +1,369 @@
+"""
+A series of Python functions for a quasi-steady rotor surrogate that ranks
+wind files by expected rotor speed, pitch activity and thrust before
+running FAST.
+
+AUTHOR:  Jenni Rinker, Duke University
+CONTACT: jennifer.rinker@duke.edu
+
+
+NOTES:
+    The rotor-effective wind U(t) of each file is the mean of u over the
+    rotor disk (TipRad, jr_fast.GetHubHeight), streamed in time blocks with
+    jr_wind.ReadWindBlocks. The steady-state look-up table
+    (steady_state/<TurbName>_SS.mat, see jr_ss) is applied to U(t)
+    quasi-statically, and the pitch controller of pitch.ipt (PCMode = 1)
+    adds the dynamics:
+        - pitch demand is the table pitch at U(t), and the blade pitch is
+          the demand through the actuator transfer function P2P,
+        - the rotor speed is the table speed plus the speed error the
+          controller needs to produce the demand, i.e. the demand through
+          the inverse of RPM2PI + RPM2P, divided by the gain |CNST(1)| and
+          the gain schedule (CNST(7) to CNST(10)),
+        - the generator power is the table power scaled by the rotor speed
+          (constant torque), and the thrust is the table thrust.
+    Tower feedback (TA2P) is not modelled. The transfer functions are
+    discretized with the bilinear transform at the wind-file time step and
+    filtered for all files with the same time step at once, starting from
+    steady state. Statistics skip the first TStart seconds, as the FAST
+    output does.
+
+        table = jr_surrogate.ScreenWindFiles(TurbDict,ModlDir,WindDir)
+
+"""
+
+# module dependencies
+import jr_fast, jr_wind, jr_events, jr_timing
+import os, csv
+from concurrent.futures import ProcessPoolExecutor
+import numpy as np
+import scipy.signal as scsig
+
+
+# look-up-table fields used by the surrogate
+SurrFields = ['WindVxi','RotSpeed','BldPitch','RotThrust','GenPwr']
+
+# response statistics of each wind file
+SurrStats = ['UMean','RotSpeedMean','RotSpeedMax','RotSpeedStd',
+             'BldPitchStd','PitchTravel','PitchRateMax','RotThrustMean',
+             'RotThrustMax','GenPwrMean']
+
+
+def GetRotorWind(WindPath,HubHt,RotRad,
+                 n_block=1024):
+    """ Rotor-effective (disk-averaged) longitudinal wind of wind file
+
+        Args:
+            WindPath (string): path to binary full-field wind file
+            HubHt (float): hub height [m]
+            RotRad (float): rotor radius [m]
+            n_block (int): time steps read at once [opt]
+
+        Returns:
+            U (numpy array): [n_t] rotor-effective wind speed [m/s]
+            dt (float): time step [s]
+    """
+
+    header = jr_wind.ReadWindHeader(WindPath)
+    if header['n_t'] is None:
+        errStr = 'Wind file {:s} is not a binary full-field file.'.format(
+                                                                WindPath)
+        raise ValueError(errStr)
+    y, z = jr_events.GetWindGrid(header)
+    Z, Y = np.meshgrid(z,y,indexing='ij')
+    rotor = ((Y**2 + (Z - HubHt)**2) <= RotRad**2 + 1e-9)
+    if not rotor.any():
+        errStr = 'No grid points of {:s} within rotor disk.'.format(WindPath)
+        raise ValueError(errStr)
+
+    U = np.empty(header['n_t'])
+    with jr_timing.Stage('surrogate.wind'):
+        for i_t0, turb in jr_wind.ReadWindBlocks(WindPath,n_block=n_block):
+            U[i_t0:i_t0 + turb.shape[3]] = turb[0][rotor].mean(axis=0)
+
+    return U, header['dt']
+
+def _GetRotorWind(args):
+    """ GetRotorWind with tuple of arguments (for process pool)
+    """
+
+    WindPath, HubHt, RotRad, n_block = args
+    try:
+        return GetRotorWind(WindPath,HubHt,RotRad,n_block=n_block)
+    except Exception as err:
+        return repr(err)
+
+def GetPitchTF(TurbDict,TF):
+    """ Continuous transfer function from pitch.ipt
+
+        Args:
+            TurbDict (dictionary): dictionary with FAST parameters
+            TF (string): transfer function ('RPM2PI', 'RPM2P', 'TA2P' or
+                         'P2P')
+
+        Returns:
+            num (numpy array): numerator coefficients, ascending powers of s
+            den (numpy array): denominator coefficients, ascending powers of
+                               s
+    """
+
+    n = TurbDict[TF + '_Order'] + 1
+
+    return np.array(TurbDict[TF + '_Num'][:n],dtype=float), \
+           np.array(TurbDict[TF + '_Den'][:n],dtype=float)
+
+def GetSpeedErrorTF(TurbDict):
+    """ Inverse of speed controller: pitch demand [deg] to speed error [rpm]
+
+        1 / (RPM2PI + RPM2P), before gain and gain schedule.
+
+        Returns:
+            num (numpy array): numerator coefficients, ascending powers of s
+            den (numpy array): denominator coefficients, ascending powers of
+                               s
+    """
+
+    P = np.polynomial.polynomial
+    num_i, den_i = GetPitchTF(TurbDict,'RPM2PI')
+    num_p, den_p = GetPitchTF(TurbDict,'RPM2P')
+    num = P.polymul(den_i,den_p)
+    den = P.polyadd(P.polymul(num_i,den_p),P.polymul(num_p,den_i))
+    num, den = np.trim_zeros(num,'b'), np.trim_zeros(den,'b')
+    if (not den.size) or (num.size > den.size):
+        errStr = 'Inverse of pitch controller RPM2PI + RPM2P is not proper.'
+        raise ValueError(errStr)
+
+    return num, den
+
+def DiscretizeTF(num,den,dt):
+    """ Discrete filter of continuous transfer function (bilinear transform)
+
+        Args:
+            num (numpy array): numerator coefficients, ascending powers of s
+            den (numpy array): denominator coefficients, ascending powers of
+                               s
+            dt (float): time step [s]
+
+        Returns:
+            b (numpy array): numerator coefficients of discrete filter
+            a (numpy array): denominator coefficients of discrete filter
+    """
+
+    return scsig.bilinear(np.trim_zeros(num,'b')[::-1],
+                          np.trim_zeros(den,'b')[::-1],fs=1. / dt)
+
+def BatchFilter(b,a,x):
+    """ Filter time series along last axis, starting from steady state
+
+        Args:
+            b (numpy array): numerator coefficients of discrete filter
+            a (numpy array): denominator coefficients of discrete filter
+            x (numpy array): [n_files x n_t] input time series
+
+        Returns:
+            y (numpy array): [n_files x n_t] output time series
+    """
+
+    if max(len(a),len(b)) == 1:
+        return x * b[0] / a[0]
+    zi = scsig.lfilter_zi(b,a)[None,:] * x[:,:1]
+
+    return scsig.lfilter(b,a,x,axis=-1,zi=zi)[0]
+
+def GetGainSchedule(TurbDict,pitch):
+    """ Gain schedule of pitch controller (power law in pitch angle)
+
+        Args:
+            TurbDict (dictionary): dictionary with FAST parameters
+            pitch (numpy array): pitch angles [deg]
+
+        Returns:
+            GS (numpy array): gain factors
+    """
+
+    p = np.clip(np.radians(pitch),TurbDict['CNST(7)'],TurbDict['CNST(8)'])
+
+    return TurbDict['CNST(9)'] * p**TurbDict['CNST(10)']
+
+def RunSurrogate(TurbDict,LUT_keys,LUT,U,dt):
+    """ Quasi-steady response to rotor-effective wind of many files at once
+
+        Args:
+            TurbDict (dictionary): dictionary with FAST parameters
+            LUT_keys (list): look-up-table fields (see jr_fast.LoadSSLUT)
+            LUT (numpy array): [n_U x n_fields] steady-state values
+            U (numpy array): [n_files x n_t] rotor-effective wind [m/s]
+            dt (float): time step [s]
+
+        Returns:
+            series (dictionary): [n_files x n_t] arrays 'U', 'RotSpeed'
+                                 [rpm], 'PitchDemand', 'BldPitch' [deg],
+                                 'RotThrust' [kN] and 'GenPwr' [kW]
+    """
+
+    missing = [key for key in SurrFields if key not in LUT_keys]
+    if missing:
+        errStr = 'Look-up table is missing fields {:s}.'.format(
+                                                        ', '.join(missing))
+        raise ValueError(errStr)
+    if TurbDict['PCMode'] != 1:
+        errStr = 'Surrogate only coded for pitch.ipt control (PCMode = 1).'
+        raise ValueError(errStr)
+
+    U = np.atleast_2d(U)
+    with jr_timing.Stage('surrogate.lut'):
+        ss = {key:np.interp(U,LUT[:,LUT_keys.index('WindVxi')],
+                            LUT[:,LUT_keys.index(key)]) \
+                for key in SurrFields[1:]}
+
+    with jr_timing.Stage('surrogate.filter'):
+        demand = np.clip(ss['BldPitch'],TurbDict['CNST(4)'],
+                         TurbDict['CNST(5)'])
+        pitch  = BatchFilter(*DiscretizeTF(*GetPitchTF(TurbDict,'P2P'),dt),
+                             demand)
+        dOmega = BatchFilter(*DiscretizeTF(*GetSpeedErrorTF(TurbDict),dt),
+                             demand)
+        dOmega /= abs(TurbDict['CNST(1)']) * GetGainSchedule(TurbDict,demand)
+
+    RotSpeed = ss['RotSpeed'] + dOmega
+    GenPwr   = ss['GenPwr'] * RotSpeed / np.maximum(ss['RotSpeed'],1e-6)
+
+    return {'U':U,'RotSpeed':RotSpeed,'PitchDemand':demand,
+            'BldPitch':pitch,'RotThrust':ss['RotThrust'],'GenPwr':GenPwr}
+
+def GetResponseStats(series,dt,n_t,
+                     TStart=30.):
+    """ Response statistics of each file (see SurrStats)
+
+        Args:
+            series (dictionary): output of RunSurrogate
+            dt (float): time step [s]
+            n_t (list): number of valid time steps of each file
+            TStart (float): time to skip at start [s] [opt]
+
+        Returns:
+            stats (list): dictionary of statistics for each file
+    """
+
+    stats = []
+    for i_f, n in enumerate(n_t):
+        sl = slice(min(int(round(TStart / dt)),max(n - 2,0)),n)
+        s  = {key:series[key][i_f,sl] for key in series}
+        stats.append({'UMean':float(s['U'].mean()),
+                      'RotSpeedMean':float(s['RotSpeed'].mean()),
+                      'RotSpeedMax':float(s['RotSpeed'].max()),
+                      'RotSpeedStd':float(s['RotSpeed'].std()),
+                      'BldPitchStd':float(s['BldPitch'].std()),
+                      'PitchTravel':float(np.abs(np.diff(s['BldPitch'])).sum()),
+                      'PitchRateMax':float(np.abs(np.diff(s['BldPitch'])).max() \
+                                            / dt) if s['BldPitch'].size > 1 \
+                                        else 0.,
+                      'RotThrustMean':float(s['RotThrust'].mean()),
+                      'RotThrustMax':float(s['RotThrust'].max()),
+                      'GenPwrMean':float(s['GenPwr'].mean())})
+
+    return stats
+
+def ScreenWindFiles(TurbDict,ModlDir,WindPaths,
+                    TStart=30.,n_block=1024,n_workers=1,verbose=0):
+    """ Quasi-steady response statistics of turbine for many wind files
+
+        Args:
+            TurbDict (dictionary): dictionary with FAST parameters
+            ModlDir (string): directory with steady_state/<TurbName>_SS.mat
+            WindPaths (list or string): paths to wind files, or directory
+                                        with wind files
+            TStart (float): time to skip at start [s] [opt]
+            n_block (int): time steps read at once [opt]
+            n_workers (int): number of worker processes reading files [opt]
+            verbose (int): flag to suppress print statements [opt]
+
+        Returns:
+            table (list): dictionaries with 'WindPath' and statistics (see
+                          SurrStats) of each file, or 'WindPath' and
+                          'Error' if the file could not be read
+    """
+
+    if isinstance(WindPaths,str):
+        WindPaths = [os.path.join(WindPaths,f) for f in \
+                        sorted(os.listdir(WindPaths)) \
+                        if f.endswith(jr_events.WindEnds)]
+
+    LUTPath = os.path.join(ModlDir,'steady_state',
+                           TurbDict['TurbName'] + '_SS.mat')
+    LUT_keys, LUT = jr_fast.LoadSSLUT(LUTPath)
+    if verbose:
+        print('\nScreening {:d} wind files for {:s}...'.format(
+                                        len(WindPaths),TurbDict['TurbName']))
+
+    # rotor-effective wind of each file
+    HubHt = jr_fast.GetHubHeight(TurbDict)
+    args  = [(WindPath,HubHt,TurbDict['TipRad'],n_block) \
+                for WindPath in WindPaths]
+    if n_workers > 1:
+        with ProcessPoolExecutor(max_workers=n_workers) as pool:
+            winds = list(pool.map(_GetRotorWind,args,chunksize=4))
+    else:
+        winds = [_GetRotorWind(arg) for arg in args]
+
+    # run files with the same time step together (padded with last value)
+    table  = [{'WindPath':WindPath} for WindPath in WindPaths]
+    groups = {}
+    for i_f, wind in enumerate(winds):
+        if isinstance(wind,str):
+            table[i_f]['Error'] = wind
+        else:
+            groups.setdefault(round(wind[1],9),[]).append(i_f)
+    for dt, i_files in groups.items():
+        n_t = [winds[i_f][0].size for i_f in i_files]
+        U   = np.empty((len(i_files),max(n_t)))
+        for i_row, i_f in enumerate(i_files):
+            U[i_row,:n_t[i_row]] = winds[i_f][0]
+            U[i_row,n_t[i_row]:] = winds[i_f][0][-1]
+        series = RunSurrogate(TurbDict,LUT_keys,LUT,U,dt)
+        for i_f, stats in zip(i_files,GetResponseStats(series,dt,n_t,
+                                                       TStart=TStart)):
+            table[i_f].update(stats)
+
+    if verbose:
+        print('done. {:d} files failed.'.format(len([row for row in table \
+                                                     if 'Error' in row])))
+
+    return table
+
+def RankWindFiles(table,stat,
+                  n_files=None):
+    """ Wind files sorted by response statistic, largest first
+
+        Args:
+            table (list): output of ScreenWindFiles
+            stat (string): statistic to rank by (see SurrStats)
+            n_files (int): number of files to return [opt, all]
+
+        Returns:
+            ranked (list): rows of table, largest statistic first
+    """
+
+    if stat not in SurrStats:
+        errStr = 'Unknown surrogate statistic \"{:s}\".'.format(stat)
+        raise ValueError(errStr)
+    ranked = sorted([row for row in table if 'Error' not in row],
+                    key=lambda row: -row[stat])
+
+    return ranked[:n_files]
+
+def WriteScreenTable(table,fpath):
+    """ Save surrogate statistics as comma-separated file
+
+        Args:
+            table (list): output of ScreenWindFiles
+            fpath (string): path to write file to
+    """
+
+    fields = ['WindPath'] + SurrStats + ['Error']
+    with open(fpath,'w',newline='') as f:
+        writer = csv.DictWriter(f,fields,extrasaction='ignore')
+        writer.writeheader()
+        writer.writerows(table)
+
+    return
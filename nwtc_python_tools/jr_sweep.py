@@ -0,0 +1,239 @@
+"""
+A series of Python functions for parametric sweeps over turbine variants
+that share a base turbine dictionary.
+
+AUTHOR:  Jenni Rinker, Duke University
+CONTACT: jennifer.rinker@duke.edu
+
+
+NOTES:
+    A TurbOverlay is a copy-on-write view of a base turbine dictionary:
+    reads fall through to the base, writes and schedule transforms go to
+    the (small) dictionary of overrides, so a variant costs memory only for
+    the fields it changes. Overlays can be passed to the jr_fast writers in
+    place of a turbine dictionary, e.g.:
+
+        base  = jr_fast.CreateFAST7Dict(FastPath)
+        turb  = jr_sweep.TurbOverlay(base,TurbName='WP_Tip105',TipRad=36.75)
+        turb.TransformSched('BldSched','FlpStff',scale=1.1)
+        jr_sweep.WriteVariantFiles(turb,TmplDir,ModlDir,AeroDir)
+
+    The base dictionary must not be changed while overlays on it are used.
+
+"""
+
+# module dependencies
+import jr_fast
+import os, json, collections
+import numpy as np
+
+
+# column names of the schedules (as written by the templates)
+SchedCols = {'BldSched':('BlFract','AeroCent','StrcTwst','BMassDen',
+                         'FlpStff','EdgStff','GJStff','EAStff'),
+             'TwrSched':('HtFract','TMassDen','TwFAStif','TwSSStif',
+                         'TwGJStif','TwEAStif')}
+
+
+class TurbOverlay(collections.ChainMap):
+    """ Turbine dictionary with variant overrides layered on a shared base
+
+        Reads look up the overrides first, then the base. Item assignment
+        and deletion only affect the overrides.
+    """
+
+    def __init__(self,base,
+                 overrides=None,**kwargs):
+        """
+            Args:
+                base (dictionary): base turbine dictionary (not copied)
+                overrides (dictionary): overridden fields [opt]
+                kwargs (dictionary): further overridden fields [opt]
+        """
+
+        # stacking on an overlay shares its base instead of nesting
+        if isinstance(base,TurbOverlay):
+            layer = dict(base.overrides)
+            base  = base.base
+        else:
+            layer = {}
+        layer.update(overrides or {})
+        layer.update(kwargs)
+        collections.ChainMap.__init__(self,layer,base)
+
+    @property
+    def overrides(self):
+        """ Dictionary of overridden fields """
+        return self.maps[0]
+
+    @property
+    def base(self):
+        """ Shared base turbine dictionary """
+        return self.maps[-1]
+
+    def Variant(self,
+                overrides=None,**kwargs):
+        """ New overlay on the same base with additional overrides
+
+            Args:
+                overrides (dictionary): overridden fields [opt]
+                kwargs (dictionary): further overridden fields [opt]
+
+            Returns:
+                variant (TurbOverlay): new overlay
+        """
+
+        return TurbOverlay(self,overrides,**kwargs)
+
+    def GetSchedKeys(self,key):
+        """ Dictionary keys of schedule (all blades for 'BldSched')
+
+            Args:
+                key (string): 'BldSched', 'BldSched_<n>' or 'TwrSched'
+
+            Returns:
+                keys (list): keys of schedules in dictionary
+        """
+
+        if key == 'BldSched':
+            return ['BldSched_{:d}'.format(i_bl) \
+                        for i_bl in range(1,int(self['NumBl'])+1)]
+        return [key]
+
+    def TransformSched(self,key,col,
+                       scale=1.,offset=0.):
+        """ Scale and offset a column of a schedule (in the overrides)
+
+            Args:
+                key (string): 'BldSched' (all blades), 'BldSched_<n>' or
+                              'TwrSched'
+                col (int or string): column index or name (see SchedCols)
+                scale (float or array): factor on column (array: one value
+                                        per schedule row) [opt]
+                offset (float or array): value added after scaling [opt]
+
+            Returns:
+                self (TurbOverlay): this overlay (for chained calls)
+        """
+
+        if not isinstance(col,int):
+            cols = SchedCols[key.split('_')[0]]
+            if col not in cols:
+                errStr = 'Unknown column \"{:s}\" of {:s}.'.format(col,key)
+                raise ValueError(errStr)
+            col = cols.index(col)
+
+        for SchedKey in self.GetSchedKeys(key):
+            sched = np.array(self[SchedKey],dtype=float)
+            sched[:,col] = scale * sched[:,col] + offset
+            self[SchedKey] = sched.tolist()
+
+        return self
+
+    def ToDict(self):
+        """ Flat turbine dictionary (e.g., to save as JSON)
+
+            Returns:
+                TurbDict (dictionary): base values updated by overrides
+        """
+
+        return dict(self)
+
+
+def GetVariants(base,sweeps):
+    """ Overlays for a list of variant specifications
+
+        Each specification is a dictionary of overridden fields, where the
+        optional key 'Sched' holds a list of (key, col, scale, offset)
+        schedule transforms.
+
+        Args:
+            base (dictionary): base turbine dictionary
+            sweeps (list): variant specifications (must set 'TurbName')
+
+        Returns:
+            variants (list): TurbOverlay for each specification
+    """
+
+    variants = []
+    for spec in sweeps:
+        spec   = dict(spec)
+        scheds = spec.pop('Sched',[])
+        if 'TurbName' not in spec:
+            errStr = 'Variant specification without \"TurbName\".'
+            raise ValueError(errStr)
+        variant = TurbOverlay(base,spec)
+        for key, col, scale, offset in scheds:
+            variant.TransformSched(key,col,scale=scale,offset=offset)
+        variants.append(variant)
+
+    return variants
+
+def WriteVariantFiles(TurbDict,TmplDir,ModlDir,AeroDir,
+                      StoreDir=None,Channels=None,OutRate=None,verbose=0):
+    """ FAST/AeroDyn templates and wind-independent files of one variant
+
+        With a content-addressed store (see jr_store), files that are the
+        same for several variants (e.g., tower and pitch files of a blade
+        sweep) are stored only once.
+
+        Args:
+            TurbDict (dictionary): turbine dictionary or TurbOverlay
+            TmplDir (string): directory with template files
+            ModlDir (string): directory of variant (model files, and
+                              FAST/AeroDyn templates in "templates")
+            AeroDir (string): directory with aerodynamic files
+            StoreDir (string): content-addressed store [opt]
+            Channels (list): output channels needed (see
+                             jr_fast.GetPrunedOutputs) [opt]
+            OutRate (float): output rate needed [Hz] [opt]
+            verbose (int): flag to suppress print statements [opt]
+    """
+
+    FastADTmplDir = os.path.join(ModlDir,'templates')
+    if not os.path.isdir(FastADTmplDir):
+        os.makedirs(FastADTmplDir)
+
+    jr_fast.WriteFAST7Template(TurbDict,TmplDir,ModlDir,FastADTmplDir,
+                               Channels=Channels,OutRate=OutRate,
+                               verbose=verbose)
+    jr_fast.WriteAeroDynTemplate(TurbDict,TmplDir,ModlDir,AeroDir,
+                                 FastADTmplDir,verbose=verbose)
+    jr_fast.WriteBladeFiles(TurbDict,TmplDir,ModlDir,StoreDir=StoreDir,
+                            verbose=verbose)
+    jr_fast.WriteTowerFile(TurbDict,TmplDir,ModlDir,StoreDir=StoreDir,
+                           verbose=verbose)
+    if (TurbDict['PCMode'] == 1):
+        jr_fast.WritePitchCntrl(TurbDict,TmplDir,ModlDir,StoreDir=StoreDir,
+                                verbose=verbose)
+
+    return
+
+def SaveVariant(TurbDict,fpath):
+    """ Save overrides of a variant as JSON
+
+        Args:
+            TurbDict (TurbOverlay): variant
+            fpath (string): path to JSON file
+    """
+
+    with open(fpath,'w') as f:
+        json.dump(TurbDict.overrides,f)
+
+    return
+
+def LoadVariant(base,fpath):
+    """ Variant from base dictionary and overrides saved with SaveVariant
+
+        Args:
+            base (dictionary): base turbine dictionary
+            fpath (string): path to JSON file
+
+        Returns:
+            variant (TurbOverlay): variant
+    """
+
+    with open(fpath,'r') as f:
+        overrides = json.load(f)
+
+    return TurbOverlay(base,overrides)
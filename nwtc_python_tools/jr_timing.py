@@ -0,0 +1,237 @@
+"""
+A series of Python functions for timing the stages (parse, read, render,
+write) of the input-generation functions and counting what they process.
+
+AUTHOR:  Jenni Rinker, Duke University
+CONTACT: jennifer.rinker@duke.edu
+
+
+NOTES:
+    Instrumented code wraps each stage in "with jr_timing.Stage(name):",
+    whole functions with the "@jr_timing.Timed" decorator, and counts items
+    with "jr_timing.Count(name,n)". All do nothing (one global check)
+    unless timing is enabled with the Timing context manager, e.g.:
+
+        with jr_timing.Timing(JsonPath='timing.jsonl') as sink:
+            jr_fast.WriteFastADAll(...)
+        print(jr_timing.FormatSummary(sink.summary))
+
+    Nested stages are recorded with their full path (e.g.,
+    'WriteFastADOne/read.lut'). Records go to a sink: SummarySink keeps
+    per-stage totals in memory, JsonLinesSink also appends one JSON line
+    per record to a file. Timing can additionally run cProfile over the
+    block for a function-level breakdown.
+
+"""
+
+# module dependencies
+import sys, time, json, functools, threading
+from contextlib import contextmanager
+
+
+# active sink (None = timing disabled) and per-thread stack of stages
+_Sink  = None
+_Local = threading.local()
+
+
+class _NullStage(object):
+    """ Stage that does nothing (timing disabled)
+    """
+    def __enter__(self):
+        return self
+    def __exit__(self,*exc):
+        return False
+
+_NoStage = _NullStage()
+
+
+class _Stage(object):
+    """ Stage that records its wall-clock time to the active sink
+    """
+    def __init__(self,name):
+        self.name = name
+
+    def __enter__(self):
+        stack = getattr(_Local,'stack',None)
+        if stack is None:
+            stack = _Local.stack = []
+        stack.append(self.name)
+        self.path    = '/'.join(stack)
+        self.t_start = time.perf_counter()
+        return self
+
+    def __exit__(self,*exc):
+        elapsed = time.perf_counter() - self.t_start
+        _Local.stack.pop()
+        sink = _Sink
+        if sink is not None:
+            sink.record('time',self.path,elapsed)
+        return False
+
+
+class SummarySink(object):
+    """ In-memory totals of stage times and counters
+
+        summary[path] is a dictionary with 'Count', 'Total', 'Max' (times
+        in seconds) for stages, and 'Count', 'Total' for counters.
+    """
+
+    def __init__(self):
+        self.lock    = threading.Lock()
+        self.summary = {}
+
+    def record(self,kind,name,value):
+        with self.lock:
+            if name not in self.summary:
+                self.summary[name] = {'Kind':kind,'Count':0,'Total':0.,
+                                      'Max':0.}
+            entry = self.summary[name]
+            entry['Count'] += 1
+            entry['Total'] += value
+            entry['Max']    = max(entry['Max'],value)
+
+    def close(self):
+        pass
+
+
+class JsonLinesSink(SummarySink):
+    """ Summary sink that also appends each record as a JSON line
+    """
+
+    def __init__(self,JsonPath):
+        SummarySink.__init__(self)
+        self.f = open(JsonPath,'a')
+
+    def record(self,kind,name,value):
+        SummarySink.record(self,kind,name,value)
+        line = json.dumps({'t':time.time(),'kind':kind,'name':name,
+                           'value':value,
+                           'thread':threading.current_thread().name})
+        with self.lock:
+            self.f.write(line + '\n')
+
+    def close(self):
+        with self.lock:
+            self.f.close()
+
+
+def Stage(name):
+    """ Context manager timing a stage of the calling code
+
+        Args:
+            name (string): stage name (e.g., 'read.wind', 'render.fst')
+
+        Returns:
+            stage (context manager): records the stage time if timing is
+                                     enabled, otherwise does nothing
+    """
+
+    if _Sink is None:
+        return _NoStage
+    return _Stage(name)
+
+def Timed(fcn):
+    """ Decorator timing each call of a function as a stage
+
+        Args:
+            fcn (function): function to time (stage name is its name)
+
+        Returns:
+            wrapper (function): function that records its time if timing is
+                                enabled
+    """
+
+    @functools.wraps(fcn)
+    def wrapper(*args,**kwargs):
+        if _Sink is None:
+            return fcn(*args,**kwargs)
+        with _Stage(fcn.__name__):
+            return fcn(*args,**kwargs)
+
+    return wrapper
+
+def Count(name,
+          n=1):
+    """ Add to counter (does nothing if timing is disabled)
+
+        Args:
+            name (string): counter name (e.g., 'bytes.wind')
+            n (int or float): amount to add [opt]
+    """
+
+    sink = _Sink
+    if sink is not None:
+        stack = getattr(_Local,'stack',None)
+        if stack:
+            name = '/'.join(stack + [name])
+        sink.record('count',name,n)
+
+    return
+
+@contextmanager
+def Timing(sink=None,
+           JsonPath=None,ProfPath=None,n_stats=0):
+    """ Enable stage timing (and optionally cProfile) within a block
+
+        Args:
+            sink (object): sink with record(kind,name,value) and close()
+                           [opt, new SummarySink or JsonLinesSink]
+            JsonPath (string): path to append JSON lines to [opt]
+            ProfPath (string): path to save cProfile statistics to [opt]
+            n_stats (int): number of cProfile functions (by cumulative
+                           time) to print [opt]
+
+        Returns:
+            sink (object): sink holding the records of the block
+    """
+
+    global _Sink
+
+    if sink is None:
+        sink = JsonLinesSink(JsonPath) if JsonPath else SummarySink()
+    old_sink, _Sink = _Sink, sink
+
+    prof = None
+    if ProfPath or n_stats:
+        import cProfile
+        prof = cProfile.Profile()
+        prof.enable()
+
+    try:
+        yield sink
+    finally:
+        if prof is not None:
+            prof.disable()
+            if ProfPath:
+                prof.dump_stats(ProfPath)
+            if n_stats:
+                import pstats
+                pstats.Stats(prof,stream=sys.stdout).sort_stats(
+                                        'cumulative').print_stats(n_stats)
+        _Sink = old_sink
+        sink.close()
+
+def FormatSummary(summary):
+    """ Table of per-stage times and counters
+
+        Args:
+            summary (dictionary): summary of a SummarySink
+
+        Returns:
+            table (string): one line per stage/counter, sorted by path
+    """
+
+    lines = ['{:60s} {:>8s} {:>10s} {:>10s} {:>10s}'.format('Stage',
+                                    'Calls','Total [s]','Mean [ms]','Max [ms]')]
+    for name in sorted(summary):
+        entry = summary[name]
+        if entry['Kind'] == 'time':
+            lines.append('{:60s} {:8d} {:10.3f} {:10.3f} {:10.3f}'.format(
+                         name,entry['Count'],entry['Total'],
+                         1e3 * entry['Total'] / entry['Count'],
+                         1e3 * entry['Max']))
+        else:
+            lines.append('{:60s} {:8d} {:>10s}'.format(name,entry['Count'],
+                         '{:g}'.format(entry['Total'])))
+
+    return '\n'.join(lines)
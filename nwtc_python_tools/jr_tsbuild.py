@@ -0,0 +1,235 @@
+"""
+A series of Python functions for comparing TurbSim builds (build profiles
+of compiling-turbsim-v2.0/Makefile) on a fixed set of cases.
+
+AUTHOR:  Jenni Rinker, Duke University
+CONTACT: jennifer.rinker@duke.edu
+
+
+NOTES:
+    Each build runs the same Template_TurbSim.inp cases (TSBuildCases,
+    written with jr_wind) one at a time in its own directory
+    (<WorkDir>/<index>_<build name>, so builds with the same executable name
+    from different source trees do not share files). The wall time
+    of every case is recorded, and the .bts files are compared with those
+    of the reference (first) build using jr_wind.turbsim. A build is
+    equivalent if no wind speed differs by more than atol. Example:
+
+        python jr_tsbuild.py <WorkDir> ../bin/TurbSim_glin64
+                             ../bin/TurbSim_native_glin64
+                             ../bin/TurbSim_openmp_glin64
+
+    OpenMP builds use OMP_NUM_THREADS from the environment.
+
+"""
+
+# module dependencies
+import jr_wind, jr_run
+import os, sys, json
+import numpy as np
+
+
+# fixed set of cases: (URef, TurbClass, i_seed)
+TSBuildCases = [(8.,'B',0),(12.,'A',1),(18.,'B',2)]
+
+# directory with Template_TurbSim.inp
+TSBuildTmplDir = os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                              'templates')
+
+
+def GetBuildName(ExePath):
+    """ Name of build from executable (e.g., 'TurbSim_native_glin64')
+    """
+
+    return os.path.splitext(os.path.basename(ExePath))[0]
+
+def RunTurbSimBuild(ExePath,WorkDir,
+                    cases=TSBuildCases,TmplDir=TSBuildTmplDir,n_repeat=1,
+                    timeout=None,verbose=0,**kwargs):
+    """ Run the cases with one TurbSim build
+
+        Args:
+            ExePath (string): TurbSim executable
+            WorkDir (string): directory for input and wind files of build
+            cases (list): (URef, TurbClass, i_seed) of cases [opt]
+            TmplDir (string): directory with Template_TurbSim.inp [opt]
+            n_repeat (int): runs per case (fastest is kept) [opt]
+            timeout (float): per-run timeout in seconds [opt]
+            verbose (int): flag to suppress print statements [opt]
+            kwargs (dictionary): TurbSim parameters to overwrite [opt]
+
+        Returns:
+            result (dictionary): 'Build', 'ExePath', 'Times' (seconds per
+                                 case name), 'Total' and 'Failed' (names of
+                                 failed cases)
+    """
+
+    if not os.path.isdir(WorkDir):
+        os.makedirs(WorkDir)
+
+    TSDefaults = jr_wind.GetTurbSimDefaults()
+    TSDefaults.update(kwargs)
+    InpPaths = [jr_wind.WriteTurbSimFile(jr_wind.GetTurbSimCase(URef,
+                        TurbClass,i_seed,TSDefaults=TSDefaults),
+                        TmplDir,WorkDir) \
+                    for URef, TurbClass, i_seed in cases]
+
+    result = {'Build':GetBuildName(ExePath),'ExePath':ExePath,'Times':{},
+              'Total':0.,'Failed':[]}
+    for InpPath in InpPaths:
+        Name = os.path.splitext(os.path.basename(InpPath))[0]
+        job  = jr_run.MakeJob(Name,os.path.abspath(ExePath),InpPath)
+        times = []
+        for i_repeat in range(n_repeat):
+            run = jr_run.RunJob(job,timeout=timeout)
+            if run['ExitCode'] or run['TimedOut'] or \
+                    (not os.path.exists(os.path.join(WorkDir,Name+'.bts'))):
+                result['Failed'].append(Name)
+                break
+            times.append(run['Time'])
+        if times:
+            result['Times'][Name] = min(times)
+            result['Total'] += min(times)
+        if verbose:
+            sys.stdout.write('  {:s} {:s}: {:s}\n'.format(result['Build'],
+                             Name,'{:.2f} s'.format(min(times)) if times \
+                                    else 'failed'))
+
+    return result
+
+def CompareWindFiles(RefDir,WorkDir,Names):
+    """ Largest difference of wind speeds between .bts files of two builds
+
+        Args:
+            RefDir (string): directory with .bts files of reference build
+            WorkDir (string): directory with .bts files of other build
+            Names (list): case names
+
+        Returns:
+            MaxDiff (float): largest absolute difference [m/s] (inf if
+                             grids differ)
+    """
+
+    MaxDiff = 0.
+    for Name in Names:
+        turb_ref = jr_wind.turbsim(os.path.join(RefDir,Name + '.bts'))
+        turb     = jr_wind.turbsim(os.path.join(WorkDir,Name + '.bts'))
+        if turb.shape != turb_ref.shape:
+            return float('inf')
+        MaxDiff = max(MaxDiff,float(np.abs(turb - turb_ref).max()))
+
+    return MaxDiff
+
+def CompareTurbSimBuilds(ExePaths,WorkDir,
+                         cases=TSBuildCases,TmplDir=TSBuildTmplDir,
+                         n_repeat=1,atol=0.01,timeout=None,verbose=0,
+                         **kwargs):
+    """ Wall time and output equivalence of TurbSim builds
+
+        Args:
+            ExePaths (list): TurbSim executables (first is the reference)
+            WorkDir (string): directory for files of all builds
+            cases (list): (URef, TurbClass, i_seed) of cases [opt]
+            TmplDir (string): directory with Template_TurbSim.inp [opt]
+            n_repeat (int): runs per case (fastest is kept) [opt]
+            atol (float): allowed difference in wind speed [m/s] [opt]
+            timeout (float): per-run timeout in seconds [opt]
+            verbose (int): flag to suppress print statements [opt]
+            kwargs (dictionary): TurbSim parameters to overwrite [opt]
+
+        Returns:
+            results (list): result of each build (see RunTurbSimBuild) plus
+                            'MaxDiff', 'Equivalent' and 'Speedup' (over
+                            reference)
+    """
+
+    results = []
+    for i_build, ExePath in enumerate(ExePaths):
+        BuildDir = os.path.join(WorkDir,'{:d}_{:s}'.format(i_build,
+                                GetBuildName(ExePath)))
+        if verbose:
+            print('\nRunning {:d} cases with {:s}...'.format(len(cases),
+                                                           ExePath))
+        result = RunTurbSimBuild(ExePath,BuildDir,cases=cases,
+                                 TmplDir=TmplDir,n_repeat=n_repeat,
+                                 timeout=timeout,verbose=verbose,**kwargs)
+        result['Dir'] = BuildDir
+        results.append(result)
+
+    # compare outputs and times with reference build
+    ref = results[0]
+    for result in results:
+        Names = sorted(ref['Times'])
+        if result['Failed'] or ref['Failed']:
+            result['MaxDiff'] = float('inf')
+        else:
+            result['MaxDiff'] = CompareWindFiles(ref['Dir'],result['Dir'],
+                                                 Names)
+        result['Equivalent'] = result['MaxDiff'] <= atol
+        result['Speedup']    = ref['Total'] / result['Total'] \
+                                    if result['Total'] else 0.
+
+    if verbose:
+        print('\n' + FormatBuildTable(results))
+
+    return results
+
+def GetFastestBuild(results):
+    """ Executable of fastest build with equivalent output
+
+        Args:
+            results (list): results from CompareTurbSimBuilds
+
+        Returns:
+            ExePath (string): executable, or None if no build is equivalent
+    """
+
+    valid = [r for r in results if r['Equivalent'] and not r['Failed']]
+    if not valid:
+        return None
+
+    return min(valid,key=lambda r: r['Total'])['ExePath']
+
+def FormatBuildTable(results):
+    """ Table of total time, speed-up and output difference of builds
+    """
+
+    lines = ['{:30s} {:>10s} {:>8s} {:>12s} {:>6s}'.format('Build',
+                                'Total [s]','Speedup','MaxDiff','Equal')]
+    for r in results:
+        lines.append('{:30s} {:10.2f} {:8.2f} {:12.3e} {:>6s}'.format(
+                     r['Build'],r['Total'],r['Speedup'],r['MaxDiff'],
+                     'yes' if r['Equivalent'] else 'NO'))
+
+    return '\n'.join(lines)
+
+
+if __name__ == '__main__':
+
+    import argparse
+    parser = argparse.ArgumentParser(description='Compare wall time and ' + \
+                                     'output of TurbSim builds.')
+    parser.add_argument('WorkDir',help='directory for input and wind files')
+    parser.add_argument('ExePaths',nargs='+',help='TurbSim executables ' + \
+                        '(first is the reference)')
+    parser.add_argument('--repeat',type=int,default=1,
+                        help='runs per case (fastest is kept)')
+    parser.add_argument('--atol',type=float,default=0.01,
+                        help='allowed difference in wind speed [m/s]')
+    parser.add_argument('--AnalysisTime',type=float,default=630.,
+                        help='simulated time per case [s]')
+    parser.add_argument('--save',help='JSON file to save results to')
+    args = parser.parse_args()
+
+    results = CompareTurbSimBuilds(args.ExePaths,args.WorkDir,
+                                   n_repeat=args.repeat,atol=args.atol,
+                                   AnalysisTime=args.AnalysisTime,verbose=1)
+    if args.save:
+        with open(args.save,'w') as f:
+            json.dump(results,f,indent=1)
+
+    ExePath = GetFastestBuild(results)
+    if ExePath is None:
+        print('\nNo build matches the reference output.')
+        sys.exit(1)
+    print('\nFastest equivalent build: {:s}'.format(ExePath))
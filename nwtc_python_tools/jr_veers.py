@@ -0,0 +1,335 @@
+"""
+A series of Python functions for generating IEC Kaimal full-field
+turbulence with the Veers (spectral) method directly in Python, as a fast
+stand-in for running TurbSim on every seed.
+
+AUTHOR:  Jenni Rinker, Duke University
+CONTACT: jennifer.rinker@duke.edu
+
+
+NOTES:
+    Inputs are the TurbSim parameter dictionaries of jr_wind (see
+    GetTurbSimCases), so the same case matrix can be run either way. The
+    model follows TurbSim's IECKAI model for IEC 61400-1 ed. 3 normal
+    turbulence: Kaimal spectra, the IEC exponential coherence for u, no
+    spatial coherence for v and w, a power-law mean profile (exponent 0.2)
+    and no padding (UsableTime = "NoPad"), so the fields are periodic.
+
+    The frequency bins are processed in fixed-size chunks (so a seed gives
+    the same field however the chunks are spread over processes). For each
+    chunk, the Cholesky factors of the u coherence matrices are computed
+    in one batched call, or loaded from the cache, and applied to the
+    random phases of all seeds at once. Above the frequency where the
+    coherence of the closest points drops below CohTol, the factors are the
+    identity and are skipped. The fields of all seeds are then obtained
+    with one batched inverse FFT. Cholesky factors are cached per grid
+    geometry, wind speed and frequency chunk in memory (up to CacheMB) and
+    optionally as .npy files in a cache directory.
+
+"""
+
+# module dependencies
+import jr_wind
+import os, sys, hashlib, threading, collections
+from concurrent.futures import ProcessPoolExecutor
+import numpy as np
+
+
+# IEC 61400-1 ed. 3 reference turbulence intensities and power-law exponent
+IECIref = {'A':0.16,'B':0.14,'C':0.12}
+IECPLExp = 0.2
+
+# number of frequency bins per chunk, in-memory cache size per process and
+#   coherence below which points are treated as independent
+ChunkSize = 32
+CacheMB   = 1024.
+CohTol    = 1e-6
+
+# in-memory cache of Cholesky factors: key -> array
+_CholCache = collections.OrderedDict()
+
+
+def GetVeersGrid(TSDict):
+    """ Grid, time and turbulence parameters of TurbSim case
+
+        Args:
+            TSDict (dictionary): dictionary with TurbSim parameters
+
+        Returns:
+            grid (dictionary): y, z [m] of grid points (z-major order),
+                               n_y, n_z, dy, dz, n_t, dt, f (frequencies of
+                               bins 1..n_t/2-1 [Hz]), Uhub, Uz (mean wind
+                               at each height), sigma (standard deviations
+                               of u, v, w), L (Kaimal length scales) and Lc
+                               (coherence length scale)
+    """
+
+    n_y, n_z = int(TSDict['NumGrid_Y']), int(TSDict['NumGrid_Z'])
+    dt  = float(TSDict['TimeStep'])
+    n_t = int(round(float(TSDict['AnalysisTime']) / dt))
+    n_t += n_t % 2
+
+    # grid centered on hub, lowest point at HubHt - GridHeight/2
+    HubHt = float(TSDict['HubHt'])
+    y = np.linspace(-0.5,0.5,n_y) * float(TSDict['GridWidth'])
+    z = HubHt + np.linspace(-0.5,0.5,n_z) * float(TSDict['GridHeight'])
+    dy = y[1] - y[0] if n_y > 1 else 0.
+    dz = z[1] - z[0] if n_z > 1 else 0.
+
+    # power-law mean wind profile
+    Uz   = float(TSDict['URef']) * (z / float(TSDict['RefHt']))**IECPLExp
+    Uhub = float(TSDict['URef']) * (HubHt / float(TSDict['RefHt']))**IECPLExp
+
+    # IEC normal turbulence model (class letter or TI in percent)
+    TurbClass = str(TSDict['IECturbc']).strip().upper()
+    if TurbClass in IECIref:
+        sigma1 = IECIref[TurbClass] * (0.75*Uhub + 5.6)
+    else:
+        try:
+            sigma1 = float(TurbClass) / 100. * Uhub
+        except ValueError:
+            errStr = 'Uncoded turbulence class \"{:s}\".'.format(TurbClass)
+            raise ValueError(errStr)
+    Lambda1 = 0.7 * min(HubHt,60.)
+
+    grid = {'y':np.tile(y,n_z),'z':np.repeat(z,n_y),'n_y':n_y,'n_z':n_z,
+            'dy':dy,'dz':dz,'n_t':n_t,'dt':dt,
+            'f':np.arange(1,n_t//2) / (n_t*dt),
+            'HubHt':HubHt,'z0':z[0],'Uhub':Uhub,'Uz':Uz,
+            'sigma':sigma1 * np.array([1.,0.8,0.5]),
+            'L':Lambda1 * np.array([8.1,2.7,0.66]),'Lc':8.1*Lambda1}
+
+    return grid
+
+def GetKaimalSpectra(grid,f):
+    """ IEC Kaimal one-sided spectra of u, v and w
+
+        Args:
+            grid (dictionary): grid from GetVeersGrid
+            f (numpy array): frequencies [Hz]
+
+        Returns:
+            S (numpy array): [3 x n_f] spectra [(m/s)^2/Hz]
+    """
+
+    sigma, L, U = grid['sigma'][:,None], grid['L'][:,None], grid['Uhub']
+    S = 4 * sigma**2 * L / U / (1 + 6 * f[None,:] * L / U)**(5./3)
+
+    return S
+
+def GetMaxCoherence(grid,f):
+    """ Coherence of u at closest pair of grid points (largest off-diagonal
+        value of coherence matrix)
+
+        Args:
+            grid (dictionary): grid from GetVeersGrid
+            f (float): frequency [Hz]
+
+        Returns:
+            Coh (float): coherence of closest pair of grid points
+    """
+
+    r = min([d for d in (grid['dy'],grid['dz']) if d > 0] or [np.inf])
+    Coh = np.exp(-12 * np.sqrt((f * r / grid['Uhub'])**2 +
+                               (0.12 * r / grid['Lc'])**2))
+
+    return Coh
+
+def GetCohCholesky(grid,f,
+                   CacheDir=None):
+    """ Cholesky factors of IEC u-coherence matrices
+
+        Args:
+            grid (dictionary): grid from GetVeersGrid
+            f (numpy array): [n_f] frequencies [Hz]
+            CacheDir (string): directory for cached factors [opt]
+
+        Returns:
+            Lchol (numpy array): [n_f x n_p x n_p] lower-triangular factors
+    """
+
+    # cache key from grid geometry, wind speed and frequencies
+    sha = hashlib.sha1()
+    for arr in (grid['y'],grid['z'],[grid['Uhub'],grid['Lc']],f):
+        sha.update(np.asarray(arr,dtype=np.float64).tobytes())
+    key = sha.hexdigest()
+
+    if key in _CholCache:
+        _CholCache.move_to_end(key)
+        return _CholCache[key]
+    CachePath = None
+    if CacheDir is not None:
+        CachePath = os.path.join(CacheDir,'veers_' + key + '.npy')
+        if os.path.exists(CachePath):
+            return _CacheChol(key,np.load(CachePath))
+
+    # IEC exponential coherence, batched over frequencies
+    r = np.hypot(grid['y'][:,None] - grid['y'][None,:],
+                 grid['z'][:,None] - grid['z'][None,:])
+    Coh = np.exp(-12 * np.sqrt((f[:,None,None] * r / grid['Uhub'])**2 +
+                               (0.12 * r / grid['Lc'])**2))
+    try:
+        Lchol = np.linalg.cholesky(Coh)
+    except np.linalg.LinAlgError:
+        Coh  += 1e-8 * np.eye(r.shape[0])
+        Lchol = np.linalg.cholesky(Coh)
+    Lchol = Lchol.astype(np.float32)
+
+    if CachePath is not None:
+        if not os.path.isdir(CacheDir):
+            os.makedirs(CacheDir)
+        tmpPath = CachePath + '.{:d}.{:d}.tmp'.format(os.getpid(),
+                                                      threading.get_ident())
+        with open(tmpPath,'wb') as f_cache:
+            np.save(f_cache,Lchol)
+        os.replace(tmpPath,CachePath)
+
+    return _CacheChol(key,Lchol)
+
+def _CacheChol(key,Lchol):
+    """ Add factors to in-memory cache, dropping least recently used ones
+    """
+    if Lchol.nbytes <= CacheMB * 2**20:
+        _CholCache[key] = Lchol
+        while sum([a.nbytes for a in _CholCache.values()]) > CacheMB * 2**20:
+            _CholCache.popitem(last=False)
+    return Lchol
+
+def _VeersChunk(args):
+    """ Fourier coefficients of one frequency chunk for all seeds
+    """
+
+    grid, seeds, i_chunk, CacheDir = args
+    i_f = np.arange(i_chunk*ChunkSize,
+                    min((i_chunk + 1)*ChunkSize,len(grid['f'])))
+    f   = grid['f'][i_f]
+    n_p, n_s = len(grid['y']), len(seeds)
+    df  = 1. / (grid['n_t'] * grid['dt'])
+
+    # amplitudes for irfft: x = sum_k sqrt(2 S df) cos(2 pi f t + phase)
+    A = grid['n_t'] * np.sqrt(GetKaimalSpectra(grid,f) * df / 2.)
+
+    # random phases [n_f x n_p x n_seeds] depend only on seed, component
+    #   and chunk
+    X = np.empty((n_s,3,n_p,len(f)),dtype=np.complex64)
+    for i_c in range(3):
+        P = np.empty((len(f),n_p,n_s),dtype=np.complex128)
+        for i_s in range(n_s):
+            rng = np.random.default_rng([int(seeds[i_s]) & 0xffffffff,
+                                         i_c,i_chunk])
+            P[:,:,i_s] = np.exp(2j * np.pi * rng.random((len(f),n_p)))
+
+        # correlate u with coherence factors (all seeds in one product)
+        if (i_c == 0) and (GetMaxCoherence(grid,f[0]) > CohTol):
+            Lchol = GetCohCholesky(grid,f,CacheDir=CacheDir)
+            P = np.matmul(Lchol,P.real) + 1j*np.matmul(Lchol,P.imag)
+        X[:,i_c] = np.transpose(A[i_c][:,None,None] * P,(2,1,0))
+
+    return i_chunk, X
+
+def SynthesizeVeers(TSDict,seeds,
+                    n_workers=1,CacheDir=None,verbose=0):
+    """ Full-field turbulence for several seeds of one TurbSim case
+
+        Args:
+            TSDict (dictionary): dictionary with TurbSim parameters
+            seeds (list): random seeds (e.g., RandSeed1 of each case)
+            n_workers (int): processes for frequency chunks [opt]
+            CacheDir (string): directory for cached Cholesky factors [opt]
+            verbose (int): flag to suppress print statements [opt]
+
+        Returns:
+            turb (numpy array): [n_seeds x 3 x n_z x n_y x n_t] wind
+                                velocities [m/s] (as read by
+                                jr_wind.turbsim)
+            grid (dictionary): grid from GetVeersGrid
+    """
+
+    grid = GetVeersGrid(TSDict)
+    n_chunks = -(-len(grid['f']) // ChunkSize)
+    n_p, n_t = len(grid['y']), grid['n_t']
+    tasks = [(grid,list(seeds),i_chunk,CacheDir) \
+                for i_chunk in range(n_chunks)]
+
+    if verbose:
+        sys.stdout.write('  Synthesizing {:d} seeds '.format(len(seeds)) + \
+                         '({:d} points, {:d} steps)...'.format(n_p,n_t))
+
+    # Fourier coefficients, zero at mean and Nyquist frequency
+    X = np.zeros((len(seeds),3,n_p,n_t//2 + 1),dtype=np.complex64)
+    if n_workers > 1:
+        with ProcessPoolExecutor(n_workers) as pool:
+            for i_chunk, X_chunk in pool.map(_VeersChunk,tasks):
+                i0 = 1 + i_chunk*ChunkSize
+                X[...,i0:i0 + X_chunk.shape[-1]] = X_chunk
+    else:
+        for task in tasks:
+            i_chunk, X_chunk = _VeersChunk(task)
+            i0 = 1 + i_chunk*ChunkSize
+            X[...,i0:i0 + X_chunk.shape[-1]] = X_chunk
+
+    # batched inverse FFT of all seeds and components, then add mean wind
+    turb = np.fft.irfft(X,n=n_t,axis=-1).astype(np.float32)
+    turb = turb.reshape(len(seeds),3,grid['n_z'],grid['n_y'],n_t)
+    turb[:,0] += grid['Uz'][None,:,None,None].astype(np.float32)
+
+    if verbose:
+        sys.stdout.write('done.\n')
+
+    return turb, grid
+
+def WriteVeersAll(TSDicts,WindDir,
+                  n_workers=1,n_batch=8,CacheDir=None,verbose=0):
+    """ .bts files for TurbSim cases with the Veers method
+
+        Cases that differ only in their seeds are synthesized together, in
+        batches of n_batch seeds. Files are named '<TSName>.bts'.
+
+        Args:
+            TSDicts (list): TurbSim dictionaries (see
+                            jr_wind.GetTurbSimCases)
+            WindDir (string): directory to write .bts files to
+            n_workers (int): processes for frequency chunks [opt]
+            n_batch (int): seeds synthesized at once [opt]
+            CacheDir (string): directory for cached Cholesky factors [opt]
+            verbose (int): flag to suppress print statements [opt]
+
+        Returns:
+            WindPaths (list): paths to .bts files in order of TSDicts
+    """
+
+    if not os.path.isdir(WindDir):
+        os.makedirs(WindDir)
+
+    # group cases whose parameters differ only in seeds and name
+    groups = collections.OrderedDict()
+    for i_case in range(len(TSDicts)):
+        key = tuple(sorted([(k,str(v)) for k, v in TSDicts[i_case].items() \
+                            if k not in ('RandSeed1','RandSeed2','TSName')]))
+        groups.setdefault(key,[]).append(i_case)
+
+    if verbose:
+        print('\nWriting {:d} Veers wind files '.format(len(TSDicts)) + \
+              'in {:d} groups...'.format(len(groups)))
+
+    WindPaths = [None] * len(TSDicts)
+    for i_cases in groups.values():
+        for i_b in range(0,len(i_cases),n_batch):
+            batch = i_cases[i_b:i_b + n_batch]
+            seeds = [TSDicts[i]['RandSeed1'] for i in batch]
+            turb, grid = SynthesizeVeers(TSDicts[batch[0]],seeds,
+                                         n_workers=n_workers,
+                                         CacheDir=CacheDir,verbose=verbose)
+            for i_s in range(len(batch)):
+                TSDict = TSDicts[batch[i_s]]
+                WindPath = os.path.join(WindDir,TSDict['TSName'] + '.bts')
+                desc = 'Veers-method IECKAI field, ' + \
+                       'URef={:.2f}, IECturbc={:s}, seed={:d}'.format(
+                            float(TSDict['URef']),str(TSDict['IECturbc']),
+                            int(TSDict['RandSeed1']))
+                jr_wind.WriteBTS(WindPath,turb[i_s],grid['dz'],grid['dy'],
+                                 grid['dt'],grid['HubHt'],grid['z0'],
+                                 uhub=grid['Uhub'],desc=desc,periodic=True)
+                WindPaths[batch[i_s]] = WindPath
+
+    return WindPaths
@@ -0,0 +1,307 @@
+"""
+A series of Python functions for writing FAST/AeroDyn input files while
+wind files are still arriving in a wind directory (watch mode).
+
+AUTHOR:  Jenni Rinker, Duke University
+CONTACT: jennifer.rinker@duke.edu
+
+
+NOTES:
+    WatchWindDir scans the wind directory every `interval` seconds. A wind
+    file is complete when
+        - binary files (.bts, .wnd, .bl): its size equals the size given
+          by its header (TurbSim and the Bladed writers write the header
+          first) and, for .wnd files, its .sum file exists and has not
+          changed for TStable seconds (AeroDyn reads it), or
+        - text (hub-height) .wnd files: its size and modification time have
+          not changed for TStable seconds.
+    Complete files are rendered right away with jr_fast.WriteFastADOne.
+    On Linux, inotify wakes the scan as soon as a file in the directory is
+    closed or moved in; the scan still runs every `interval` seconds,
+    since inotify does not see files written by other NFS clients.
+
+    Cases already in the journal as written, running or done are skipped,
+    so a watcher can be restarted. Each new case is optionally put in a
+    runner queue: an object with a put() method, e.g. a queue.Queue or the
+    job server of an open-ended jr_queue coordinator:
+
+        server = jr_queue.ConnectJobServer(('coordinator',50000))
+        jr_watch.WatchWindDir(TurbName,ModlDir,WindDir,FastDir,
+                              CaseQueue=server,FastExe=FastExe,n_cases=96)
+        server.close()
+
+"""
+
+# module dependencies
+import jr_fast, jr_journal, jr_run, jr_wind, jr_timing
+import os, sys, time, struct, select, ctypes, ctypes.util
+
+
+# possible wind file endings
+WindEnds = ('.bts','.wnd','.bl')
+
+# inotify events that end a write in the watched directory
+_IN_CLOSE_WRITE, _IN_MOVED_TO = 0x00000008, 0x00000080
+
+
+def GetWindFileSize(WindPath):
+    """ Size of complete wind file from its header
+
+        Args:
+            WindPath (string): path to wind file
+
+        Returns:
+            n_bytes (int): size of complete file, 0 if the header is not
+                           written yet, None if not a binary wind file
+    """
+
+    try:
+        header = jr_wind.ReadWindHeader(WindPath)
+    except (struct.error,OSError,UnicodeDecodeError):
+        return 0
+    if header['n_t'] is None:
+        return None
+
+    n_points = header['n_y'] * header['n_z'] + header.get('n_tower',0)
+    n_comp   = header.get('ncomp',3)
+
+    return header['offset'] + 2 * n_comp * n_points * header['n_t']
+
+def IsWindFileComplete(WindPath,stat,StableSince,
+                       TStable=10.,SumStableSince=None):
+    """ Whether wind file has been completely written
+
+        Args:
+            WindPath (string): path to wind file
+            stat (os.stat_result): current status of file
+            StableSince (float): time since when size and modification time
+                                 are unchanged [s]
+            TStable (float): time without change for text files and .sum
+                             files [s] [opt]
+            SumStableSince (float): time since when size and modification
+                                    time of the .sum file of a binary .wnd
+                                    file are unchanged, None if it does
+                                    not exist [s] [opt]
+
+        Returns:
+            complete (bool): True if file is complete
+    """
+
+    if not stat.st_size:
+        return False
+    n_bytes = GetWindFileSize(WindPath)
+    if n_bytes is None:
+        return (time.time() - StableSince) >= TStable
+    if WindPath.endswith('.wnd') and ((SumStableSince is None) or \
+            (time.time() - SumStableSince < TStable)):
+        return False
+
+    return stat.st_size == n_bytes
+
+class _Inotify(object):
+    """ Minimal inotify watch of one directory (Linux, via libc)
+    """
+
+    def __init__(self,path):
+        libc = ctypes.CDLL(ctypes.util.find_library('c'),use_errno=True)
+        self.fd = libc.inotify_init1(os.O_NONBLOCK | os.O_CLOEXEC)
+        if self.fd < 0:
+            raise OSError(ctypes.get_errno(),'inotify_init1 failed')
+        wd = libc.inotify_add_watch(self.fd,os.fsencode(path),
+                                    _IN_CLOSE_WRITE | _IN_MOVED_TO)
+        if wd < 0:
+            os.close(self.fd)
+            raise OSError(ctypes.get_errno(),'inotify_add_watch failed')
+
+    def wait(self,timeout):
+        """ Wait until an event arrives or timeout [s] passes (events are
+            discarded, the directory is scanned anyway)
+        """
+        ready = select.select([self.fd],[],[],timeout)[0]
+        if ready:
+            try:
+                while os.read(self.fd,65536):
+                    pass
+            except BlockingIOError:
+                pass
+        return bool(ready)
+
+    def close(self):
+        os.close(self.fd)
+
+
+def WatchWindDir(TurbName,ModlDir,WindDir,FastDir,
+                 Naming=1,version=7,JournalPath=None,CaseQueue=None,
+                 FastExe=None,interval=5.,TStable=10.,n_cases=None,
+                 TIdle=None,inotify=1,verbose=0,**kwargs):
+    """ Write FAST/AeroDyn input files for wind files as they arrive
+
+        Runs until n_cases cases were written, no new wind file was complete
+        for TIdle seconds, or KeyboardInterrupt.
+
+        Args:
+            TurbName (string): turbine name
+            ModlDir (string): directory with wind-independent files (e.g.,
+                              Blade, Tower, Pitch files)
+            WindDir (string): directory to watch for wind files
+            FastDir (string): directory to write FAST & AeroDyn files to
+            Naming (string): flag for naming convention for FAST files [opt]
+                                1 = '<WindName>.fst'
+                                2 = '<TurbName>_<WindName>.fst'
+            version (int): FAST version (7 or 8) [opt]
+            JournalPath (string): path to campaign journal to record
+                                  written cases in and skip cases from
+                                  (see jr_journal) [opt]
+            CaseQueue (object): queue to put new cases in with put() [opt]
+            FastExe (string or list): FAST executable; if given, jobs (see
+                                      jr_run.MakeJob) are put in CaseQueue
+                                      instead of case names [opt]
+            interval (float): seconds between scans of WindDir [opt]
+            TStable (float): seconds without change before a text wind file
+                             (or the .sum file of a binary .wnd file) is
+                             complete [opt]
+            n_cases (int): stop after this many cases were written [opt]
+            TIdle (float): stop after this many seconds without a new
+                           complete wind file [opt]
+            inotify (int): flag to wake scans with inotify (Linux) [opt]
+            verbose (int): flag to suppress print statements [opt]
+            kwargs (dictionary): keyword arguments to WriteFastADOne [opt]
+
+        Returns:
+            cases (list): dictionaries ('Name', 'WindPath', 'FastPath' and
+                          'Error') of cases handled by this call, in order
+    """
+
+    # cases written by earlier runs
+    done = set()
+    if JournalPath is not None:
+        done = set([Name for Name, row in \
+                        jr_journal.GetCaseStates(JournalPath).items() \
+                        if row['State'] in ('written','running','done')])
+
+    watch = None
+    if inotify:
+        try:
+            watch = _Inotify(WindDir)
+        except (OSError,AttributeError,TypeError):
+            watch = None
+
+    if verbose:
+        print('\nWatching {:s} for wind files{:s}...'.format(WindDir,
+              ' (inotify)' if watch is not None else ''))
+
+    # name (wind or .sum file) -> (size, modification time, time since
+    # unchanged)
+    seen, failed, cases = {}, {}, []
+    t_last = time.time()
+    try:
+        while True:
+
+            # complete wind files not handled yet, oldest first
+            ready = []
+            with jr_timing.Stage('watch.scan'):
+                for entry in os.scandir(WindDir):
+                    if not entry.name.endswith(WindEnds):
+                        continue
+                    FastName = jr_fast.GetFastName(TurbName,entry.name,Naming)
+                    if FastName in done:
+                        continue
+                    try:
+                        stat = entry.stat()
+                    except FileNotFoundError:
+                        continue
+                    ident = (stat.st_size,stat.st_mtime_ns)
+                    if (entry.name not in seen) or \
+                            (seen[entry.name][:2] != ident):
+                        seen[entry.name] = ident + (time.time(),)
+
+                    # .sum file of .wnd file
+                    SumStable = None
+                    if entry.name.endswith('.wnd'):
+                        SumName = os.path.splitext(entry.name)[0] + '.sum'
+                        try:
+                            sstat = os.stat(os.path.join(WindDir,SumName))
+                        except FileNotFoundError:
+                            sstat = None
+                        if sstat is not None:
+                            sident = (sstat.st_size,sstat.st_mtime_ns)
+                            if (SumName not in seen) or \
+                                    (seen[SumName][:2] != sident):
+                                seen[SumName] = sident + (time.time(),)
+                            SumStable = seen[SumName][2]
+                            ident = ident + sident
+
+                    if failed.get(FastName) == ident:
+                        continue
+                    if IsWindFileComplete(entry.path,stat,
+                                          seen[entry.name][2],
+                                          TStable=TStable,
+                                          SumStableSince=SumStable):
+                        ready.append((stat.st_mtime_ns,entry.path,FastName,
+                                      ident))
+
+            for mtime, WindPath, FastName, ident in sorted(ready):
+                case = {'Name':FastName,'WindPath':WindPath,
+                        'FastPath':os.path.join(FastDir,FastName + '.fst'),
+                        'Error':None}
+                try:
+                    jr_fast.WriteFastADOne(TurbName,WindPath,FastName,
+                                           ModlDir,FastDir,version=version,
+                                           **kwargs)
+                except Exception as err:
+                    case['Error'] = '{:s}: {:s}'.format(type(err).__name__,
+                                                        str(err))
+                    failed[FastName] = ident
+                    if JournalPath is not None:
+                        jr_journal.SetCaseState(JournalPath,FastName,
+                                                'failed',WindPath=WindPath,
+                                                Error=case['Error'])
+                else:
+                    done.add(FastName)
+                    if JournalPath is not None:
+                        jr_journal.SetCaseState(JournalPath,FastName,
+                                                'written',WindPath=WindPath,
+                                                FastPath=case['FastPath'],
+                                                ExitCode=None,OutHash=None,
+                                                Error=None)
+                    if (CaseQueue is not None) and (FastExe is None):
+                        CaseQueue.put(FastName)
+                    elif CaseQueue is not None:
+                        job = jr_run.MakeJob(FastName,FastExe,
+                                             case['FastPath'])
+                        if kwargs.get('StageDir',None) is not None:
+                            job['StageDir'] = kwargs['StageDir']
+                        CaseQueue.put(job)
+                    jr_timing.Count('cases')
+                cases.append(case)
+                t_last = time.time()
+                if verbose:
+                    sys.stdout.write('  {:s}: {:s}\n'.format(FastName,
+                                     case['Error'] or 'written'))
+                    sys.stdout.flush()
+
+            # stop when enough cases were written or nothing arrives
+            n_written = len([case for case in cases if not case['Error']])
+            if (n_cases is not None) and (n_written >= n_cases):
+                break
+            if (TIdle is not None) and (time.time() - t_last >= TIdle):
+                break
+
+            if watch is not None:
+                watch.wait(interval)
+            else:
+                time.sleep(interval)
+
+    except KeyboardInterrupt:
+        if verbose:
+            print('  Interrupted.')
+    finally:
+        if watch is not None:
+            watch.close()
+
+    if verbose:
+        print('done. {:d} cases written, {:d} failed.'.format(
+              len([case for case in cases if not case['Error']]),
+              len([case for case in cases if case['Error']])))
+
+    return cases
@@ -7,12 +7,13 @@ Written by Jenni Rinker, Duke University.
 Contact: jennifer.rinker@duke.edu
 
 """
-import numpy as np
-import os
-from struct import unpack
+import jr_timing
+import os, sys, zlib, math
+from struct import pack, unpack
 from warnings import warn
 
 
+@jr_timing.Timed
 def GetFirstWind(wind_fpath):
     """ First wind speed from file
     
@@ -58,6 +59,344 @@ def GetFirstWind(wind_fpath):
         ValueError(errStr)
         
     return u0
+
+
+def GetTurbSimDefaults(TurbDict=None):
+    """ Default parameters for Template_TurbSim.inp
+
+        If a turbine dictionary is given, the hub height and grid size are
+        set from the turbine geometry.
+
+        Args:
+            TurbDict (dictionary): dictionary with FAST parameters [opt]
+
+        Returns:
+            TSDict (dictionary): dictionary of TurbSim parameters
+    """
+
+    TSDict = {'RandSeed1':0,'RandSeed2':0,
+              'NumGrid_Z':31,'NumGrid_Y':31,'TimeStep':0.05,
+              'AnalysisTime':630.,'HubHt':90.,'GridHeight':140.,
+              'GridWidth':140.,'TurbModel':'IECKAI','UserFile':'unused',
+              'IECturbc':'B','WindProfileType':'IEC','RefHt':90.,
+              'URef':10.,'TCMod1':(0.,math.pi),'TCMod2':(0.,math.pi),
+              'TCMod3':(0.,math.pi)}
+
+    # size grid to rotor (10% margin, must fit below hub height)
+    if TurbDict is not None:
+        HubHt = TurbDict['HH']
+        GridSize = float(math.ceil(2.2*TurbDict['TipRad']))
+        GridSize = min(GridSize,2.*math.floor(HubHt) - 2.)
+        TSDict.update({'HubHt':HubHt,'RefHt':HubHt,
+                       'GridHeight':GridSize,'GridWidth':GridSize})
+
+    return TSDict
+
+def GetTurbSimSeeds(URef,TurbClass,i_seed,BaseSeed=0):
+    """ Deterministic pair of random seeds for a TurbSim case
+
+        The seeds depend only on the case parameters, so a case keeps its
+        seeds when the case matrix is extended or reordered.
+
+        Args:
+            URef (float): reference wind speed
+            TurbClass (string): IEC turbulence class or intensity
+            i_seed (int): seed index
+            BaseSeed (int): campaign-level offset for the seeds [opt]
+
+        Returns:
+            RandSeed1 (int): first random seed
+            RandSeed2 (int): second random seed
+    """
+
+    case_str = '{:.2f}_{:s}_{:d}_{:d}'.format(URef,str(TurbClass),
+                                              i_seed,BaseSeed)
+    RandSeed1 = zlib.crc32(('1_'+case_str).encode()) - 2**31
+    RandSeed2 = zlib.crc32(('2_'+case_str).encode()) - 2**31
+
+    return RandSeed1, RandSeed2
+
+def GetTurbSimName(URef,TurbClass,i_seed):
+    """ Root name for a TurbSim case
+
+        Args:
+            URef (float): reference wind speed
+            TurbClass (string): IEC turbulence class or intensity
+            i_seed (int): seed index
+
+        Returns:
+            TSName (string): name 'TS_U<10*URef>_<TurbClass>_S<seed>', e.g.
+                             'TS_U0115_B_S003' for 11.5 m/s, class B, seed 3
+    """
+
+    TSName = 'TS_U{:04d}_{:s}_S{:03d}'.format(int(round(10*URef)),
+                                               str(TurbClass),i_seed)
+
+    return TSName
+
+def GetTurbSimCases(URefs,TurbClasses,n_seeds,
+                    TurbDict=None,BaseSeed=0,**kwargs):
+    """ TurbSim parameter dictionaries for matrix of wind conditions
+
+        Args:
+            URefs (list): reference wind speeds
+            TurbClasses (list): IEC turbulence classes (e.g., 'A', 'B')
+            n_seeds (int): number of seeds per wind speed/class
+            TurbDict (dictionary): turbine dictionary to size grid [opt]
+            BaseSeed (int): campaign-level offset for the seeds [opt]
+            kwargs (dictionary): TurbSim parameters to overwrite [opt]
+
+        Returns:
+            TSDicts (list): TurbSim dictionaries with case name in 'TSName'
+    """
+
+    TSDefaults = GetTurbSimDefaults(TurbDict)
+    for key in kwargs:
+        if key in TSDefaults.keys():
+            TSDefaults[key] = kwargs[key]
+
+    # loop through case matrix
+    TSDicts = []
+    for URef in URefs:
+        for TurbClass in TurbClasses:
+            for i_seed in range(n_seeds):
+                TSDicts.append(GetTurbSimCase(URef,TurbClass,i_seed,
+                                              TSDefaults=TSDefaults,
+                                              BaseSeed=BaseSeed))
+
+    return TSDicts
+
+def GetTurbSimCase(URef,TurbClass,i_seed,
+                   TSDefaults=None,BaseSeed=0):
+    """ TurbSim parameter dictionary for one wind condition and seed
+
+        Args:
+            URef (float): reference wind speed
+            TurbClass (string): IEC turbulence class (e.g., 'A', 'B')
+            i_seed (int): seed index
+            TSDefaults (dictionary): other TurbSim parameters [opt, from
+                                     GetTurbSimDefaults]
+            BaseSeed (int): campaign-level offset for the seeds [opt]
+
+        Returns:
+            TSDict (dictionary): TurbSim dictionary with case name in
+                                 'TSName'
+    """
+
+    if TSDefaults is None:
+        TSDefaults = GetTurbSimDefaults()
+
+    TSDict = dict(TSDefaults)
+    TSDict['URef']     = URef
+    TSDict['IECturbc'] = str(TurbClass)
+    TSDict['RandSeed1'], TSDict['RandSeed2'] = \
+            GetTurbSimSeeds(URef,TurbClass,i_seed,BaseSeed)
+    TSDict['TSName'] = GetTurbSimName(URef,TurbClass,i_seed)
+
+    return TSDict
+
+def WriteTurbSimFile(TSDict,TmplDir,WrDir,
+                     verbose=0):
+    """ TurbSim v2 input file from Template_TurbSim.inp
+
+        Args:
+            TSDict (dictionary): dictionary with TurbSim parameters and
+                                 case name 'TSName'
+            TmplDir (string): directory with template files
+            WrDir (string): directory to write TurbSim input file to
+            verbose (int): flag to suppress print statements [opt]
+
+        Returns:
+            fpath_out (string): path to TurbSim input file
+    """
+
+    if verbose:
+        sys.stdout.write('  Writing TurbSim file {:s}...'.format(TSDict['TSName']))
+
+    # define path to base template and output file
+    fpath_temp = os.path.join(TmplDir,'Template_TurbSim.inp')
+    fpath_out  = os.path.join(WrDir,TSDict['TSName']+'.inp')
+
+    # open template file and file to write to
+    with open(fpath_temp,'r') as f_temp:
+        with open(fpath_out,'w') as f_write:
+
+            # read each line in template file
+            for r_line in f_temp:
+
+                # default to copying without modification
+                w_line = r_line
+
+                # if line has a write-able field
+                if ('{:' in r_line):
+
+                    # temporal coherence lines have two values in quotes
+                    if r_line.startswith('\"{:'):
+                        field = r_line.split()[2]
+                        value = TSDict[field]
+                    else:
+                        field = r_line.split()[1]
+                        value = [TSDict[field]]
+
+                    # string values are quoted in TurbSim input files
+                    if isinstance(value[0],str):
+                        value = ['\"{:s}\"'.format(value[0])]
+
+                    value_format = r_line.split(field,1)[0]
+                    comment      = r_line.split(field,1)[1]
+                    w_line = field.join([value_format.format(*value),
+                                        comment])
+
+                f_write.write(w_line)
+
+    if verbose:
+        sys.stdout.write('done.\n')
+
+    return fpath_out
+
+def WriteTurbSimAll(URefs,TurbClasses,n_seeds,TmplDir,WindDir,
+                    TurbDict=None,BaseSeed=0,verbose=0,**kwargs):
+    """ TurbSim input files for matrix of wind conditions
+
+        Files are written to the wind directory so that TurbSim writes the
+        .bts files next to them.
+
+        Args:
+            URefs (list): reference wind speeds
+            TurbClasses (list): IEC turbulence classes (e.g., 'A', 'B')
+            n_seeds (int): number of seeds per wind speed/class
+            TmplDir (string): directory with template files
+            WindDir (string): directory to write TurbSim input files to
+            TurbDict (dictionary): turbine dictionary to size grid [opt]
+            BaseSeed (int): campaign-level offset for the seeds [opt]
+            verbose (int): flag to suppress print statements [opt]
+            kwargs (dictionary): TurbSim parameters to overwrite [opt]
+
+        Returns:
+            InpPaths (list): paths to TurbSim input files
+    """
+
+    TSDicts = GetTurbSimCases(URefs,TurbClasses,n_seeds,
+                              TurbDict=TurbDict,BaseSeed=BaseSeed,**kwargs)
+
+    if verbose:
+        print('\nWriting {:d} TurbSim input files...'.format(len(TSDicts)))
+
+    if not os.path.isdir(WindDir):
+        os.makedirs(WindDir)
+
+    InpPaths = [WriteTurbSimFile(TSDict,TmplDir,WindDir,verbose=verbose) \
+                    for TSDict in TSDicts]
+
+    return InpPaths
+
+@jr_timing.Timed
+def ReadWindHeader(wind_fpath):
+    """ Grid and time information from wind file header
+    
+        Only the header is read, so this is cheap for large binary files.
+        Text (hub-height) .wnd files are reported as a 1 x 1 grid.
+    
+        Args:
+            wind_fpath (string): path to wind file
+            
+        Returns:
+            header (dictionary): n_z, n_y, n_t, dz, dy, dt, uhub, plus
+                                 for binary files zhub, data offset in
+                                 bytes ('offset') and scaling (u_scl,
+                                 u_off, z0 for .bts; ti, clockwise for
+                                 bladed)
+    """
+    
+    # if it's a TurbSim file
+    if wind_fpath.endswith('.bts'):
+        with open(wind_fpath,'rb') as fl:
+            (junk, n_z, n_y, n_tower, n_t, dz, dy, dt, uhub, zhub, z0) = \
+                    unpack(e + 'h4l6f', fl.read(42))
+            scales = unpack(e + '6f', fl.read(24))
+            strlen, = unpack(e + 'l', fl.read(4))
+        header = {'n_z':n_z,'n_y':n_y,'n_tower':n_tower,'n_t':n_t,
+                  'dz':dz,'dy':dy,'dt':dt,'uhub':uhub,'zhub':zhub,'z0':z0,
+                  'u_scl':list(scales[0::2]),'u_off':list(scales[1::2]),
+                  'offset':70 + strlen}
+    
+    # otherwise, try it as a binary bladed file
+    else:
+        with open(wind_fpath,'rb') as fl:
+            junk, nffc = unpack(e + '2h', fl.read(4))
+            
+            # if not binary, it's a hub-height text file
+            if junk != -99 or nffc != 4:
+                header = {'n_z':1,'n_y':1,'n_t':None,'dz':None,'dy':None,
+                          'dt':None,'uhub':None}
+                return header
+                
+            ncomp, lat, z0, center = unpack(e + 'l3f', fl.read(16))
+            ti = [t / 100. for t in unpack(e + '3f', fl.read(12))]
+            dz, dy, dx, n_f, uhub = unpack(e + '3flf', fl.read(20))
+            fl.seek(12, 1)
+            clockwise, randseed, n_z, n_y = unpack(e + '4l', fl.read(16))
+        header = {'n_z':n_z,'n_y':n_y,'n_t':int(2 * n_f),'dz':dz,'dy':dy,
+                  'dt':dx / uhub,'uhub':uhub,'zhub':center,'ncomp':ncomp,
+                  'ti':ti,'clockwise':clockwise,'offset':104}
+        
+    return header
+
+
+def ReadWindBlocks(wind_fpath,
+                   n_block=1024):
+    """ Binary wind field in blocks of time steps (streamed from file)
+
+        The values are the same as from readModel, but only one block is in
+        memory at a time (time is the slowest axis in both binary formats).
+
+        Args:
+            wind_fpath (string): path to .bts, .wnd or .bl file
+            n_block (int): number of time steps per block [opt]
+
+        Returns:
+            blocks (generator): (index of first time step, [3 x n_z x n_y x
+                                n_b] numpy array) for each block
+    """
+
+    import numpy as np  # deferred so text-only callers skip the import
+    header = ReadWindHeader(wind_fpath)
+    if header['n_t'] is None:
+        errStr = 'Wind file {:s} is not a binary full-field file.'.format(
+                                                                wind_fpath)
+        raise ValueError(errStr)
+    n_z, n_y, n_t = header['n_z'], header['n_y'], header['n_t']
+    n_c = header.get('ncomp',3)
+    n_tower = header.get('n_tower',0)
+    n_step = n_c * n_y * n_z + 3 * n_tower  # int16 values per time step
+
+    # scaling from integers to wind speeds (see turbsim and bladed)
+    if 'u_scl' in header:
+        scl = 1. / np.array(header['u_scl'],dtype=np.float32)
+        off = -np.array(header['u_off'],dtype=np.float32) * scl
+        flip = False
+    else:
+        ti  = np.array(header['ti'],dtype=np.float32)
+        scl = header['uhub'] * ti / 1000.
+        off = np.array([header['uhub'],0.,0.],dtype=np.float32)[:n_c]
+        flip = _get_clockwise(wind_fpath,header['clockwise'])
+
+    with open(wind_fpath,'rb') as fl:
+        fl.seek(header['offset'])
+        for i_t0 in range(0,n_t,n_block):
+            n_b  = min(n_block,n_t - i_t0)
+            data = np.frombuffer(fl.read(2 * n_step * n_b),
+                                 dtype=e + 'i2').reshape([n_b,n_step])
+            jr_timing.Count('bytes.wind',2 * n_step * n_b)
+            turb = data[:,:n_c * n_y * n_z].reshape([n_b,n_z,n_y,n_c])
+            turb = turb.transpose(3,1,2,0).astype(np.float32)
+            turb *= scl[:,None,None,None]
+            turb += off[:,None,None,None]
+            if flip:
+                turb = turb[:,:,::-1,:]
+            yield i_t0, turb
+
+    return
         
 # ---------------------------- PyTurbSim code ---------------------------------
 # Code modified from PyTurbSim to load field from turbsim output
@@ -66,6 +405,7 @@ def GetFirstWind(wind_fpath):
 # define endian-ness
 e = '<'  
 
+@jr_timing.Timed
 def readModel(fname, ):
     """
     Read a TurbSim data and input file and return a
@@ -85,14 +425,14 @@ def readModel(fname, ):
     """
     
     if (fname.endswith('wnd')):
-        return bladed(fname,)
+        return bladed(fname,)[0]
     elif (fname.endswith('bl')):
-        return bladed(fname,)
+        return bladed(fname,)[0]
     elif (fname.endswith('bts')):
         return turbsim(fname,)
 
     # Otherwise try reading it as a .wnd file.
-    bladed(fname)  # This will raise an error if it doesn't work.    
+    return bladed(fname)[0]  # This will raise an error if it doesn't work.
     
     
 def bladed(fname,):
@@ -110,8 +450,9 @@ def bladed(fname,):
              [3 x n_z x n_y x n_t] array of wind velocity values
 
     """
+    import numpy as np  # deferred so text-only callers skip the import
     fname = checkname(fname, ['.wnd', '.bl'])
-    with file(fname, 'rb') as fl:
+    with open(fname, 'rb') as fl:
         junk, nffc, ncomp, lat, z0, center = unpack(e + '2hl3f', fl.read(20))
         if junk != -99 or nffc != 4:
             raise IOError("The file %s does not appear to be a valid 'bladed (.bts)' format file."
@@ -123,7 +464,8 @@ def bladed(fname,):
         clockwise, randseed, n_z, n_y = unpack(e + '4l', fl.read(16))
         fl.seek(24, 1)  # Unused bytes
         nbt = ncomp * n_y * n_z * n_t
-        turb = np.rollaxis(np.fromstring(fl.read(2 * nbt), dtype=np.int16)
+        jr_timing.Count('bytes.wind',2 * nbt)
+        turb = np.rollaxis(np.frombuffer(fl.read(2 * nbt), dtype=np.int16)
                           .astype(np.float32).reshape([ncomp,
                                                        n_y,
                                                        n_z,
@@ -134,6 +476,19 @@ def bladed(fname,):
     # Create the grid object:
     dt = dx / uhub
     # Determine the clockwise value.
+    clockwise = _get_clockwise(fname, clockwise)
+    if clockwise:
+        # flip the data back
+        turb = turb[:, :, ::-1, :]
+
+    return turb, dt
+
+
+def _get_clockwise(fname, clockwise):
+    """
+    Whether a bladed-format file was written clockwise (y flipped), from
+    the header value or else from the .sum file.
+    """
     if clockwise == 0:
         try:
             d = sum_scan(convname(fname, '.sum'))
@@ -149,11 +504,7 @@ def bladed(fname,):
             clockwise = True
     else:
         clockwise = bool(clockwise - 1)
-    if clockwise:
-        # flip the data back
-        turb = turb[:, :, ::-1, :]
-
-    return turb, dt
+    return clockwise
 
 
 def turbsim(fname):
@@ -172,10 +523,11 @@ def turbsim(fname):
              [3 x n_z x n_y x n_t] array of wind velocity values
 
     """
+    import numpy as np  # deferred so text-only callers skip the import
     fname = checkname(fname, ['.bts'])
     u_scl = np.zeros(3, np.float32)
     u_off = np.zeros(3, np.float32)
-    fl = file(fname, 'rb')
+    fl = open(fname, 'rb')
     (junk,
      n_z,
      n_y,
@@ -197,12 +549,115 @@ def turbsim(fname):
     desc_str = fl.read(strlen)  # skip these bytes.
     # load turbulent field
     nbt = 3 * n_y * n_z * n_t
-    turb = np.rollaxis(np.fromstring(fl.read(2 * nbt), dtype=np.int16).astype(
+    jr_timing.Count('bytes.wind',2 * nbt)
+    turb = np.rollaxis(np.frombuffer(fl.read(2 * nbt), dtype=np.int16).astype(
         np.float32).reshape([3, n_y, n_z, n_t], order='F'), 2, 1)
+    fl.close()
     turb -= u_off[:, None, None, None]
     turb /= u_scl[:, None, None, None]
     return turb
 
+def WriteBTS(fname,turb,dz,dy,dt,zhub,z0,
+             uhub=None,desc='',periodic=False):
+    """
+    Write TurbSim format (.bts) full-field time-series binary data file
+    (the inverse of :func:`turbsim`).
+
+    Parameters
+    ----------
+    fname : str
+            The filename to write to.
+    turb : :class:`numpy.ndarray`
+             [3 x n_z x n_y x n_t] array of wind velocity values
+    dz, dy, dt : float
+            Vertical and lateral grid spacing [m] and time step [s].
+    zhub, z0 : float
+            Hub height and height of lowest grid point [m].
+    uhub : float, optional
+            Hub-height mean wind speed [m/s]; mean of u if not given.
+    desc : str, optional
+            Description string stored in the file.
+    periodic : bool, optional
+            Write the identifier of a periodic TurbSim field (8, else 7).
+    """
+    import numpy as np  # deferred so text-only callers skip the import
+    turb = np.asarray(turb, dtype=np.float32)
+    n_z, n_y, n_t = turb.shape[1:]
+    if uhub is None:
+        uhub = float(turb[0].mean())
+
+    # scale each component to full int16 range (as TurbSim does)
+    u_min = turb.reshape(3, -1).min(axis=1)
+    u_max = turb.reshape(3, -1).max(axis=1)
+    u_scl = (65535. / np.maximum(u_max - u_min, 1e-6)).astype(np.float32)
+    u_off = (-32768. - u_min * u_scl).astype(np.float32)
+    ints = np.clip(np.round(turb * u_scl[:, None, None, None] +
+                            u_off[:, None, None, None]),
+                   -32768, 32767).astype(e + 'i2')
+
+    desc = desc.encode() if isinstance(desc, str) else desc
+    with open(fname, 'wb') as fl:
+        fl.write(pack(e + 'h4l12fl', 8 if periodic else 7, n_z, n_y, 0,
+                      n_t, dz, dy, dt, uhub, zhub, z0,
+                      u_scl[0], u_off[0], u_scl[1], u_off[1],
+                      u_scl[2], u_off[2], len(desc)))
+        fl.write(desc)
+        # file order is component fastest, then y, z and time
+        fl.write(np.swapaxes(ints, 1, 2).tobytes(order='F'))
+    return
+
+def WriteWnd(fname,turb,dz,dy,dt,zhub,
+             uhub=None,ti=None):
+    """
+    Write Bladed format (.wnd) full-field time-series binary data file
+    (the inverse of :func:`bladed`).
+
+    Parameters
+    ----------
+    fname : str
+            The filename to write to.
+    turb : :class:`numpy.ndarray`
+             [3 x n_z x n_y x n_t] array of wind velocity values (n_t is
+             made even by dropping the last time step).
+    dz, dy, dt : float
+            Vertical and lateral grid spacing [m] and time step [s].
+    zhub : float
+            Height of grid centre (hub height) [m].
+    uhub : float, optional
+            Hub-height mean wind speed [m/s]; mean of u if not given.
+    ti : list, optional
+            Turbulence intensities [-] used for scaling; standard deviation
+            of each component over uhub if not given.
+    """
+    import numpy as np  # deferred so text-only callers skip the import
+    turb = np.asarray(turb, dtype=np.float32)
+    n_z, n_y, n_t = turb.shape[1:]
+    n_t = 2 * (n_t // 2)
+    turb = turb[..., :n_t]
+    if uhub is None:
+        uhub = float(turb[0].mean())
+    if ti is None:
+        ti = turb.reshape(3, -1).std(axis=1) / uhub
+    ti = np.maximum(np.asarray(ti, dtype=np.float32), 1e-6)
+
+    # integers are fluctuations in 1/1000 of the standard deviation
+    scl = (1000. / (uhub * ti)).astype(np.float32)
+    ints = turb * scl[:, None, None, None]
+    ints[0] -= 1000. / ti[0]
+    ints = np.clip(np.round(ints), -32768, 32767).astype(e + 'i2')
+
+    # header (104 bytes); clockwise = 1, so y is not flipped when read
+    with open(fname, 'wb') as fl:
+        fl.write(pack(e + '2hl3f', -99, 4, 3, 0., 0.03, zhub))
+        fl.write(pack(e + '3f', *(100. * ti)))
+        fl.write(pack(e + '3flf', dz, dy, dt * uhub, n_t // 2, uhub))
+        fl.write(b'\x00' * 12)
+        fl.write(pack(e + '4l', 1, 0, n_z, n_y))
+        fl.write(b'\x00' * 24)
+        # file order is component fastest, then y, z and time
+        fl.write(np.swapaxes(ints, 1, 2).tobytes(order='F'))
+    return
+
 def sum_scan(filename,):
     """
     Scan a sum file for specific variables.
@@ -250,7 +705,7 @@ def checkname(fname, extensions=[]):
     """
     if os.path.isfile(fname):
         return fname
-    if isinstance(extensions, basestring):
+    if isinstance(extensions, str):
         # If extensions is a string make it a single-element list.
         extensions = [extensions]
     for e in extensions:
@@ -0,0 +1,49 @@
+"""
+Tests of the streamed event search (jr_events).
+
+AUTHOR:  Jenni Rinker, Duke University
+CONTACT: jennifer.rinker@duke.edu
+
+
+NOTES:
+    Run with "python -m pytest" from this directory.
+
+"""
+
+# module dependencies
+import jr_events, jr_wind
+import os
+import numpy as np
+
+
+def WriteTestWind(WindPath,
+                  n_t=100,dt=0.05):
+    """ Random .bts file on a 5 x 5 grid
+    """
+
+    rng  = np.random.RandomState(0)
+    turb = np.empty((3,5,5,n_t))
+    turb[0] = 10. + rng.randn(5,5,n_t)
+    turb[1] = rng.randn(5,5,n_t)
+    turb[2] = rng.randn(5,5,n_t)
+    jr_wind.WriteBTS(WindPath,turb,dz=10.,dy=10.,dt=dt,zhub=60.,z0=40.)
+
+    return
+
+def test_event_series_independent_of_block_size(tmp_path):
+    """ Same event series for blocks shorter and longer than a gust
+    """
+
+    WindPath = os.path.join(str(tmp_path),'wind.bts')
+    WriteTestWind(WindPath)
+
+    ref = jr_events.GetEventSeries(WindPath,TGust=0.5,n_block=1024)
+    assert ref['UPoint'].size == 91
+    for n_block in (3,7,9,10,50):
+        series = jr_events.GetEventSeries(WindPath,TGust=0.5,
+                                          n_block=n_block)
+        for key in ref:
+            assert series[key].size == series['Time'].size
+            np.testing.assert_allclose(series[key],ref[key],rtol=1e-12,
+                                       err_msg='{:s}, n_block = {:d}'.format(
+                                                key,n_block))